@@ -0,0 +1,58 @@
+import sqlite3
+import sys
+
+import archive
+import migrations
+
+# Полный пересчет сводных таблиц. В обычной работе они обновляются триггерами
+# (см. миграцию 4 в migrations.py); пересчет нужен после ручной правки данных или сбоя.
+# {Payments} и {Appointments} заменяются объединением основной таблицы и ее архивов.
+REBUILD_STATEMENTS = [
+    "DELETE FROM RevenueByServiceDaily",
+    """
+    INSERT INTO RevenueByServiceDaily (Date, id_service, Total, PaymentsCount)
+    SELECT Date, id_service, SUM(Summ), COUNT(*) FROM ({Payments}) GROUP BY Date, id_service
+    """,
+    "DELETE FROM RevenueByCashierDaily",
+    """
+    INSERT INTO RevenueByCashierDaily (Date, employee_id, Total, PaymentsCount)
+    SELECT Date, COALESCE(employee_id, 0), SUM(Summ), COUNT(*) FROM ({Payments})
+    GROUP BY Date, COALESCE(employee_id, 0)
+    """,
+    "DELETE FROM DoctorLoadDaily",
+    """
+    INSERT INTO DoctorLoadDaily (Date, id_doctor, AppointmentsCount)
+    SELECT Date, id_doctor, COUNT(*) FROM ({Appointments}) GROUP BY Date, id_doctor
+    """,
+]
+
+
+def rebuild(conn):
+    """Пересчитывает все сводные таблицы в одной транзакции по основной базе и подключенным архивам."""
+    schemas = archive.attached_schemas(conn)
+    sources = {table: archive.union(f"SELECT * FROM {{{table}}}", schemas) for table in archive.ARCHIVED_TABLES}
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for statement in REBUILD_STATEMENTS:
+            conn.execute(statement.format(**sources))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def rebuild_database(db_path, archive_dir=None):
+    """Пересчитывает сводные таблицы в файле базы данных с учетом архива закрытых лет."""
+    migrations.upgrade(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        archive.attach(conn, archive_dir or archive.default_dir(db_path))
+        rebuild(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    db_file = sys.argv[1] if len(sys.argv) > 1 else 'medclinic.db'
+    rebuild_database(db_file)
+    print("Summary tables rebuilt successfully.")
@@ -0,0 +1,210 @@
+"""Архив закрытых лет: приемы и платежи прошлых лет в отдельных базах SQLite, по одной на год.
+
+Перенос (roll) копирует строки года из основной базы в файл <каталог архива>/<год>.db,
+затем удаляет из основной базы те из них, что есть в архиве, и отмечает год в таблице
+ArchivedPeriods. Приложение подключает архивы к каждому соединению (ATTACH) и читает их
+только в запросах, период которых пересекает архивные годы. Строки, добавленные задним
+числом в уже перенесенный год, остаются в основной базе до следующего переноса и видны
+так же, как остальные. Сводные таблицы при переносе не меняются (см. миграцию 8).
+
+Запуск:  python archive.py roll [--before ГОД] [--db medclinic.db] [--dir каталог]
+         python archive.py list [--db medclinic.db] [--dir каталог]
+"""
+import argparse
+import datetime
+import os
+import re
+import sqlite3
+
+import db
+import migrations
+
+ARCHIVED_TABLES = ('Appointments', 'Payments')
+# Индексы архивов: выборки по диапазону дат, по врачу и история пациента (как в основной базе)
+ARCHIVE_INDEXES = [
+    "idx_appointments_date ON Appointments (Date)",
+    "idx_appointments_doctor_date ON Appointments (id_doctor, Date)",
+    "idx_appointments_patient_timeline ON Appointments "
+    "(id_patient, Date, id, Time, id_doctor, Complaints, PreliminaryDiagnosis)",
+    "idx_payments_date ON Payments (Date)",
+    "idx_payments_patient_timeline ON Payments (id_patient, Date, id, payment_time, id_service, Summ)",
+]
+# Внешние ключи ссылаются на справочники основной базы, которых в архиве нет
+FOREIGN_KEY = re.compile(r',\s*FOREIGN KEY\s*\([^)]*\)\s*REFERENCES\s*\w+\s*\([^)]*\)', re.IGNORECASE)
+
+
+def default_dir(db_path):
+    """Каталог архива по умолчанию - archive рядом с файлом базы."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'archive')
+
+
+def schema(year):
+    """Имя, под которым архив года подключается к соединению."""
+    return f'archive_{year}'
+
+
+def partition_path(archive_dir, year):
+    return os.path.join(archive_dir, f'{year}.db')
+
+
+def archived_years(conn):
+    """Возвращает перенесенные в архив годы по возрастанию."""
+    try:
+        return [row[0] for row in conn.execute("SELECT year FROM main.ArchivedPeriods WHERE moving = 0 ORDER BY year")]
+    except sqlite3.OperationalError:  # схема до миграции 8
+        return []
+
+
+def create_schema(conn, name):
+    """Создает в подключенном архиве name таблицы с теми же столбцами, что в основной базе, и индексы."""
+    conn.execute(f"PRAGMA {name}.journal_mode = WAL")
+    for table in ARCHIVED_TABLES:
+        sql = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?",
+                           (table,)).fetchone()[0]
+        sql = FOREIGN_KEY.sub('', sql)
+        conn.execute(re.sub(rf'^CREATE TABLE\s+{table}\b', f'CREATE TABLE IF NOT EXISTS {name}.{table}', sql))
+    for index in ARCHIVE_INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name}.{index}")
+
+
+def attach(conn, archive_dir, years=None):
+    """Подключает к соединению архивы лет years (по умолчанию всех перенесенных); возвращает их схемы.
+
+    Подходит как обработчик on_connect пула соединений. Уже подключенные архивы пропускаются.
+    """
+    years = archived_years(conn) if years is None else years
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    for year in years:
+        name = schema(year)
+        if name not in attached:
+            conn.execute(f"ATTACH DATABASE ? AS {name}", (partition_path(archive_dir, year),))
+            create_schema(conn, name)
+    return [schema(year) for year in years]
+
+
+def attached_schemas(conn):
+    """Возвращает main и схемы подключенных к соединению архивов, от старых к новым."""
+    names = sorted(row[1] for row in conn.execute("PRAGMA database_list") if row[1].startswith('archive_'))
+    return names + ['main']
+
+
+def union(query, schemas):
+    """Подставляет в query вместо {Appointments} и {Payments} таблицы каждого раздела из schemas
+    и объединяет получившиеся запросы UNION ALL. Параметры запроса повторяются для каждого раздела.
+    """
+    branches = [query.format(**{table: f'{name}.{table}' for table in ARCHIVED_TABLES}) for name in schemas]
+    if len(branches) == 1:
+        return branches[0]
+    return ' UNION ALL '.join(f'SELECT * FROM ({branch})' for branch in branches)
+
+
+def overlapping(years, date_from=None, date_to=None):
+    """Возвращает годы из years, пересекающиеся с периодом; незаданная или неверная граница не ограничивает."""
+    try:
+        first = int(date_from[:4]) if date_from else None
+    except ValueError:
+        first = None
+    try:
+        last = int(date_to[:4]) if date_to else None
+    except ValueError:
+        last = None
+    return [year for year in years if (first is None or year >= first) and (last is None or year <= last)]
+
+
+def roll_year(conn, archive_dir, year):
+    """Переносит в архив приемы и платежи года year; возвращает (приемов, платежей).
+
+    Копирование и удаление выполняются разными транзакциями: строки удаляются из основной
+    базы только после фиксации копии, поэтому сбой между ними оставляет лишь дубликаты,
+    которые уберет повторный перенос.
+    """
+    name = attach(conn, archive_dir, [year])[0]
+    bounds = (f'{year:04d}-01-01', f'{year + 1:04d}-01-01')
+    recorded = year in archived_years(conn)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for table in ARCHIVED_TABLES:
+            if not recorded:
+                # Файл года, не отмеченного в ArchivedPeriods, - остаток прерванного переноса или
+                # базы до пересоздания (reset_db.py): все его строки еще есть в основной базе или не нужны
+                conn.execute(f"DELETE FROM {name}.{table}")
+            conn.execute(f"INSERT OR IGNORE INTO {name}.{table} "
+                         f"SELECT * FROM main.{table} WHERE Date >= ? AND Date < ?", bounds)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    # Без статистики планировщик выбирает для архива другие индексы, чем для основной базы
+    conn.execute(f"ANALYZE {name}")
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("""
+            INSERT INTO ArchivedPeriods (year, moving) VALUES (?, 1)
+            ON CONFLICT (year) DO UPDATE SET moving = 1
+        """, (year,))
+        moved = []
+        for table in ARCHIVED_TABLES:
+            # Удаляются только строки, копия которых уже есть в архиве
+            moved.append(conn.execute(f"""
+                DELETE FROM main.{table} WHERE Date >= ? AND Date < ?
+                AND id IN (SELECT id FROM {name}.{table} WHERE Date >= ? AND Date < ?)
+            """, bounds + bounds).rowcount)
+        conn.execute("""
+            UPDATE ArchivedPeriods SET moving = 0, appointments = appointments + ?, payments = payments + ?,
+                rolled_at = ?
+            WHERE year = ?
+        """, (*moved, datetime.datetime.now().isoformat(timespec='seconds'), year))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return tuple(moved)
+
+
+def roll(db_path, archive_dir=None, before=None):
+    """Переносит в архив все годы раньше before (по умолчанию - текущего); возвращает [(год, приемов, платежей)]."""
+    archive_dir = archive_dir or default_dir(db_path)
+    before = before or datetime.date.today().year
+    os.makedirs(archive_dir, exist_ok=True)
+    migrations.upgrade(db_path)
+    conn = db.connect(db_path)
+    try:
+        limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        years = sorted({int(value) for table in ARCHIVED_TABLES for (value,) in conn.execute(
+            f"SELECT DISTINCT substr(Date, 1, 4) FROM {table} WHERE Date < ?", (f'{before:04d}-01-01',))
+            if value.isdigit()})
+        if len(set(years) | set(archived_years(conn))) > limit:
+            raise RuntimeError(f'SQLite подключает к соединению не больше {limit} архивов')
+        return [(year, *roll_year(conn, archive_dir, year)) for year in years]
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['roll', 'list'])
+    parser.add_argument('--db', default='medclinic.db')
+    parser.add_argument('--dir', default=None, help='каталог архива (по умолчанию archive рядом с базой)')
+    parser.add_argument('--before', type=int, default=None,
+                        help='перенести годы раньше этого (по умолчанию - текущего)')
+    args = parser.parse_args()
+
+    archive_dir = args.dir or default_dir(args.db)
+    if args.command == 'roll':
+        for year, appointments, payments in roll(args.db, archive_dir, args.before):
+            print(f"{year}: moved {appointments} appointments, {payments} payments")
+        return
+    conn = db.connect(args.db)
+    try:
+        for year, appointments, payments, rolled_at in conn.execute(
+                "SELECT year, appointments, payments, rolled_at FROM ArchivedPeriods WHERE moving = 0 ORDER BY year"):
+            path = partition_path(archive_dir, year)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            print(f"{year}: {appointments} appointments, {payments} payments, {size / 1e6:.1f} MB, rolled {rolled_at}")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,461 @@
+"""Резервные копии базы без остановки клиники: снимки, проверка, восстановление и шаблоны для тестов.
+
+Снимок делается онлайн-резервированием SQLite (sqlite3.Connection.backup) небольшими шагами
+с паузами, поэтому запись из маршрутов приложения не ждет конца копирования. Каждый снимок -
+каталог <каталог копий>/<ГГГГММДД-ЧЧММСС> с копией основной базы, копиями архивов закрытых
+лет (archive.py) и файлом manifest.json с контрольными суммами. Архивы, не изменившиеся с
+прошлого снимка, не копируются, а связываются с ним жесткой ссылкой. Готовый снимок
+проверяется PRAGMA integrity_check; лишние старые снимки удаляются (--keep).
+
+Восстановление копирует файлы снимка в новый файл рядом с целевым и подменяет его
+(os.replace), поэтому занимает время копирования файла. Приложение на время восстановления
+нужно остановить. Эталоны (fixture-save / fixture-load) - проверенные копии тестовых баз
+для бенчмарков и generate_data.py: база восстанавливается за миллисекунды вместо заполнения заново.
+
+Запуск:  python backup.py snapshot [--db medclinic.db] [--dir каталог] [--keep N] [--pages N] [--pause S]
+         python backup.py list|prune [--dir каталог] [--keep N]
+         python backup.py verify|restore СНИМОК [--db medclinic.db] [--force]
+         python backup.py fixture-save|fixture-load ЭТАЛОН [--db база]
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+import archive
+import db
+
+DEFAULT_PAGES = 256  # страниц за шаг копирования (1 МБ при странице 4 КБ)
+DEFAULT_PAUSE = 0.01  # секунд между шагами: в паузах писатели получают блокировку
+MAX_RESTARTS = 3  # перезапусков копирования из-за записи в базу, после которых остаток копируется одним шагом
+DB_FILE = 'medclinic.db'
+MANIFEST = 'manifest.json'
+LOCK_FILE = '.lock'
+STAMP_FORMAT = '%Y%m%d-%H%M%S'
+
+
+class _Restarted(Exception):
+    pass
+
+
+def default_dir(db_path):
+    """Каталог копий по умолчанию - backups рядом с файлом базы."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'backups')
+
+
+def copy_database(source, target_path, pages=DEFAULT_PAGES, pause=DEFAULT_PAUSE, max_restarts=MAX_RESTARTS):
+    """Копирует базу соединения source в файл target_path; возвращает число перезапусков копирования.
+
+    Копирование идет шагами по pages страниц (-1 - одним шагом) с паузой pause секунд; блокировка
+    чтения держится только во время шага. Если базу между шагами меняет другое соединение, SQLite
+    начинает копирование заново; после max_restarts перезапусков остаток копируется одним шагом -
+    в режиме WAL он держит только снимок чтения и не мешает писателям.
+    """
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > max_restarts:
+                raise _Restarted
+        state['remaining'] = remaining
+
+    target = sqlite3.connect(target_path)
+    try:
+        try:
+            source.backup(target, pages=pages, progress=progress, sleep=pause)
+        except _Restarted:
+            source.backup(target, pages=-1)
+        target.execute("PRAGMA journal_mode = DELETE")  # копия - один файл без журнала WAL
+    finally:
+        target.close()
+    return state['restarts']
+
+
+def copy(source_path, target_path, pages=DEFAULT_PAGES, pause=DEFAULT_PAUSE):
+    """Копирует файл базы source_path в target_path (см. copy_database); возвращает число перезапусков."""
+    source = db.connect(source_path)
+    try:
+        return copy_database(source, target_path, pages, pause)
+    finally:
+        source.close()
+
+
+def check_integrity(path, quick=False):
+    """Проверяет файл базы PRAGMA integrity_check (quick_check при quick); возвращает список ошибок."""
+    try:
+        conn = sqlite3.connect(f'file:{urllib.request.pathname2url(os.path.abspath(path))}?mode=ro', uri=True)
+        try:
+            rows = [row[0] for row in conn.execute(f"PRAGMA {'quick_check' if quick else 'integrity_check'}")]
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        return [str(e)]
+    return [] if rows == ['ok'] else rows
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_signature(path):
+    """Размер и время изменения файла базы и его журнала WAL: меняются при любой записи в базу."""
+    signature = []
+    for name in (path, path + '-wal'):
+        if os.path.exists(name):
+            stat = os.stat(name)
+            signature += [stat.st_size, stat.st_mtime_ns]
+    return signature
+
+
+def install(source_path, target_path):
+    """Заменяет target_path копией файла source_path, удаляя журналы прежней базы."""
+    os.makedirs(os.path.dirname(os.path.abspath(target_path)), exist_ok=True)
+    temporary = target_path + '.restore'
+    shutil.copyfile(source_path, temporary)
+    # Журнал WAL прежней базы, примененный к новому файлу, испортил бы его
+    for suffix in ('-wal', '-shm', '-journal'):
+        if os.path.exists(target_path + suffix):
+            os.remove(target_path + suffix)
+    os.replace(temporary, target_path)
+
+
+# --- Снимки ---
+def snapshots(backup_dir):
+    """Возвращает пути готовых снимков от старых к новым."""
+    if not os.path.isdir(backup_dir):
+        return []
+    return [os.path.join(backup_dir, name) for name in sorted(os.listdir(backup_dir))
+            if os.path.exists(os.path.join(backup_dir, name, MANIFEST))]
+
+
+def load_manifest(snapshot_path):
+    with open(os.path.join(snapshot_path, MANIFEST), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def snapshot_time(snapshot_path):
+    return datetime.datetime.strptime(os.path.basename(snapshot_path), STAMP_FORMAT)
+
+
+@contextmanager
+def locked(backup_dir):
+    """Берет блокировку каталога копий без ожидания; выдает False, если ее держит другой процесс.
+
+    Блокировку снимает операционная система, в том числе при аварийном завершении процесса.
+    Без fcntl (Windows) сервер работает одним процессом, и блокировка не нужна.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    try:
+        import fcntl
+    except ImportError:
+        yield True
+        return
+    with open(os.path.join(backup_dir, LOCK_FILE), 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+def due(backup_dir, interval, now=None):
+    """Проверяет, что последний снимок старше interval секунд или снимков нет."""
+    existing = snapshots(backup_dir)
+    now = now or datetime.datetime.now()
+    return not existing or (now - snapshot_time(existing[-1])).total_seconds() >= interval
+
+
+def snapshot(db_path, backup_dir=None, archive_dir=None, pages=DEFAULT_PAGES, pause=DEFAULT_PAUSE):
+    """Создает проверенный снимок базы и архивов закрытых лет; возвращает путь каталога снимка.
+
+    Снимок собирается во временном каталоге и получает свое имя только после проверки, поэтому
+    прерванное копирование не оставляет неполных снимков.
+    """
+    backup_dir = backup_dir or default_dir(db_path)
+    archive_dir = archive_dir or archive.default_dir(db_path)
+    started = time.perf_counter()
+    created = datetime.datetime.now()
+    path = os.path.join(backup_dir, created.strftime(STAMP_FORMAT))
+    work = path + '.tmp'
+    os.makedirs(work)
+    existing = snapshots(backup_dir)
+    previous = existing[-1] if existing else None
+    previous_files = load_manifest(previous)['files'] if previous else {}
+    try:
+        source = db.connect(db_path)
+        try:
+            user_version = source.execute("PRAGMA user_version").fetchone()[0]
+            years = archive.archived_years(source)
+            files = {DB_FILE: {'restarts': copy_database(source, os.path.join(work, DB_FILE), pages, pause)}}
+        finally:
+            source.close()
+
+        for year in years:
+            name = f'archive/{year}.db'
+            source_path = archive.partition_path(archive_dir, year)
+            target_path = os.path.join(work, name)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            signature = source_signature(source_path)
+            old = previous_files.get(name)
+            if old and old.get('source') == signature:
+                try:
+                    os.link(os.path.join(previous, name), target_path)
+                    files[name] = dict(old, linked=True)
+                    continue
+                except OSError:
+                    pass
+            files[name] = {'restarts': copy(source_path, target_path, pages, pause), 'source': signature}
+
+        for name, info in files.items():
+            if info.get('linked'):
+                continue  # файл проверен при создании прошлого снимка
+            full_path = os.path.join(work, name)
+            problems = check_integrity(full_path)
+            if problems:
+                raise RuntimeError(f'Копия {name} повреждена: {"; ".join(problems[:5])}')
+            info.update(size=os.path.getsize(full_path), sha256=file_digest(full_path))
+        manifest = {
+            'created': created.isoformat(timespec='seconds'),
+            'database': os.path.abspath(db_path),
+            'user_version': user_version,
+            'seconds': round(time.perf_counter() - started, 3),
+            'files': files,
+        }
+        with open(os.path.join(work, MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.rename(work, path)
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+    return path
+
+
+def verify(snapshot_path, integrity=True):
+    """Сверяет файлы снимка с контрольными суммами и (при integrity) проверяет их целостность.
+
+    Возвращает список ошибок; пустой список - снимок исправен.
+    """
+    problems = []
+    for name, info in load_manifest(snapshot_path)['files'].items():
+        full_path = os.path.join(snapshot_path, name)
+        if not os.path.exists(full_path):
+            problems.append(f'{name}: нет файла')
+        elif file_digest(full_path) != info['sha256']:
+            problems.append(f'{name}: контрольная сумма не совпадает')
+        elif integrity:
+            problems += [f'{name}: {problem}' for problem in check_integrity(full_path)]
+    return problems
+
+
+def prune(backup_dir, keep):
+    """Удаляет снимки сверх keep последних и брошенные незавершенные; возвращает удаленные пути.
+
+    Архивы удаленных снимков, на которые ссылаются более новые, остаются на диске благодаря жестким ссылкам.
+    """
+    existing = snapshots(backup_dir)
+    removed = existing[:max(len(existing) - keep, 0)]
+    day_ago = time.time() - 86400
+    if os.path.isdir(backup_dir):
+        removed += [os.path.join(backup_dir, name) for name in os.listdir(backup_dir)
+                    if name.endswith('.tmp') and os.path.getmtime(os.path.join(backup_dir, name)) < day_ago]
+    for path in removed:
+        shutil.rmtree(path, ignore_errors=True)
+    return removed
+
+
+def restore(snapshot_path, db_path, archive_dir=None, force=False):
+    """Восстанавливает базу и архивы из снимка; возвращает восстановленные файлы.
+
+    Файлы снимка предварительно сверяются с контрольными суммами. Существующие база и архивы
+    заменяются только при force; приложение, работающее с ними, нужно остановить. При
+    восстановлении в новый файл базы каталог архива рядом с ней должен быть пуст, иначе его
+    нужно указать явно: там могут лежать архивы другой, рабочей базы.
+    """
+    problems = verify(snapshot_path, integrity=False)
+    if problems:
+        raise RuntimeError(f'Снимок {snapshot_path} поврежден: {"; ".join(problems)}')
+    names = list(load_manifest(snapshot_path)['files'])
+    if archive_dir is None:
+        archive_dir = archive.default_dir(db_path)
+        if (not os.path.exists(db_path) and any(name != DB_FILE for name in names)
+                and os.path.isdir(archive_dir) and os.listdir(archive_dir)):
+            raise FileExistsError(f'Каталог архива {archive_dir} уже занят; укажите каталог архива '
+                                  f'для восстанавливаемой базы')
+    targets = [(name, db_path if name == DB_FILE else os.path.join(archive_dir, os.path.basename(name)))
+               for name in names]
+    existing = [target_path for _, target_path in targets if os.path.exists(target_path)]
+    if existing and not force:
+        raise FileExistsError(f'Файлы уже существуют, они заменяются только при force: {", ".join(existing)}')
+    restored = []
+    for name, target_path in targets:
+        install(os.path.join(snapshot_path, name), target_path)
+        restored.append(target_path)
+    return restored
+
+
+class BackupScheduler:
+    """Фоновый поток, делающий снимок раз в interval секунд и оставляющий keep последних.
+
+    Перед снимком проверяется возраст последнего, поэтому перезапуск приложения не создает
+    лишних снимков, а блокировка каталога копий (locked) не дает нескольким процессам сервера
+    делать снимок одновременно. Ошибка снимка не останавливает поток и сохраняется в last_error.
+    """
+
+    def __init__(self, db_path, backup_dir, interval, keep=7, archive_dir=None, pages=DEFAULT_PAGES,
+                 pause=DEFAULT_PAUSE):
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.interval = interval
+        self.keep = keep
+        self.archive_dir = archive_dir
+        self.pages = pages
+        self.pause = pause
+        self.last_snapshot = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='medclinic-backup', daemon=True)
+        self._thread.start()
+
+    def run_once(self):
+        """Делает снимок, если подошел срок, и удаляет лишние; возвращает путь снимка или None."""
+        if not due(self.backup_dir, self.interval):
+            return None
+        try:
+            with locked(self.backup_dir) as acquired:
+                # Снимок делает другой процесс сервера или он успел закончить его до блокировки
+                if not acquired or not due(self.backup_dir, self.interval):
+                    return None
+                self.last_snapshot = snapshot(self.db_path, self.backup_dir, self.archive_dir, self.pages,
+                                              self.pause)
+                prune(self.backup_dir, self.keep)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = f'{type(e).__name__}: {e}'
+            return None
+        return self.last_snapshot
+
+    def _run(self):
+        # Первая проверка - сразу после запуска, затем не реже раза в минуту
+        delay = 0
+        while not self._stop.wait(delay):
+            self.run_once()
+            delay = min(self.interval, 60)
+
+    def stats(self):
+        """Возвращает число снимков, имя последнего, его время создания и ошибку последней попытки."""
+        existing = snapshots(self.backup_dir)
+        latest = load_manifest(existing[-1]) if existing else None
+        return {
+            'snapshots': len(existing),
+            'latest': os.path.basename(existing[-1]) if existing else None,
+            'latest_seconds': latest['seconds'] if latest else None,
+            'interval': self.interval,
+            'keep': self.keep,
+            'last_error': self.last_error,
+        }
+
+    def close(self):
+        """Останавливает поток, дождавшись окончания текущего снимка."""
+        self._stop.set()
+        self._thread.join()
+
+
+# --- Эталонные базы для тестов и бенчмарков ---
+def save_fixture(db_path, fixture_path):
+    """Сохраняет проверенную копию базы db_path в файл эталона fixture_path; возвращает fixture_path.
+
+    В отличие от копирования файла базы, копия включает изменения, еще не перенесенные из журнала WAL.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(fixture_path)), exist_ok=True)
+    temporary = fixture_path + '.tmp'
+    copy(db_path, temporary, pages=-1)
+    problems = check_integrity(temporary, quick=True)
+    if problems:
+        os.remove(temporary)
+        raise RuntimeError(f'Копия {db_path} повреждена: {"; ".join(problems[:5])}')
+    os.replace(temporary, fixture_path)
+    return fixture_path
+
+
+def load_fixture(fixture_path, db_path):
+    """Восстанавливает эталон fixture_path в файл db_path (прежняя база заменяется); возвращает db_path."""
+    if not os.path.exists(fixture_path):
+        raise FileNotFoundError(f'Нет эталона {fixture_path}')
+    install(fixture_path, db_path)
+    return db_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['snapshot', 'list', 'verify', 'restore', 'prune',
+                                            'fixture-save', 'fixture-load'])
+    parser.add_argument('name', nargs='?', help='снимок (verify, restore) или файл эталона')
+    parser.add_argument('--db', default='medclinic.db')
+    parser.add_argument('--dir', default=None, help='каталог копий (по умолчанию backups рядом с базой)')
+    parser.add_argument('--archive-dir', default=None, help='каталог архива (по умолчанию archive рядом с базой)')
+    parser.add_argument('--keep', type=int, default=None, help='сколько последних снимков оставить')
+    parser.add_argument('--pages', type=int, default=DEFAULT_PAGES, help='страниц за шаг копирования')
+    parser.add_argument('--pause', type=float, default=DEFAULT_PAUSE, help='секунд между шагами')
+    parser.add_argument('--force', action='store_true', help='заменить существующую базу при восстановлении')
+    args = parser.parse_args()
+
+    backup_dir = args.dir or default_dir(args.db)
+    if args.command in ('verify', 'restore', 'fixture-save', 'fixture-load') and not args.name:
+        parser.error(f'{args.command}: укажите снимок или файл эталона')
+    if args.command == 'snapshot':
+        with locked(backup_dir) as acquired:
+            if not acquired:
+                parser.error('snapshot: снимок уже делает другой процесс')
+            path = snapshot(args.db, backup_dir, args.archive_dir, args.pages, args.pause)
+            manifest = load_manifest(path)
+            print(f"{path}: {len(manifest['files'])} files in {manifest['seconds']:.2f}s")
+            if args.keep:
+                for removed in prune(backup_dir, args.keep):
+                    print(f"removed {removed}")
+    elif args.command == 'list':
+        for path in snapshots(backup_dir):
+            manifest = load_manifest(path)
+            size = sum(info['size'] for info in manifest['files'].values())
+            print(f"{os.path.basename(path)}: {len(manifest['files'])} files, {size / 1e6:.1f} MB, "
+                  f"schema {manifest['user_version']}, {manifest['seconds']:.2f}s")
+    elif args.command == 'prune':
+        if args.keep is None:
+            parser.error('prune: укажите --keep')
+        for removed in prune(backup_dir, args.keep):
+            print(f"removed {removed}")
+    elif args.command == 'verify':
+        path = args.name if os.path.isdir(args.name) else os.path.join(backup_dir, args.name)
+        problems = verify(path)
+        print('\n'.join(problems) or 'ok')
+        raise SystemExit(1 if problems else 0)
+    elif args.command == 'restore':
+        path = args.name if os.path.isdir(args.name) else os.path.join(backup_dir, args.name)
+        started = time.perf_counter()
+        try:
+            restored = restore(path, args.db, args.archive_dir, args.force)
+        except FileExistsError as e:
+            parser.error(f'restore: {e}')
+        print(f"restored {len(restored)} files in {(time.perf_counter() - started) * 1000:.0f} ms")
+    elif args.command == 'fixture-save':
+        print(save_fixture(args.db, args.name))
+    else:
+        started = time.perf_counter()
+        load_fixture(args.name, args.db)
+        print(f"{args.db} restored from fixture {args.name} in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Снимок базы во время записи: копирование одним шагом против копирования порциями с паузами.
+
+Пока снимается копия, поток записи (GroupCommitWriter) вставляет платежи с заданной частотой;
+для каждого способа копирования измеряются время копии, число перезапусков копирования
+и задержки записи. Затем измеряются проверка снимка и восстановление из него, а также
+генерация синтетической базы (generate_data.py) против ее загрузки из эталона.
+
+Запуск из корня проекта:  python -m benchmarks.bench_backup [--db medclinic.db] [--rate N]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import backup
+import generate_data
+import migrations
+from writer import GroupCommitWriter
+
+INSERT = "INSERT INTO Payments (id_patient, id_service, Date, Summ, payment_time, employee_id) VALUES (?, ?, ?, ?, ?, ?)"
+ROW = (1, 1, '2024-06-01', 1500, '10:00', 1)
+
+
+def write_during(db_path, rate, action):
+    """Вставляет rate строк в секунду, пока выполняется action(); возвращает (результат, задержки мс)."""
+    writer = GroupCommitWriter(db_path)
+    latencies = []
+    done = threading.Event()
+
+    def client():
+        while not done.is_set():
+            started = time.perf_counter()
+            writer.execute(INSERT, ROW)
+            elapsed = time.perf_counter() - started
+            latencies.append(elapsed * 1000)
+            time.sleep(max(1 / rate - elapsed, 0))
+
+    thread = threading.Thread(target=client)
+    thread.start()
+    try:
+        time.sleep(0.1)
+        result = action()
+    finally:
+        done.set()
+        thread.join()
+        writer.close()
+    latencies.sort()
+    return result, latencies
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='medclinic.db', help='исходная база (копируется во временный каталог)')
+    parser.add_argument('--rate', type=float, default=200, help='вставок в секунду во время копирования')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        fixture = backup.save_fixture(args.db, os.path.join(workdir, 'fixture.db'))
+        migrations.upgrade(fixture)
+        db_copy = os.path.join(workdir, 'bench.db')
+        target = os.path.join(workdir, 'copy.db')
+        print(f"database {os.path.getsize(fixture) / 1e6:.1f} MB, {args.rate:g} writes/s during the copy")
+        print(f"{'':<32}{'copy ms':>10}{'restarts':>10}{'writes':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+        def copy(pages, pause):
+            try:
+                return backup.copy(db_copy, target, pages, pause)
+            finally:
+                os.remove(target)
+
+        variants = [
+            ('no copy (1 s)', lambda: (time.sleep(1), 0)[1]),
+            ('one step', lambda: copy(-1, 0)),
+            (f'{backup.DEFAULT_PAGES} pages, {backup.DEFAULT_PAUSE * 1000:g} ms pause',
+             lambda: copy(backup.DEFAULT_PAGES, backup.DEFAULT_PAUSE)),
+            ('64 pages, 10 ms pause', lambda: copy(64, 0.01)),
+        ]
+        for title, action in variants:
+            backup.load_fixture(fixture, db_copy)
+            (elapsed, restarts), latencies = write_during(db_copy, args.rate, lambda: timed(action))
+            p50 = latencies[len(latencies) // 2] if latencies else 0
+            p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+            print(f"{title:<32}{elapsed:>10.0f}{restarts:>10}{len(latencies):>8}{p50:>9.2f}{p99:>9.2f}"
+                  f"{(latencies[-1] if latencies else 0):>9.2f}")
+
+        backup_dir = os.path.join(workdir, 'backups')
+        snapshot_ms, path = timed(lambda: backup.snapshot(db_copy, backup_dir))
+        verify_ms, _ = timed(lambda: backup.verify(path))
+        restore_ms, _ = timed(lambda: backup.restore(path, os.path.join(workdir, 'restored.db')))
+        print(f"snapshot {snapshot_ms:.0f} ms, verify {verify_ms:.0f} ms, restore {restore_ms:.0f} ms")
+
+        def seed():
+            generate_data.generate(os.path.join(workdir, 'synthetic.db'), patients=2000, appointments=20000,
+                                   payments=40000, fixtures=os.path.join(workdir, 'fixtures'), log=lambda line: None)
+        generate_ms, _ = timed(seed)
+        load_ms, _ = timed(seed)
+        print(f"synthetic database: generated in {generate_ms:.0f} ms, loaded from fixture in {load_ms:.1f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
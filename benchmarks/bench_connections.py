@@ -0,0 +1,75 @@
+"""Сравнение пропускной способности: соединение на каждый запрос против пула соединений.
+
+Запуск из корня проекта:  python -m benchmarks.bench_connections [--requests N]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import medclinic
+
+ROUTES = [
+    '/patients',
+    '/patients/1',
+    '/employees',
+    '/services',
+    '/appointments',
+    '/payments',
+    '/payments/1',
+    '/payments/1/edit',
+    '/add_payment',
+]
+
+
+def legacy_execute_query(query, params=None, fetchone=False, commit=False):
+    """Прежняя реализация: новое соединение на каждый SQL-запрос."""
+    conn = sqlite3.connect(medclinic.app.config['DATABASE'])
+    cursor = conn.cursor()
+    cursor.execute(query, params or ())
+    if commit:
+        conn.commit()
+    result = cursor.fetchone() if fetchone else cursor.fetchall()
+    conn.close()
+    return result
+
+
+def run(client, total):
+    """Выполняет total GET-запросов по кругу и возвращает число запросов в секунду."""
+    started = time.perf_counter()
+    for i in range(total):
+        response = client.get(ROUTES[i % len(ROUTES)])
+        assert response.status_code == 200, response.status_code
+    return total / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--db', default='medclinic.db', help='исходная база (копируется во временный каталог)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        db_copy = os.path.join(workdir, 'bench.db')
+        shutil.copyfile(args.db, db_copy)
+        medclinic.app.config['DATABASE'] = db_copy
+        client = medclinic.app.test_client()
+
+        pooled_execute_query = medclinic.execute_query
+        medclinic.execute_query = legacy_execute_query
+        legacy = run(client, args.requests)
+        medclinic.execute_query = pooled_execute_query
+        pooled = run(client, args.requests)
+        medclinic.close_db()
+
+        print(f"connect-per-query: {legacy:8.1f} req/s")
+        print(f"pooled:            {pooled:8.1f} req/s  (x{pooled / legacy:.2f})")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Столбцовая выгрузка и векторные агрегаты против обхода строк в Python.
+
+Платежи и приемы выгружаются в каждом доступном формате (Parquet и Arrow - при установленном
+pyarrow); измеряются время и размер выгрузки. Затем выручка по услугам и посещения по врачам
+считаются тремя способами: циклом Python по строкам из базы, GROUP BY в SQLite и pandas
+по выгрузке (если установлены pandas и pyarrow).
+
+Запуск из корня проекта:  python -m benchmarks.bench_export [--db medclinic.db] [--chunk-size N]
+"""
+import argparse
+import collections
+import importlib.util
+import os
+import shutil
+import tempfile
+import time
+
+import db
+import export
+
+PYTHON_QUERIES = {
+    'revenue by service': "SELECT Services.Name, Payments.Summ FROM Payments "
+                          "LEFT JOIN Services ON Payments.id_service = Services.id",
+    'visits by doctor': "SELECT Employees.FIO, 1 FROM Appointments "
+                        "LEFT JOIN Employees ON Appointments.id_doctor = Employees.id",
+}
+SQL_QUERIES = {
+    'revenue by service': "SELECT Services.Name, SUM(Payments.Summ) FROM Payments "
+                          "LEFT JOIN Services ON Payments.id_service = Services.id GROUP BY Services.Name",
+    'visits by doctor': "SELECT Employees.FIO, COUNT(*) FROM Appointments "
+                        "LEFT JOIN Employees ON Appointments.id_doctor = Employees.id GROUP BY Employees.FIO",
+}
+
+
+def timed(func, repeat=3):
+    """Возвращает (лучшее время в мс, результат последнего вызова)."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def python_loop(conn, query):
+    totals = collections.defaultdict(float)
+    for key, value in conn.execute(query):
+        totals[key] += value
+    return totals
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='medclinic.db', help='исходная база (копируется во временный каталог)')
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    args = parser.parse_args()
+
+    has_arrow = importlib.util.find_spec('pyarrow') is not None
+    has_pandas = has_arrow and importlib.util.find_spec('pandas') is not None
+    formats = ['parquet', 'arrow', 'csv'] if has_arrow else ['csv']
+    workdir = tempfile.mkdtemp()
+    try:
+        db_copy = os.path.join(workdir, 'bench.db')
+        shutil.copyfile(args.db, db_copy)
+        conn = db.connect(db_copy)
+        counts = {name: conn.execute(f"SELECT count(*) FROM {spec['table']}").fetchone()[0]
+                  for name, spec in export.EXPORTS.items()}
+        print(', '.join(f'{name}: {count} rows' for name, count in counts.items()))
+        if not has_arrow:
+            print('pyarrow is not installed: only csv export, no pandas aggregation')
+
+        print(f"{'export':<24}{'ms':>10}{'rows/s':>12}{'MB':>8}")
+        for file_format in formats:
+            out_dir = os.path.join(workdir, file_format)
+            elapsed, _ = timed(lambda: export.export(db_copy, out_dir, file_format, chunk_size=args.chunk_size,
+                                                     incremental=False), repeat=1)
+            rows = sum(counts.values())
+            print(f"{file_format:<24}{elapsed:>10.1f}{rows / elapsed * 1000:>12.0f}"
+                  f"{directory_size(out_dir) / 1e6:>8.2f}")
+
+        print(f"{'aggregate':<24}{'python':>10}{'sqlite':>10}{'pandas':>10}")
+        frames = {}
+        if has_pandas:
+            import frame_analytics
+
+            out_dir = os.path.join(workdir, 'parquet')
+            frames['revenue by service'] = (
+                lambda: frame_analytics.read_export(out_dir, 'payments', ['service', 'amount']),
+                lambda frame: frame.groupby('service')['amount'].sum())
+            frames['visits by doctor'] = (
+                lambda: frame_analytics.read_export(out_dir, 'appointments', ['doctor']),
+                lambda frame: frame.groupby('doctor').size())
+        for title in PYTHON_QUERIES:
+            python_ms, _ = timed(lambda: python_loop(conn, PYTHON_QUERIES[title]))
+            sql_ms, _ = timed(lambda: conn.execute(SQL_QUERIES[title]).fetchall())
+            line = f"{title:<24}{python_ms:>10.1f}{sql_ms:>10.1f}"
+            if title in frames:
+                load, aggregate = frames[title]
+                load_ms, frame = timed(load)
+                pandas_ms, _ = timed(lambda: aggregate(frame))
+                line += f"{pandas_ms:>10.1f}  (+{load_ms:.1f} ms to read the export)"
+            print(line)
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
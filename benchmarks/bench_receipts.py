@@ -0,0 +1,66 @@
+"""Скорость формирования чеков: прежний способ против скомпилированного шаблона и кэша чеков.
+
+Запуск из корня проекта:  python -m benchmarks.bench_receipts [--receipts N]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from docxtpl import DocxTemplate
+
+import medclinic
+from documents import CompiledDocxTemplate, RenderCache
+
+
+def sample_payments(count):
+    """Возвращает count различных строк платежей на основе платежа из базы."""
+    payment = medclinic.get_payment_from_db(1) or (1, '2024-02-28', '10:00', 'Пациент', 'Услуга', 1500, 'Кассир', 'CODE')
+    return [(i,) + tuple(payment[1:]) for i in range(1, count + 1)]
+
+
+def legacy_receipt(payment_data, clinic_info, output_dir):
+    """Прежний способ: разбор шаблона на каждый чек и запись файла на диск с последующим чтением."""
+    template = DocxTemplate(medclinic.app.config['CHEQUE_TEMPLATE'])
+    template.render(medclinic.payment_check_context(payment_data, clinic_info))
+    output_path = os.path.join(output_dir, f'payment_{payment_data[0]}_cheque.docx')
+    template.save(output_path)
+    with open(output_path, 'rb') as f:
+        return f.read()
+
+
+def measure(func, payments):
+    """Возвращает число чеков в секунду."""
+    started = time.perf_counter()
+    for payment in payments:
+        func(payment)
+    return len(payments) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--receipts', type=int, default=200)
+    args = parser.parse_args()
+
+    clinic_info = medclinic.get_clinic_info()
+    payments = sample_payments(args.receipts)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        legacy = measure(lambda p: legacy_receipt(p, clinic_info, output_dir), payments)
+
+    medclinic.cheque_template = CompiledDocxTemplate(medclinic.app.config['CHEQUE_TEMPLATE'])
+    medclinic.receipt_cache = RenderCache(0)
+    compiled = measure(lambda p: medclinic.render_payment_check(p, clinic_info), payments)
+
+    medclinic.receipt_cache = RenderCache(len(payments))
+    measure(lambda p: medclinic.render_payment_check(p, clinic_info), payments)
+    cached = measure(lambda p: medclinic.render_payment_check(p, clinic_info), payments)
+    medclinic.close_db()
+
+    print(f"legacy (parse + disk):     {legacy:9.1f} receipts/s")
+    print(f"compiled template:         {compiled:9.1f} receipts/s  (x{compiled / legacy:.1f})")
+    print(f"rendered receipt cache:    {cached:9.1f} receipts/s  (x{cached / legacy:.1f})")
+
+
+if __name__ == '__main__':
+    main()
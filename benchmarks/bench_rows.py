@@ -0,0 +1,88 @@
+"""Память и время чтения больших списков: SELECT * против выборки только нужных столбцов в типы строк.
+
+Для списков пациентов, услуг и платежей читаются первые N строк в порядке списка разными
+способами: все столбцы в кортежи, в sqlite3.Row и в словари, и только столбцы типа строки
+из rows.py (как делают функции страниц). Измеряются время (лучшее из нескольких повторов)
+и объем памяти, занятой результатом (tracemalloc).
+
+Запуск из корня проекта:  python -m benchmarks.bench_rows [--db medclinic.db] [--rows N] [--repeat N]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+import db
+from rows import PatientListRow, PaymentListRow, ServiceListRow, factory
+
+LISTS = [
+    ('patients', PatientListRow, "FROM Patients ORDER BY Patients.FIO, Patients.id LIMIT ?", "Patients.*"),
+    ('services', ServiceListRow, "FROM Services ORDER BY Services.Name, Services.id LIMIT ?", "Services.*"),
+    ('payments', PaymentListRow, """
+        FROM Payments
+        JOIN Patients ON Payments.id_patient = Patients.id
+        JOIN Services ON Payments.id_service = Services.id
+        JOIN Employees ON Payments.employee_id = Employees.id
+        ORDER BY Payments.Date DESC, Payments.id DESC LIMIT ?
+    """, "Payments.*, Patients.*, Services.*, Employees.*"),
+]
+
+
+def dict_factory(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def fetch(conn, query, limit, row_factory):
+    cursor = conn.cursor()
+    cursor.row_factory = row_factory
+    return cursor.execute(query, (limit,)).fetchall()
+
+
+def measure(conn, query, limit, row_factory, repeat):
+    """Возвращает (лучшее время в мс, байт памяти под результат, число строк)."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fetch(conn, query, limit, row_factory)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    result = fetch(conn, query, limit, row_factory)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, size, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='medclinic.db', help='исходная база (копируется во временный каталог)')
+    parser.add_argument('--rows', type=int, default=5000, help='строк в списке')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        db_copy = os.path.join(workdir, 'bench.db')
+        shutil.copyfile(args.db, db_copy)
+        conn = db.connect(db_copy)
+        print(f"{'':<44}{'rows':>8}{'ms':>10}{'KB':>10}")
+        for title, row_type, source, star in LISTS:
+            variants = [
+                ('SELECT *, tuples', f"SELECT {star} {source}", None),
+                ('SELECT *, sqlite3.Row', f"SELECT {star} {source}", sqlite3.Row),
+                ('SELECT *, dicts', f"SELECT {star} {source}", dict_factory),
+                (f'projection, {row_type.__name__}', f"SELECT {row_type.select} {source}", factory(row_type)),
+            ]
+            for variant, query, row_factory in variants:
+                elapsed, size, count = measure(conn, query, args.rows, row_factory, args.repeat)
+                print(f"{title + ': ' + variant:<44}{count:>8}{elapsed:>10.2f}{size / 1024:>10.0f}")
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
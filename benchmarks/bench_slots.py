@@ -0,0 +1,131 @@
+"""Поиск свободного времени врача: запросы к базе по дням против индекса занятых слотов.
+
+Также измеряется стоимость проверки двойной записи триггером при вставке приема.
+Для показательных результатов используйте большую базу, созданную generate_data.py.
+
+Запуск из корня проекта:  python -m benchmarks.bench_slots [--db instance/synthetic.db] [--queries N]
+"""
+import argparse
+import datetime
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import db
+import migrations
+from scheduling import SlotIndex
+
+
+def naive_next_free(conn, index, doctor_id, start, limit):
+    """Прежний способ: для каждого дня запрашивает занятое время врача и перебирает слоты."""
+    result = []
+    for offset in range(index.horizon_days):
+        date = start.date() + datetime.timedelta(days=offset)
+        if date.weekday() not in index.workdays:
+            continue
+        booked = {index.slot_of(row[0]) for row in conn.execute(
+            "SELECT Time FROM Appointments WHERE id_doctor = ? AND Date = ?", (doctor_id, date.isoformat()))}
+        for slot in range(index.slots_per_day):
+            if slot not in booked:
+                result.append((date.isoformat(), index.slot_time(slot)))
+                if len(result) >= limit:
+                    return result
+    return result
+
+
+def measure(func, calls):
+    """Возвращает задержки вызовов в микросекундах."""
+    latencies = []
+    for args in calls:
+        started = time.perf_counter()
+        func(*args)
+        latencies.append((time.perf_counter() - started) * 1e6)
+    return latencies
+
+
+def report(title, latencies):
+    latencies.sort()
+    print(f"{title:<34}{statistics.fmean(latencies):>10.1f}{latencies[len(latencies) // 2]:>10.1f}"
+          f"{latencies[int(len(latencies) * 0.99)]:>10.1f}")
+
+
+def insert_appointments(conn, rows):
+    """Вставляет приемы по одному в отдельных транзакциях; возвращает (мкс на вставку, число отказов)."""
+    rejected = 0
+    started = time.perf_counter()
+    for row in rows:
+        try:
+            conn.execute("INSERT INTO Appointments (id_doctor, id_patient, Date, Time) VALUES (?, ?, ?, ?)", row)
+            conn.commit()
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            rejected += 1
+    return (time.perf_counter() - started) * 1e6 / len(rows), rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='medclinic.db', help='исходная база (копируется во временный каталог)')
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=10, help='свободных слотов в ответе')
+    parser.add_argument('--inserts', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        db_copy = os.path.join(workdir, 'bench.db')
+        shutil.copyfile(args.db, db_copy)
+        migrations.upgrade(db_copy)
+        conn = db.connect(db_copy)
+        rng = random.Random(args.seed)
+        doctor_ids = [row[0] for row in conn.execute("SELECT DISTINCT id_doctor FROM Appointments")]
+        first, last = conn.execute("SELECT min(Date), max(Date) FROM Appointments").fetchone()
+        appointments = conn.execute("SELECT count(*) FROM Appointments").fetchone()[0]
+        first = datetime.date.fromisoformat(first)
+        span = (datetime.date.fromisoformat(last) - first).days
+        # Поиск начинается с произвольного момента истории, где у врачей уже есть записи
+        calls = [(rng.choice(doctor_ids),
+                  datetime.datetime.combine(first + datetime.timedelta(days=rng.randint(0, span)),
+                                            datetime.time(rng.randint(8, 19))),
+                  args.limit)
+                 for _ in range(args.queries)]
+
+        def loader(doctor_id, date_from):
+            return conn.execute("SELECT Date, Time FROM Appointments WHERE id_doctor = ? AND Date >= ?",
+                                (doctor_id, date_from))
+
+        index = SlotIndex(loader, ttl=3600)
+        print(f"Appointments: {appointments}, doctors: {len(doctor_ids)}, queries: {args.queries}, "
+              f"slots per answer: {args.limit}")
+        print(f"{'':<34}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}")
+        report('SQL query per day', measure(lambda *a: naive_next_free(conn, index, *a), calls))
+        # Индекс загружается с самой ранней даты, поэтому дальнейшие запросы обслуживаются из памяти
+        started = time.perf_counter()
+        for doctor_id in doctor_ids:
+            index.next_free(doctor_id, datetime.datetime.combine(first, datetime.time()), 1)
+        print(f"{'index load (all doctors)':<34}{(time.perf_counter() - started) * 1e6:>10.1f}")
+        report('slot index', measure(index.next_free, calls))
+
+        # Вставка на случайные слоты в будущем: часть попадает на уже занятое время
+        day = datetime.date.fromisoformat(last) + datetime.timedelta(days=1)
+        rows = [(rng.choice(doctor_ids), 1, (day + datetime.timedelta(days=rng.randint(0, 5))).isoformat(),
+                 index.slot_time(rng.randrange(index.slots_per_day))) for _ in range(args.inserts)]
+        with_check, rejected = insert_appointments(conn, rows)
+        conn.execute("DELETE FROM Appointments WHERE Date >= ?", (day.isoformat(),))
+        conn.execute("DROP TRIGGER appointments_no_double_booking_insert")
+        conn.commit()
+        without_check, _ = insert_appointments(conn, rows)
+        print(f"insert without double-booking check: {without_check:8.1f} us")
+        print(f"insert with trigger check:           {with_check:8.1f} us  ({rejected} of {len(rows)} rejected)")
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
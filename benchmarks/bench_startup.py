@@ -0,0 +1,134 @@
+"""Время запуска и пропускная способность: сервер разработки (app.run) против рабочего режима (wsgi.py).
+
+Каждый сервер запускается в отдельном процессе на копии базы; измеряется время от запуска
+до первого ответа и число запросов в секунду при нескольких одновременных клиентах.
+
+Запуск из корня проекта:  python -m benchmarks.bench_startup [--db medclinic.db] [--duration S]
+                          [--clients N] [--workers N]
+"""
+import argparse
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTES = ['/patients', '/patients/1', '/employees', '/services', '/appointments', '/payments', '/payments/1']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def import_time(statement):
+    """Возвращает время выполнения statement в новом интерпретаторе, в миллисекундах (медиана из 5)."""
+    code = f'import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)'
+    runs = [float(subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True,
+                                 check=True).stdout) * 1000 for _ in range(5)]
+    return statistics.median(runs)
+
+
+def start_server(command, env, port):
+    """Запускает сервер и возвращает (процесс, секунд до первого успешного ответа)."""
+    started = time.perf_counter()
+    # Отдельная группа процессов, чтобы остановить и дочерние процессы сервера
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    while time.perf_counter() - started < 30:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/patients', timeout=1) as response:
+                response.read()
+            return process, time.perf_counter() - started
+        except OSError:
+            time.sleep(0.02)
+    stop_server(process)
+    raise RuntimeError(f'server did not start: {" ".join(command)}')
+
+
+def load(port, clients, duration):
+    """Отправляет запросы из clients потоков в течение duration секунд; возвращает (запросов/с, задержки в мс)."""
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        i = offset
+        own = []
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}{ROUTES[i % len(ROUTES)]}') as response:
+                response.read()
+            own.append((time.perf_counter() - started) * 1000)
+            i += 1
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return len(latencies) / (time.perf_counter() - started), latencies
+
+
+def stop_server(process):
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='medclinic.db', help='исходная база (копируется во временный каталог)')
+    parser.add_argument('--duration', type=float, default=10.0, help='секунд нагрузки на каждый сервер')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"import medclinic:                         {import_time('import medclinic'):8.1f} ms")
+    print(f"import medclinic + docxtpl + openpyxl:    "
+          f"{import_time('import medclinic, docxtpl, openpyxl'):8.1f} ms  (eager document libraries)")
+
+    workdir = tempfile.mkdtemp()
+    try:
+        db_copy = os.path.join(workdir, 'bench.db')
+        shutil.copyfile(args.db, db_copy)
+        env = dict(os.environ, MEDCLINIC_DATABASE=db_copy, MEDCLINIC_JOBS_DIR=os.path.join(workdir, 'jobs'),
+                   PYTHONUNBUFFERED='1')
+        dev_port, prod_port = free_port(), free_port()
+        servers = [
+            ('dev server (app.run, debug)',
+             [sys.executable, '-c', f'import medclinic; medclinic.create_app().run(debug=True, port={dev_port})'],
+             dev_port),
+            (f'wsgi.py ({args.workers} workers)',
+             [sys.executable, 'wsgi.py', '--bind', f'127.0.0.1:{prod_port}', '--workers', str(args.workers)],
+             prod_port),
+        ]
+        print(f"{'':<32}{'startup s':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for title, command, port in servers:
+            process, startup = start_server(command, env, port)
+            try:
+                throughput, latencies = load(port, args.clients, args.duration)
+            finally:
+                stop_server(process)
+            print(f"{title:<32}{startup:>10.2f}{throughput:>10.1f}{latencies[len(latencies) // 2]:>10.2f}"
+                  f"{latencies[int(len(latencies) * 0.99)]:>10.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
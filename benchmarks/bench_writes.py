@@ -0,0 +1,129 @@
+"""Поток записи с групповой фиксацией против фиксации каждой вставки на своем соединении.
+
+Несколько клиентов одновременно вставляют платежи в течение заданного времени; измеряется
+число записей в секунду, задержки и число ошибок "database is locked" для каждого уровня
+надежности (PRAGMA synchronous).
+
+Запуск из корня проекта:  python -m benchmarks.bench_writes [--db medclinic.db] [--clients N]
+                          [--duration S] [--durability normal full]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+import backup
+import db
+import migrations
+from writer import DURABILITY, GroupCommitWriter
+
+INSERT = "INSERT INTO Payments (id_patient, id_service, Date, Summ, payment_time, employee_id) VALUES (?, ?, ?, ?, ?, ?)"
+ROW = (1, 1, '2024-06-01', 1500, '10:00', 1)
+
+
+def run_clients(clients, duration, write):
+    """Вызывает write() из clients потоков duration секунд; возвращает (записей/с, задержки мс, ошибки)."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        own, failed = [], []
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                write()
+            except sqlite3.OperationalError as e:
+                failed.append(str(e))
+                continue
+            own.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(own)
+            errors.extend(failed)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return len(latencies) / (time.perf_counter() - started), latencies, errors
+
+
+def direct(db_path, pragmas, clients, duration):
+    """Прежний способ: у каждого клиента свое соединение, каждая вставка фиксируется отдельно."""
+    local = threading.local()
+    connections = []
+
+    def write():
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = db.connect(db_path, pragmas)
+            connections.append(conn)
+        try:
+            conn.execute(INSERT, ROW)
+            conn.commit()
+        except sqlite3.OperationalError:
+            conn.rollback()
+            raise
+
+    result = run_clients(clients, duration, write)
+    for conn in connections:
+        conn.close()
+    return result, None
+
+
+def grouped(db_path, pragmas, clients, duration, max_delay):
+    writer = GroupCommitWriter(db_path, pragmas, max_delay=max_delay)
+    result = run_clients(clients, duration, lambda: writer.execute(INSERT, ROW))
+    writer.close()
+    return result, writer.stats()
+
+
+def report(title, result):
+    (throughput, latencies, errors), stats = result
+    p50 = latencies[len(latencies) // 2] if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+    batch = stats['writes_per_commit'] if stats else 1
+    print(f"{title:<36}{throughput:>10.0f}{p50:>9.2f}{p99:>9.2f}{batch:>9}{len(errors):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='medclinic.db', help='исходная база (копируется во временный каталог)')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5.0, help='секунд на каждый вариант')
+    parser.add_argument('--durability', nargs='+', choices=list(DURABILITY), default=['normal', 'full'])
+    parser.add_argument('--max-delay-ms', type=float, default=2.0, help='окно ожидания для варианта с окном')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        # Каждый вариант начинает с одной и той же базы: эталон копируется заново перед замером
+        fixture = backup.save_fixture(args.db, os.path.join(workdir, 'fixture.db'))
+        migrations.upgrade(fixture)
+        print(f"{args.clients} clients, {args.duration:g} s per variant")
+        print(f"{'':<36}{'writes/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'batch':>9}{'errors':>8}")
+        for durability in args.durability:
+            pragmas = dict(db.DEFAULT_PRAGMAS, synchronous=DURABILITY[durability])
+            variants = [
+                ('commit per insert', lambda path: direct(path, pragmas, args.clients, args.duration)),
+                ('group commit', lambda path: grouped(path, pragmas, args.clients, args.duration, 0.0)),
+                (f'group commit, {args.max_delay_ms:g} ms window',
+                 lambda path: grouped(path, pragmas, args.clients, args.duration, args.max_delay_ms / 1000)),
+            ]
+            for title, run in variants:
+                db_copy = os.path.join(workdir, 'bench.db')
+                backup.load_fixture(fixture, db_copy)
+                report(f'{durability}: {title}', run(db_copy))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
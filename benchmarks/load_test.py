@@ -0,0 +1,301 @@
+"""Нагрузочный тест всех маршрутов приложения: задержки по перцентилям и пропускная способность.
+
+Запросы выполняются через тестовый клиент Flask по копии базы (например, созданной
+generate_data.py). Результаты можно сохранить как эталон и сравнивать с ним последующие
+запуски: при замедлении сценария больше допустимого скрипт завершается с кодом 1.
+
+Запуск из корня проекта:  python -m benchmarks.load_test [--db instance/synthetic.db] [--requests N]
+                          [--threads N] [--save-baseline [FILE]] [--compare [FILE]]
+"""
+import argparse
+import datetime
+import fnmatch
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import medclinic
+
+DEFAULT_BASELINE = os.path.join('instance', 'load_test_baseline.json')
+PERCENTILES = (50, 90, 95, 99)
+
+
+class Dataset:
+    """Сведения о тестовой базе, по которым сценарии выбирают существующие записи."""
+
+    def __init__(self, db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            self.counts = {table: conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+                           for table in ('Patients', 'Employees', 'Services', 'Appointments', 'Payments')}
+            self.ids = {table: [row[0] for row in conn.execute(f"SELECT id FROM {table}")]
+                        for table in ('Patients', 'Employees', 'Services')}
+            self.max_ids = {table: conn.execute(f"SELECT max(id) FROM {table}").fetchone()[0] or 1
+                            for table in ('Appointments', 'Payments')}
+            self.first_date, self.last_date = conn.execute("SELECT min(Date), max(Date) FROM Payments").fetchone()
+            self.fio_prefixes = sorted({row[0][:4] for row in conn.execute("SELECT FIO FROM Employees")})
+        finally:
+            conn.close()
+
+    def id(self, rng, table):
+        if table in self.ids:
+            return rng.choice(self.ids[table])
+        return rng.randint(1, self.max_ids[table])
+
+    def month(self, rng):
+        """Возвращает случайный месяц в пределах данных как пару дат (начало, конец)."""
+        first = datetime.date.fromisoformat(self.first_date or '2024-01-01')
+        last = datetime.date.fromisoformat(self.last_date or '2024-12-31')
+        start = first + datetime.timedelta(days=rng.randint(0, max((last - first).days - 30, 0)))
+        return start.isoformat(), (start + datetime.timedelta(days=30)).isoformat()
+
+
+# --- Сценарии ---
+# Каждый сценарий по генератору случайных чисел и набору данных возвращает (метод, URL, данные формы);
+# список вместо данных формы отправляется как тело JSON
+def edit_patient(rng, data):
+    patient = medclinic.get_patient_from_db(data.id(rng, 'Patients'))
+    return 'POST', f'/patients/{patient[0]}/edit', {
+        'fio': patient[1], 'date_of_birth': patient[2] or '', 'phone': patient[3] or '',
+        'address': patient[4] or '', 'insurance_policy': patient[5] or ''}
+
+
+def edit_appointment(rng, data):
+    appointment = None
+    while appointment is None:
+        appointment = medclinic.get_appointment_from_db(data.id(rng, 'Appointments'))
+    return 'POST', f'/appointments/{appointment[0]}/edit', {
+        'date': appointment[1], 'time': appointment[2], 'doctor': appointment[5], 'patient': appointment[6]}
+
+
+def edit_payment(rng, data):
+    payment = None
+    while payment is None:
+        payment = medclinic.get_payment_from_db(data.id(rng, 'Payments'))
+    return 'POST', f'/payments/{payment[0]}/edit', {
+        'date': payment[1], 'time': payment[2] or '', 'patient': payment[8], 'service': payment[9],
+        'summ': payment[5], 'employee': payment[10]}
+
+
+def workload_report(report_format):
+    def scenario(rng, data):
+        start, end = data.month(rng)
+        return 'POST', '/generate_workload_report', {'start_date': start, 'end_date': end, 'format': report_format}
+    return scenario
+
+
+def payments_month(rng, data):
+    start, end = data.month(rng)
+    return 'GET', f'/payments?date_from={start}&date_to={end}', None
+
+
+def appointments_doctor(rng, data):
+    start, end = data.month(rng)
+    return 'GET', f'/appointments?date_from={start}&date_to={end}&doctor={data.id(rng, "Employees")}', None
+
+
+def api_payments_month(rng, data):
+    start, end = data.month(rng)
+    return 'GET', f'/api/v1/payments?date_from={start}&date_to={end}&fields=id,date,patient,amount', None
+
+
+def api_appointments_batch(rng, data):
+    items = []
+    for _ in range(20):
+        appointment = medclinic.get_appointment_from_db(data.id(rng, 'Appointments'))
+        if appointment is not None:
+            items.append({'id': appointment[0], 'complaints': appointment[7]})
+    return 'PATCH', '/api/v1/appointments', items
+
+
+def payment_checks_batch(rng, data):
+    ids = ','.join(str(data.id(rng, 'Payments')) for _ in range(20))
+    return 'POST', '/generate_payment_checks', {'payment_ids': ids}
+
+
+SCENARIOS = {
+    'patients_list': lambda rng, data: ('GET', '/patients', None),
+    'patients_search': lambda rng, data: ('GET', f'/patients?q={rng.choice(data.fio_prefixes)}', None),
+    'patient_details': lambda rng, data: ('GET', f'/patients/{data.id(rng, "Patients")}', None),
+    'patient_edit_form': lambda rng, data: ('GET', f'/patients/{data.id(rng, "Patients")}/edit', None),
+    'patient_edit_submit': edit_patient,
+    'employees_list': lambda rng, data: ('GET', '/employees', None),
+    'employee_details': lambda rng, data: ('GET', f'/employees/{data.id(rng, "Employees")}', None),
+    'services_list': lambda rng, data: ('GET', '/services', None),
+    'service_details': lambda rng, data: ('GET', f'/services/{data.id(rng, "Services")}', None),
+    'appointments_list': lambda rng, data: ('GET', '/appointments', None),
+    'appointments_doctor_month': appointments_doctor,
+    'appointment_details': lambda rng, data: ('GET', f'/appointments/{data.id(rng, "Appointments")}', None),
+    'appointment_edit_submit': edit_appointment,
+    'free_slots_doctor': lambda rng, data: ('GET', f'/api/slots?doctor={data.id(rng, "Employees")}', None),
+    'payments_list': lambda rng, data: ('GET', '/payments', None),
+    'payments_month': payments_month,
+    'payment_details': lambda rng, data: ('GET', f'/payments/{data.id(rng, "Payments")}', None),
+    'payment_edit_form': lambda rng, data: ('GET', f'/payments/{data.id(rng, "Payments")}/edit', None),
+    'payment_edit_submit': edit_payment,
+    'add_payment_form': lambda rng, data: ('GET', '/add_payment', None),
+    'payment_check': lambda rng, data: ('GET', f'/generate_payment_check/{data.id(rng, "Payments")}', None),
+    'payment_checks_batch': payment_checks_batch,
+    'workload_report_xlsx': workload_report('xlsx'),
+    'workload_report_csv': workload_report('csv'),
+    'dashboard': lambda rng, data: ('GET', '/dashboard', None),
+    'api_patients_search': lambda rng, data: ('GET', f'/api/patients/search?q={rng.choice(data.fio_prefixes)}',
+                                              None),
+    'api_patients_list': lambda rng, data: ('GET', '/api/v1/patients', None),
+    'api_payments_month': api_payments_month,
+    'api_payment_details': lambda rng, data: ('GET', f'/api/v1/payments/{data.id(rng, "Payments")}', None),
+    'api_appointments_batch_update': api_appointments_batch,
+}
+
+
+def percentile(sorted_values, p):
+    """Перцентиль p (0-100) упорядоченного списка с линейной интерполяцией."""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (k - low)
+
+
+def run_scenario(scenario, data, requests, threads, warmup, seed):
+    """Выполняет сценарий и возвращает статистику задержек в миллисекундах."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(worker_id, count, record):
+        rng = random.Random(seed * 1000 + worker_id)
+        client = medclinic.app.test_client()
+        for _ in range(count):
+            method, url, form = scenario(rng, data)
+            started = time.perf_counter()
+            if isinstance(form, list):
+                response = client.open(url, method=method, json=form)
+            else:
+                response = client.open(url, method=method, data=form)
+            response.get_data()  # потоковые ответы формируются при чтении
+            elapsed = (time.perf_counter() - started) * 1000
+            response.close()
+            if not record:
+                continue
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code >= 400:
+                    errors.append(f'{method} {url}: {response.status_code}')
+
+    worker(-1, warmup, False)
+    per_thread = [requests // threads + (1 if i < requests % threads else 0) for i in range(threads)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(worker, i, count, True) for i, count in enumerate(per_thread)]:
+            future.result()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput': round(len(latencies) / wall, 2) if wall else 0.0,
+        'mean_ms': round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+    }
+    for p in PERCENTILES:
+        result[f'p{p}_ms'] = round(percentile(latencies, p), 3)
+    if errors:
+        result['first_error'] = errors[0]
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Сравнивает результаты с эталоном и возвращает список строк о замедлившихся сценариях."""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get('scenarios', {}).get(name)
+        if not reference:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            if reference[metric] and result[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(f'{name}: {metric} {reference[metric]:.2f} -> {result[metric]:.2f} ms '
+                                   f'(x{result[metric] / reference[metric]:.2f})')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='medclinic.db', help='исходная база (копируется во временный каталог)')
+    parser.add_argument('--requests', type=int, default=200, help='запросов на сценарий')
+    parser.add_argument('--threads', type=int, default=1, help='одновременных клиентов')
+    parser.add_argument('--warmup', type=int, default=5, help='запросов на прогрев перед замером')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--only', help='шаблон имен сценариев, например "payment*"')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, metavar='FILE')
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, metavar='FILE')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='допустимое замедление (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    scenarios = {name: scenario for name, scenario in SCENARIOS.items()
+                 if not args.only or fnmatch.fnmatch(name, args.only)}
+    workdir = tempfile.mkdtemp()
+    try:
+        db_copy = os.path.join(workdir, 'bench.db')
+        shutil.copyfile(args.db, db_copy)
+        medclinic.app.config['DATABASE'] = db_copy
+        medclinic.app.config['JOBS_DIR'] = os.path.join(workdir, 'jobs')
+        data = Dataset(db_copy)
+
+        print(f"Dataset: {', '.join(f'{table} {count}' for table, count in data.counts.items())}")
+        print(f"{'scenario':<28}{'req/s':>9}{'mean':>9}" + ''.join(f"{f'p{p}':>9}" for p in PERCENTILES)
+              + f"{'max':>9}{'errors':>8}")
+        results = {}
+        for name, scenario in scenarios.items():
+            result = run_scenario(scenario, data, args.requests, args.threads, args.warmup, args.seed)
+            results[name] = result
+            print(f"{name:<28}{result['throughput']:>9.1f}{result['mean_ms']:>9.2f}"
+                  + ''.join(f"{result[f'p{p}_ms']:>9.2f}" for p in PERCENTILES)
+                  + f"{result['max_ms']:>9.2f}{result['errors']:>8}")
+        medclinic.close_db()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    failed = [f"{name}: {result['first_error']}" for name, result in results.items() if result['errors']]
+    for line in failed:
+        print(f'ERROR {line}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if not regressions:
+            print(f'No regressions against {args.compare} (tolerance {args.tolerance:.0%}).')
+        failed += regressions
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'dataset': data.counts,
+                'requests': args.requests,
+                'threads': args.threads,
+                'scenarios': results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f'Baseline saved to {args.save_baseline}.')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+"""Пакетная загрузка пациентов, приемов и платежей из файлов CSV и XLSX.
+
+Файл читается потоково, строки проверяются, ссылки на сотрудников, пациентов и услуги
+разрешаются по справочникам, загруженным в память, а вставка выполняется пачками
+через executemany, по одной транзакции на пачку.
+
+Запуск:  python bulk_import.py patients|appointments|payments файл.csv [--db medclinic.db]
+"""
+import argparse
+import csv
+import datetime
+import io
+import sqlite3
+import sys
+import time
+
+import db
+import migrations
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+class RowError(Exception):
+    """Строка файла не прошла проверку."""
+
+
+# --- Чтение файлов ---
+def iter_csv_rows(fileobj, encoding='utf-8-sig'):
+    """Выдает строки CSV-файла (открытого в двоичном режиме) в виде словарей.
+
+    Разделитель (',' или ';') определяется по строке заголовка.
+    """
+    text = io.TextIOWrapper(fileobj, encoding=encoding, newline='')
+    header = text.readline()
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    fields = next(csv.reader([header], delimiter=delimiter))
+    yield from csv.DictReader(text, fieldnames=fields, delimiter=delimiter)
+
+
+def iter_xlsx_rows(fileobj):
+    """Выдает строки первого листа XLSX-файла в виде словарей; первая строка - заголовок."""
+    import openpyxl
+
+    wb = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        fields = [str(value) if value is not None else '' for value in next(rows, ())]
+        for values in rows:
+            yield dict(zip(fields, values))
+    finally:
+        wb.close()
+
+
+def iter_rows(fileobj, filename):
+    """Выбирает способ чтения по расширению файла."""
+    if filename.lower().endswith('.xlsx'):
+        return iter_xlsx_rows(fileobj)
+    return iter_csv_rows(fileobj)
+
+
+# --- Проверка значений ---
+def _text(row, name, required=False):
+    value = row.get(name)
+    if isinstance(value, str):
+        value = value.strip()
+    if value is None or value == '':
+        if required:
+            raise RowError(f'не заполнено поле {name}')
+        return None
+    return str(value)
+
+
+def _date(row, name, required=False):
+    value = row.get(name)
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    value = _text(row, name, required)
+    if value is None:
+        return None
+    for fmt in ('%Y-%m-%d', '%d.%m.%Y'):
+        try:
+            return datetime.datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            pass
+    raise RowError(f'неверная дата в поле {name}: {value}')
+
+
+def _time(row, name, required=False):
+    value = row.get(name)
+    if isinstance(value, (datetime.time, datetime.datetime)):
+        return value.strftime('%H:%M')
+    value = _text(row, name, required)
+    if value is None:
+        return None
+    for fmt in ('%H:%M', '%H:%M:%S'):
+        try:
+            return datetime.datetime.strptime(value, fmt).strftime('%H:%M')
+        except ValueError:
+            pass
+    raise RowError(f'неверное время в поле {name}: {value}')
+
+
+def _number(row, name, required=False):
+    value = row.get(name)
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = _text(row, name, required)
+    if value is None:
+        return None
+    try:
+        return float(value.replace(' ', '').replace(',', '.'))
+    except ValueError:
+        raise RowError(f'неверное число в поле {name}: {value}')
+
+
+# --- Справочники для разрешения ссылок ---
+class Lookup:
+    """Соответствие значения (ФИО, код, полис) идентификатору записи; неоднозначные значения отмечаются."""
+
+    def __init__(self, title, rows):
+        self.title = title
+        self.ids = set()
+        self._by_value = {}
+        for row_id, *values in rows:
+            self.ids.add(row_id)
+            for value in values:
+                if value is None:
+                    continue
+                key = str(value).strip().casefold()
+                self._by_value[key] = None if key in self._by_value and self._by_value[key] != row_id else row_id
+
+    def resolve(self, row, id_field, value_field):
+        """Возвращает идентификатор по полю *_id или по значению из поля value_field."""
+        raw_id = _text(row, id_field)
+        if raw_id is not None:
+            try:
+                row_id = int(float(raw_id))
+            except ValueError:
+                raise RowError(f'неверный номер в поле {id_field}: {raw_id}')
+            if row_id not in self.ids:
+                raise RowError(f'{self.title} № {row_id} не найден')
+            return row_id
+        value = _text(row, value_field, required=True)
+        key = value.casefold()
+        if key not in self._by_value:
+            raise RowError(f'{self.title} «{value}» не найден')
+        row_id = self._by_value[key]
+        if row_id is None:
+            raise RowError(f'{self.title} «{value}» найден несколько раз, укажите {id_field}')
+        return row_id
+
+
+# --- Описание загружаемых таблиц ---
+class Importer:
+    """Загрузчик одной таблицы: проверяет строки файла и вставляет их пачками."""
+
+    table = None
+    insert = None
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def convert(self, row):
+        """Преобразует строку файла в кортеж параметров INSERT или вызывает RowError."""
+        raise NotImplementedError
+
+
+class PatientsImporter(Importer):
+    table = 'Patients'
+    insert = "INSERT INTO Patients (FIO, DateOfBirth, PhoneNumber, Address, InsurancePolicy) VALUES (?, ?, ?, ?, ?)"
+
+    def convert(self, row):
+        return (_text(row, 'fio', required=True), _date(row, 'date_of_birth'), _text(row, 'phone'),
+                _text(row, 'address'), _text(row, 'insurance_policy'))
+
+
+class AppointmentsImporter(Importer):
+    table = 'Appointments'
+    insert = ("INSERT INTO Appointments (id_doctor, id_patient, Date, Time, Complaints, PreliminaryDiagnosis) "
+              "VALUES (?, ?, ?, ?, ?, ?)")
+
+    def __init__(self, conn):
+        super().__init__(conn)
+        self.doctors = Lookup('Врач', conn.execute("SELECT id, FIO FROM Employees"))
+        self.patients = Lookup('Пациент', conn.execute("SELECT id, FIO, InsurancePolicy FROM Patients"))
+
+    def convert(self, row):
+        return (self.doctors.resolve(row, 'doctor_id', 'doctor'),
+                self.patients.resolve(row, 'patient_id', 'patient'),
+                _date(row, 'date', required=True), _time(row, 'time', required=True),
+                _text(row, 'complaints'), _text(row, 'preliminary_diagnosis'))
+
+
+class PaymentsImporter(Importer):
+    table = 'Payments'
+    insert = ("INSERT INTO Payments (id_patient, id_service, Date, Summ, payment_time, employee_id) "
+              "VALUES (?, ?, ?, ?, ?, ?)")
+
+    def __init__(self, conn):
+        super().__init__(conn)
+        self.patients = Lookup('Пациент', conn.execute("SELECT id, FIO, InsurancePolicy FROM Patients"))
+        self.services = Lookup('Услуга', conn.execute("SELECT id, Code, Name FROM Services"))
+        self.employees = Lookup('Сотрудник', conn.execute("SELECT id, FIO FROM Employees"))
+        self.costs = dict(conn.execute("SELECT id, Cost FROM Services"))
+
+    def convert(self, row):
+        service = self.services.resolve(row, 'service_id', 'service')
+        summ = _number(row, 'summ')
+        # Платеж без кассира не попал бы в списки и чеки, соединяющие платежи с сотрудниками
+        employee = self.employees.resolve(row, 'employee_id', 'employee')
+        return (self.patients.resolve(row, 'patient_id', 'patient'), service, _date(row, 'date', required=True),
+                summ if summ is not None else self.costs[service], _time(row, 'time'), employee)
+
+
+IMPORTERS = {
+    'patients': PatientsImporter,
+    'appointments': AppointmentsImporter,
+    'payments': PaymentsImporter,
+}
+
+
+class ImportReport:
+    """Итоги загрузки: число принятых строк и отклоненные строки с причинами."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.processed = 0
+        self.inserted = 0
+        self.rejected = []  # (номер строки в файле, причина, исходная строка)
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+
+def import_rows(conn, kind, rows, batch_size=DEFAULT_BATCH_SIZE, progress=None, max_rejected=None, write=None):
+    """Загружает строки rows (словари) в таблицу kind и возвращает ImportReport.
+
+    progress, если указана, вызывается с отчетом после каждой записанной пачки.
+    Отклоненных строк хранится не больше max_rejected (None - без ограничения).
+    Справочники читаются через conn, а пачки записываются функцией write(func), которая
+    выполняет func(соединение) в транзакции и возвращает ее результат; без write каждая
+    пачка записывается в отдельной транзакции на conn.
+    """
+    importer = IMPORTERS[kind](conn)
+    report = ImportReport(kind)
+    batch = []  # (номер строки, исходная строка, параметры INSERT)
+
+    def reject(line, error, row):
+        if max_rejected is None or len(report.rejected) < max_rejected:
+            report.rejected.append((line, error, row))
+
+    def insert_rows(write_conn, rows):
+        """Вставляет строки по одной, пропуская те, что нарушают ограничения базы.
+
+        Возвращает число вставленных строк и пропущенные строки с причинами.
+        """
+        inserted, failed = 0, []
+        for line, row, params in rows:
+            try:
+                write_conn.execute(importer.insert, params)
+                inserted += 1
+            except sqlite3.IntegrityError as e:
+                failed.append((line, str(e), row))
+        return inserted, failed
+
+    def insert_batch(write_conn):
+        # Точка сохранения откатывает частично вставленную пачку, не затрагивая внешнюю транзакцию
+        write_conn.execute("SAVEPOINT import_batch")
+        try:
+            write_conn.executemany(importer.insert, [params for _, _, params in batch])
+            result = len(batch), []
+        except sqlite3.IntegrityError:
+            # Например, запись на занятое время: повторяем пачку по одной строке
+            write_conn.execute("ROLLBACK TO import_batch")
+            result = insert_rows(write_conn, batch)
+        write_conn.execute("RELEASE import_batch")
+        return result
+
+    def write_in_transaction(func):
+        conn.execute("BEGIN")
+        try:
+            result = func(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return result
+
+    def flush():
+        # Отклоненные строки учитываются после записи: при повторе транзакции пачка выполняется заново
+        inserted, failed = (write or write_in_transaction)(insert_batch)
+        report.inserted += inserted
+        for failure in failed:
+            reject(*failure)
+        batch.clear()
+        if progress:
+            progress(report)
+
+    # Первая строка файла - заголовок, поэтому данные начинаются со второй
+    for line, row in enumerate(rows, 2):
+        report.processed += 1
+        row = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+        try:
+            batch.append((line, row, importer.convert(row)))
+        except RowError as e:
+            reject(line, str(e), row)
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    report.elapsed = time.perf_counter() - report.started
+    return report
+
+
+def write_rejected(report, path):
+    """Сохраняет отклоненные строки в CSV-файл с причиной отказа."""
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(['line', 'error', 'row'])
+        for line, error, row in report.rejected:
+            writer.writerow([line, error, row])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('kind', choices=sorted(IMPORTERS))
+    parser.add_argument('file')
+    parser.add_argument('--db', default='medclinic.db')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--rejected', help='CSV-файл для отклоненных строк')
+    args = parser.parse_args()
+
+    migrations.upgrade(args.db)
+    conn = db.connect(args.db)
+
+    def progress(report):
+        print(f"\r{report.inserted} rows inserted, {len(report.rejected)} rejected", end='', file=sys.stderr)
+
+    try:
+        with open(args.file, 'rb') as f:
+            report = import_rows(conn, args.kind, iter_rows(f, args.file), args.batch_size, progress)
+    finally:
+        conn.close()
+    print(file=sys.stderr)
+    print(f"Processed {report.processed} rows in {report.elapsed:.1f}s ({report.rows_per_second:.0f} rows/s): "
+          f"{report.inserted} inserted, {len(report.rejected)} rejected.")
+    if report.rejected and args.rejected:
+        write_rejected(report, args.rejected)
+        print(f"Rejected rows written to {args.rejected}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Кэш в памяти с ограничением времени жизни и числа записей.
+
+    Ключ записи - кортеж (группа, аргументы). Группа соответствует таблице базы данных
+    и позволяет сбросить сразу все записи, построенные по этой таблице.
+    """
+
+    def __init__(self, ttl=60, max_entries=128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._generation = 0  # увеличивается при каждом сбросе, чтобы не сохранить устаревшее значение
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        """Возвращает значение из кэша или загружает его функцией loader."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] > now:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            self.misses += 1
+            generation = self._generation
+        value = loader()
+        with self._lock:
+            if generation != self._generation:
+                return value
+            self._items[key] = (now + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return value
+
+    def invalidate(self, *groups):
+        """Удаляет записи указанных групп; без аргументов очищает кэш полностью."""
+        with self._lock:
+            self._generation += 1
+            if not groups:
+                self._items.clear()
+                return
+            for key in [key for key in self._items if key[0] in groups]:
+                del self._items[key]
+
+    def stats(self):
+        """Возвращает счетчики попаданий и промахов."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._items),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else None,
+            }
+
+
+def cached(cache, group):
+    """Декоратор: кэширует результат функции в cache в группе group."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            return cache.get_or_load((group, func.__name__, args), lambda: func(*args))
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+_file_hashes = {}  # (путь, время изменения, размер) -> хэш содержимого
+
+
+def content_fingerprint(*paths):
+    """Возвращает короткий отпечаток содержимого файлов и каталогов paths (каталоги - рекурсивно).
+
+    Файл перечитывается только при изменении его размера или времени изменения, поэтому
+    повторный вызов стоит лишь нескольких stat. Отпечаток не зависит от расположения
+    проекта, так что у всех процессов и серверов с одинаковыми файлами он совпадает.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        else:
+            files = [path]
+        for name in files:
+            stat = os.stat(name)
+            key = (name, stat.st_mtime_ns, stat.st_size)
+            file_hash = _file_hashes.get(key)
+            if file_hash is None:
+                with open(name, 'rb') as f:
+                    file_hash = hashlib.sha256(f.read()).hexdigest()
+                _file_hashes[key] = file_hash
+            digest.update(os.path.relpath(name, os.path.dirname(path)).encode('utf-8'))
+            digest.update(file_hash.encode('ascii'))
+    return digest.hexdigest()[:16]
@@ -0,0 +1,153 @@
+"""Проверяет планы выполнения (EXPLAIN QUERY PLAN) запросов из medclinic.py.
+
+Каждый запрос выполняется через обычные функции приложения, текст SQL перехватывается
+трассировкой соединения, после чего для него строится план. Полный просмотр таблицы (SCAN)
+допускается только там, где запрос по смыслу выбирает всю таблицу (списки).
+
+Проверка выполняется на временной копии базы: приложение при подключении обновляет схему,
+а исходный файл (в том числе medclinic.db из репозитория) должен остаться неизменным.
+
+Запуск:  python check_query_plans.py [путь_к_базе]
+"""
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+import archive
+import medclinic
+
+# Обозначение полного просмотра таблицы архива закрытого года в ветви запроса archive.union
+ARCHIVE_SCAN = '<archive>'
+
+# (название, вызов, таблицы, которые разрешено просматривать целиком)
+CHECKS = [
+    ('get_services_from_db', lambda: medclinic.get_services_from_db(), {'Services'}),
+    ('get_service_from_db', lambda: medclinic.get_service_from_db(1), set()),
+    ('get_patient_from_db', lambda: medclinic.get_patient_from_db(1), set()),
+    ('get_patient_header', lambda: medclinic.get_patient_header(1), set()),
+    ('get_patient_timeline', lambda: medclinic.get_patient_timeline(1, per_page=10), set()),
+    ('get_patient_timeline (cursor)', lambda: medclinic.get_patient_timeline(
+        1, ['2024-03-01', 'payment', 5], per_page=10), set()),
+    ('get_employees_from_db', lambda: medclinic.get_employees_from_db(), {'Employees'}),
+    ('get_employee_from_db', lambda: medclinic.get_employee_from_db(1), set()),
+    ('get_appointment_from_db', lambda: medclinic.get_appointment_from_db(1), set()),
+    ('get_payment_from_db', lambda: medclinic.get_payment_from_db(1), set()),
+    ('get_patients_page', lambda: medclinic.get_patients_page(
+        search='Ив', cursor=['Иванов', 1], per_page=10), set()),
+    ('get_appointments_page', lambda: medclinic.get_appointments_page(
+        date_from='2024-01-01', cursor=['2024-03-01', 3], per_page=10), set()),
+    ('get_appointments_page (doctor)', lambda: medclinic.get_appointments_page(
+        doctor=1, date_from='2024-01-01', per_page=10), set()),
+    ('get_payments_page', lambda: medclinic.get_payments_page(
+        date_from='2024-01-01', date_to='2024-12-31', per_page=10), set()),
+    ('get_payments_page (patient)', lambda: medclinic.get_payments_page(patient=1, per_page=10), set()),
+    ('search_patients', lambda: medclinic.search_patients('Иван'), set()),
+    ('search_patients (short)', lambda: medclinic.search_patients('Ив'), set()),
+    ('get_daily_revenue', lambda: medclinic.get_daily_revenue('2024-01-01', '2024-12-31'), set()),
+    ('get_revenue_by_cashier', lambda: medclinic.get_revenue_by_cashier('2024-01-01', '2024-12-31'), set()),
+    ('get_doctor_load', lambda: medclinic.get_doctor_load('2024-01-01', '2024-12-31'), set()),
+    ('get_booked_slots', lambda: medclinic.get_booked_slots(1, '2024-01-01'), set()),
+    ('get_clinic_info', lambda: medclinic.get_clinic_info(), {'ClinicInfo'}),
+    # Список архивных лет - несколько строк; остальные проверки берут его из кэша
+    ('load_archive_years', lambda: medclinic.load_archive_years.uncached(), {'main.ArchivedPeriods'}),
+    # Архив хранит ровно один год, поэтому отчет за весь год может прочитать его целиком
+    ('workload_report', lambda: medclinic.execute_query(
+        *medclinic.workload_report_query('2024-01-01', '2024-12-31', None)), {ARCHIVE_SCAN}),
+    ('workload_report (employee)', lambda: medclinic.execute_query(
+        *medclinic.workload_report_query('2024-01-01', '2024-12-31', 1)), {ARCHIVE_SCAN}),
+]
+
+
+def archive_rows(plan, sql):
+    """Возвращает id строк плана, относящихся к ветвям архивов в запросе, собранном archive.union."""
+    prefix, separator = 'SELECT * FROM (', ') UNION ALL SELECT * FROM ('
+    compound = next((row[0] for row in plan if row[1] == 0 and row[3] == 'COMPOUND QUERY'), None)
+    if compound is None or not sql.startswith(prefix):
+        return set()
+    branches = sql[len(prefix):].split(separator)
+    heads = [row[0] for row in plan if row[1] == compound]
+    if len(heads) != len(branches):
+        return set()
+    # Ветвь основной базы обращается к main.Appointments / main.Payments, ветви архивов - к archive_<год>.*
+    archived = {head for head, branch in zip(heads, branches)
+                if re.search(rf'\b{archive.schema("")}\d+\.', branch)}
+    parents = {row[0]: row[1] for row in plan}
+    result = set()
+    for row in plan:
+        node = row[0]
+        while node in parents and parents[node] != compound:
+            node = parents[node]
+        if node in archived:
+            result.add(row[0])
+    return result
+
+
+def scanned_tables(plan, sql=''):
+    """Возвращает имена таблиц, которые план просматривает целиком; просмотры архивов - как ARCHIVE_SCAN."""
+    tables = set()
+    in_archive = archive_rows(plan, sql)
+    # Подзапросы, выполняемые как сопрограммы, выдают уже отобранные строки; их просмотр не в счет
+    coroutines = {row[3].split(' ', 1)[1] for row in plan if row[3].startswith('CO-ROUTINE ')}
+    for row in plan:
+        detail = row[3]
+        if detail.startswith('SCAN ') and detail[5:] in coroutines:
+            continue
+        # Поиск по полнотекстовому индексу выглядит как SCAN виртуальной таблицы с ограничением MATCH
+        # SCAN CONSTANT ROW - SELECT без FROM (например, из одних скалярных подзапросов)
+        if detail == 'SCAN CONSTANT ROW':
+            continue
+        if detail.startswith('SCAN ') and 'USING' not in detail and 'VIRTUAL TABLE INDEX' not in detail:
+            tables.add(ARCHIVE_SCAN if row[0] in in_archive else detail.split()[1])
+    return tables
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else medclinic.app.config['DATABASE']
+    workdir = tempfile.mkdtemp(prefix='query-plans-')
+    try:
+        copy_path = os.path.join(workdir, os.path.basename(source))
+        with sqlite3.connect(f'file:{os.path.abspath(source)}?mode=ro', uri=True) as src, \
+                sqlite3.connect(copy_path) as dst:
+            src.backup(dst)
+        medclinic.app.config['DATABASE'] = copy_path
+        # Архивы только читаются, поэтому подключаются из каталога рядом с исходной базой
+        medclinic.app.config['ARCHIVE_DIR'] = medclinic.app.config['ARCHIVE_DIR'] or archive.default_dir(source)
+        failed = check()
+    finally:
+        medclinic.close_db()
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+def check():
+    """Выполняет проверки CHECKS и печатает планы; возвращает число неудачных."""
+    statements = []
+    pool = medclinic.get_db()
+    # Служебные запросы модулей виртуальных таблиц (FTS5) обращаются к схеме явно ('main'.) и пропускаются
+    pool.on_connect.append(lambda conn: conn.set_trace_callback(
+        lambda sql: statements.append(sql) if "'main'." not in sql else None))
+
+    medclinic.get_archive_years()  # список архивных лет читается один раз и дальше берется из кэша
+    failed = 0
+    with pool.connection() as conn:
+        for name, call, allowed_scans in CHECKS:
+            statements.clear()
+            call()
+            for sql in list(statements):
+                plan = conn.execute('EXPLAIN QUERY PLAN ' + sql).fetchall()
+                unexpected = scanned_tables(plan, sql) - allowed_scans
+                status = 'FAIL' if unexpected else 'ok'
+                failed += bool(unexpected)
+                print(f"[{status}] {name}")
+                for row in plan:
+                    print(f"        {row[3]}")
+                if unexpected:
+                    print(f"        full scan of: {', '.join(sorted(unexpected))}")
+    return failed
+
+
+if __name__ == '__main__':
+    main()
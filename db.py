@@ -0,0 +1,107 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Настройки SQLite, применяемые к каждому новому соединению
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,  # около 16 МБ страничного кэша на соединение
+    'mmap_size': 268435456,  # 256 МБ
+    'temp_store': 'MEMORY',
+}
+
+
+def connect(db_path, pragmas=None, cached_statements=256):
+    """Открывает соединение с базой данных и применяет к нему настройки."""
+    conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=cached_statements)
+    for name, value in (DEFAULT_PRAGMAS if pragmas is None else pragmas).items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+class ConnectionPool:
+    """Пул переиспользуемых соединений с базой данных SQLite."""
+
+    def __init__(self, db_path, size=8, pragmas=None, cached_statements=256):
+        self.db_path = db_path
+        self.size = size
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.cached_statements = cached_statements
+        self.on_connect = []  # функции, вызываемые для каждого нового соединения
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._generation = 0
+        self._born = {}  # id(соединения) -> поколение пула, в котором оно открыто
+
+    def _connect(self):
+        """Открывает новое соединение и применяет к нему настройки."""
+        generation = self._generation
+        conn = connect(self.db_path, self.pragmas, self.cached_statements)
+        for hook in self.on_connect:
+            hook(conn)
+        with self._lock:
+            self._born[id(conn)] = generation
+        return conn
+
+    def acquire(self):
+        """Берет свободное соединение из пула или открывает новое."""
+        if self._closed:
+            raise RuntimeError('Пул соединений закрыт')
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        """Возвращает соединение в пул, откатывая незавершенную транзакцию."""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if self._closed or self._idle.qsize() >= self.size or self._born.get(id(conn)) != self._generation:
+                self._born.pop(id(conn), None)
+                conn.close()
+            else:
+                self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Контекстный менеджер, выдающий соединение на время блока."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def iterate(self, query, params=(), chunk_size=1000):
+        """Выполняет запрос и выдает строки результата, читая их с курсора порциями."""
+        with self.connection() as conn:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+
+    def recycle(self):
+        """Закрывает свободные соединения, а занятые - при возврате; новые откроются с вызовом on_connect."""
+        with self._lock:
+            self._generation += 1
+            self._close_idle()
+
+    def _close_idle(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._born.pop(id(conn), None)
+            conn.close()
+
+    def close(self):
+        """Закрывает все свободные соединения; занятые закроются при возврате."""
+        with self._lock:
+            self._closed = True
+            self._close_idle()
@@ -0,0 +1,259 @@
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Индекс хранилища: содержимое адресуется хэшем SHA-256, ключи документов ссылаются на содержимое,
+# поэтому одинаковые документы, сохраненные под разными ключами, хранятся в одном файле.
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS Documents (
+        hash TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        stored_size INTEGER NOT NULL,
+        created REAL NOT NULL,
+        accessed REAL NOT NULL,
+        archived INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_documents_accessed ON Documents (accessed)",
+    """
+    CREATE TABLE IF NOT EXISTS DocumentKeys (
+        key TEXT PRIMARY KEY,
+        hash TEXT NOT NULL REFERENCES Documents (hash) ON DELETE CASCADE,
+        name TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_document_keys_hash ON DocumentKeys (hash)",
+]
+
+
+class DocumentStore:
+    """Хранилище готовых документов на диске с дедупликацией, вытеснением и архивированием.
+
+    Файлы раскладываются по каталогам согласно layout (формат strftime от даты сохранения,
+    например '%Y/%m/%d'), чтобы ни один каталог не разрастался. Индекс хранится в SQLite
+    рядом с файлами, поэтому хранилище могут одновременно использовать несколько процессов.
+
+    Документы, к которым не обращались archive_after секунд, сжимаются gzip; документы старше
+    max_age секунд и самые давно востребованные сверх max_bytes удаляются. Обслуживание
+    выполняется фоновым потоком не чаще раза в maintenance_interval секунд.
+    """
+
+    def __init__(self, root, layout='%Y/%m/%d', max_bytes=1 << 30, max_age=90 * 86400,
+                 archive_after=7 * 86400, maintenance_interval=3600):
+        self.root = root
+        self.layout = layout
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.archive_after = archive_after
+        self.maintenance_interval = maintenance_interval
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(root, 'tmp'), exist_ok=True)
+        self._local = threading.local()
+        self._executor = None
+        self._lock = threading.Lock()
+        self._last_maintenance = time.time()
+        with self._connection() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def _connection(self):
+        """Возвращает соединение с индексом для текущего потока."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.root, 'index.db'), timeout=30)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA foreign_keys = ON")
+            self._local.conn = conn
+        return conn
+
+    def _lookup(self, key):
+        """Возвращает (hash, абсолютный путь, сжат ли файл) для ключа или None; отмечает обращение."""
+        conn = self._connection()
+        row = conn.execute("""
+            SELECT d.hash, d.path, d.archived, d.accessed FROM DocumentKeys k
+            JOIN Documents d ON d.hash = k.hash WHERE k.key = ?
+        """, (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        digest, path, archived, accessed = row
+        path = os.path.join(self.root, path)
+        if not os.path.exists(path):
+            # Файл удален в обход хранилища
+            with conn:
+                conn.execute("DELETE FROM Documents WHERE hash = ?", (digest,))
+            self.misses += 1
+            return None
+        now = time.time()
+        if now - accessed > 60:  # время обращения обновляется не чаще раза в минуту
+            with conn:
+                conn.execute("UPDATE Documents SET accessed = ? WHERE hash = ?", (now, digest))
+        self.hits += 1
+        return digest, path, bool(archived and path.endswith('.gz'))
+
+    def open(self, key):
+        """Открывает документ по ключу на чтение (сжатые распаковываются на лету) или возвращает None."""
+        found = self._lookup(key)
+        if found is None:
+            return None
+        _, path, compressed = found
+        return gzip.open(path, 'rb') if compressed else open(path, 'rb')
+
+    def get(self, key):
+        """Возвращает содержимое документа по ключу или None."""
+        f = self.open(key)
+        if f is None:
+            return None
+        with f:
+            return f.read()
+
+    def put(self, key, data, name=None):
+        """Сохраняет документ под ключом key; одинаковое содержимое хранится в одном файле."""
+        digest = hashlib.sha256(data).hexdigest()
+        conn = self._connection()
+        now = time.time()
+        exists = conn.execute("SELECT 1 FROM Documents WHERE hash = ?", (digest,)).fetchone()
+        if exists is None:
+            extension = os.path.splitext(name or '')[1]
+            path = os.path.join(time.strftime(self.layout, time.localtime(now)), digest + extension)
+            full_path = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, full_path)
+            with conn:
+                inserted = conn.execute("""
+                    INSERT OR IGNORE INTO Documents (hash, path, size, stored_size, created, accessed)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (digest, path, len(data), len(data), now, now)).rowcount
+                stored_path = conn.execute("SELECT path FROM Documents WHERE hash = ?", (digest,)).fetchone()[0]
+            if not inserted and stored_path != path:
+                # То же содержимое одновременно сохранил другой процесс
+                os.remove(full_path)
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO DocumentKeys (key, hash, name) VALUES (?, ?, ?)",
+                         (key, digest, name))
+        return digest
+
+    def put_async(self, key, data, name=None):
+        """Сохраняет документ в фоновом потоке, чтобы запрос не ждал записи на диск."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='medclinic-documents')
+            executor = self._executor
+        return executor.submit(self._put_and_maintain, key, data, name)
+
+    def _put_and_maintain(self, key, data, name):
+        self.put(key, data, name)
+        if time.time() - self._last_maintenance >= self.maintenance_interval:
+            self.maintain()
+
+    def archive(self, now=None):
+        """Сжимает документы, к которым не обращались archive_after секунд; возвращает их число.
+
+        Если сжатие экономит меньше 10% (DOCX и XLSX уже упакованы в zip), файл остается
+        как есть и больше не проверяется.
+        """
+        now = now or time.time()
+        conn = self._connection()
+        rows = conn.execute("SELECT hash, path, size FROM Documents WHERE archived = 0 AND accessed < ?",
+                            (now - self.archive_after,)).fetchall()
+        compressed = 0
+        for digest, path, size in rows:
+            full_path = os.path.join(self.root, path)
+            try:
+                with open(full_path, 'rb') as source, gzip.open(full_path + '.gz', 'wb') as target:
+                    shutil.copyfileobj(source, target)
+            except FileNotFoundError:
+                continue
+            stored_size = os.path.getsize(full_path + '.gz')
+            if stored_size < size * 0.9:
+                with conn:
+                    conn.execute("UPDATE Documents SET path = ?, stored_size = ?, archived = 1 WHERE hash = ?",
+                                 (path + '.gz', stored_size, digest))
+                os.remove(full_path)
+                compressed += 1
+            else:
+                os.remove(full_path + '.gz')
+                with conn:
+                    conn.execute("UPDATE Documents SET archived = 1 WHERE hash = ?", (digest,))
+        return compressed
+
+    def evict(self, now=None):
+        """Удаляет документы старше max_age и самые давно востребованные сверх max_bytes; возвращает их число."""
+        now = now or time.time()
+        conn = self._connection()
+        expired = conn.execute("SELECT hash, path FROM Documents WHERE created < ?",
+                               (now - self.max_age,)).fetchall()
+        total = conn.execute("SELECT coalesce(sum(stored_size), 0) FROM Documents WHERE created >= ?",
+                             (now - self.max_age,)).fetchone()[0]
+        if total > self.max_bytes:
+            for digest, path, stored_size in conn.execute(
+                    "SELECT hash, path, stored_size FROM Documents WHERE created >= ? ORDER BY accessed",
+                    (now - self.max_age,)).fetchall():
+                if total <= self.max_bytes:
+                    break
+                expired.append((digest, path))
+                total -= stored_size
+        with conn:
+            conn.executemany("DELETE FROM Documents WHERE hash = ?", [(digest,) for digest, _ in expired])
+        for _, path in expired:
+            try:
+                os.remove(os.path.join(self.root, path))
+            except FileNotFoundError:
+                pass
+        return len(expired)
+
+    def maintain(self, now=None):
+        """Архивирует и вытесняет документы; возвращает (сжато, удалено)."""
+        self._last_maintenance = time.time()
+        return self.archive(now), self.evict(now)
+
+    def stats(self):
+        """Возвращает число документов, ключей, объемы и счетчики попаданий."""
+        conn = self._connection()
+        documents, size, stored_size, archived = conn.execute(
+            "SELECT count(*), coalesce(sum(size), 0), coalesce(sum(stored_size), 0), coalesce(sum(archived), 0) "
+            "FROM Documents").fetchone()
+        return {
+            'documents': documents,
+            'keys': conn.execute("SELECT count(*) FROM DocumentKeys").fetchone()[0],
+            'bytes': size,
+            'stored_bytes': stored_size,
+            'archived': archived,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def close(self):
+        """Дожидается фоновых записей и закрывает соединение текущего потока."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+if __name__ == '__main__':
+    # Обслуживание по расписанию (например, из cron) с настройками приложения
+    import medclinic
+
+    store = medclinic.create_app() and medclinic.get_documents()
+    archived, evicted = store.maintain()
+    print(f"Archived {archived}, evicted {evicted} documents.")
+    print(store.stats())
+    store.close()
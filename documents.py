@@ -0,0 +1,185 @@
+import functools
+import hashlib
+import io
+import json
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from copy import deepcopy
+
+from jinja2 import Environment
+
+# docxtpl и python-docx загружаются при формировании первого документа, а не при импорте модуля
+
+
+class _CachingEnvironment(Environment):
+    """Окружение Jinja, компилирующее каждый исходный текст шаблона только один раз."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._compiled = {}
+
+    def from_string(self, source, globals=None, template_class=None):
+        if globals is not None or template_class is not None:
+            return super().from_string(source, globals, template_class)
+        template = self._compiled.get(source)
+        if template is None:
+            template = super().from_string(source)
+            self._compiled[source] = template
+        return template
+
+
+@functools.lru_cache(maxsize=None)
+def _prepared_template_class():
+    """Возвращает класс DocxTemplate, берущий результат patch_xml из общего кэша."""
+    from docxtpl import DocxTemplate
+
+    class PreparedDocxTemplate(DocxTemplate):
+        def __init__(self, template_file, patched):
+            super().__init__(template_file)
+            self._patched = patched
+
+        def patch_xml(self, src_xml):
+            result = self._patched.get(src_xml)
+            if result is None:
+                result = super().patch_xml(src_xml)
+                self._patched[src_xml] = result
+            return result
+
+    return PreparedDocxTemplate
+
+
+class CompiledDocxTemplate:
+    """Шаблон DOCX, разобранный и скомпилированный один раз.
+
+    Содержимое файла и скомпилированные шаблоны Jinja хранятся в памяти и
+    перечитываются, когда меняется время изменения файла.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._data = None
+        self._patched = {}
+        self._env = None
+
+    @property
+    def version(self):
+        """Время изменения загруженного файла шаблона."""
+        self._ensure_loaded()
+        return self._mtime
+
+    def _ensure_loaded(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime != self._mtime:
+                with open(self.path, 'rb') as f:
+                    self._data = f.read()
+                self._patched = {}
+                self._env = _CachingEnvironment()
+                self._mtime = mtime
+
+    def render(self, context):
+        """Возвращает документ, заполненный данными context, в виде bytes."""
+        self._ensure_loaded()
+        template = _prepared_template_class()(io.BytesIO(self._data), self._patched)
+        template.render(context, self._env)
+        output = io.BytesIO()
+        template.save(output)
+        return output.getvalue()
+
+
+class RenderCache:
+    """LRU-кэш готовых документов, адресуемый хэшем исходных данных."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(*parts):
+        """Вычисляет ключ содержимого по данным, из которых строится документ."""
+        raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._items[key] = data
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class _ChunkWriter:
+    """Файлоподобный объект без поддержки seek, накапливающий записанные данные до выдачи."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(entries):
+    """Формирует ZIP-архив из пар (имя файла, bytes) и выдает его частями по мере записи."""
+    writer = _ChunkWriter()
+    # Документы DOCX уже сжаты, поэтому повторно их не сжимаем
+    with zipfile.ZipFile(writer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+            yield writer.take()
+    yield writer.take()
+
+
+def merge_documents(documents):
+    """Объединяет документы DOCX (bytes) одного шаблона в один, разделяя их разрывом страницы."""
+    from docx import Document
+    from docx.enum.text import WD_BREAK
+
+    merged = None
+    for data in documents:
+        document = Document(io.BytesIO(data))
+        if merged is None:
+            merged = document
+            continue
+        merged.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+        body = merged.element.body
+        section = body.sectPr  # свойства раздела должны оставаться последним элементом тела
+        for element in document.element.body:
+            if element.tag.endswith('}sectPr'):
+                continue
+            if section is not None:
+                section.addprevious(deepcopy(element))
+            else:
+                body.append(deepcopy(element))
+    output = io.BytesIO()
+    if merged is not None:
+        merged.save(output)
+    return output.getvalue()
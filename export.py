@@ -0,0 +1,228 @@
+"""Выгрузка платежей и приемов в столбцовом формате для аналитики.
+
+Строки читаются порциями по id и записываются как группы строк Parquet или пакеты Arrow IPC
+(нужен pyarrow); без pyarrow доступен формат csv (gzip). В инкрементальном режиме
+выгружаются только строки, добавленные после предыдущей выгрузки в тот же каталог: номер
+последней выгруженной строки каждой таблицы хранится в export_state.json. Изменения уже
+выгруженных строк инкрементальная выгрузка не видит - для них нужна полная (--full), которая
+заменяет прежние файлы таблицы. Строки перенесенных в архив лет (archive.py) выгружаются
+вместе с основной базой. Расчеты по выгрузкам - в frame_analytics.py.
+
+Запуск:  python export.py [--db medclinic.db] [--out instance/export] [--format parquet|arrow|csv]
+                          [--tables payments appointments] [--chunk-size N] [--full]
+"""
+import argparse
+import csv
+import datetime
+import gzip
+import importlib.util
+import json
+import os
+
+import archive
+import db
+
+# Для каждой таблицы: запрос с соединениями как в get_payment_from_db / get_appointment_from_db
+# (LEFT JOIN, чтобы не терять строки без кассира), столбцы и их типы. {Payments} и {Appointments}
+# заменяются таблицами основной базы и архивов.
+EXPORTS = {
+    'payments': {
+        'table': 'Payments',
+        'query': """
+            SELECT Payments.id, Payments.Date, Payments.payment_time, Payments.id_patient, Patients.FIO,
+                Payments.id_service, Services.Name, Services.Code, Payments.Summ, Payments.employee_id, Employees.FIO
+            FROM {Payments} AS Payments
+            LEFT JOIN Patients ON Payments.id_patient = Patients.id
+            LEFT JOIN Services ON Payments.id_service = Services.id
+            LEFT JOIN Employees ON Payments.employee_id = Employees.id
+            WHERE Payments.id > ? AND Payments.id <= ?
+            ORDER BY Payments.id
+            LIMIT ?
+        """,
+        'columns': [('id', 'int'), ('date', 'str'), ('time', 'str'), ('patient_id', 'int'), ('patient', 'str'),
+                    ('service_id', 'int'), ('service', 'str'), ('service_code', 'str'), ('amount', 'float'),
+                    ('cashier_id', 'int'), ('cashier', 'str')],
+    },
+    'appointments': {
+        'table': 'Appointments',
+        'query': """
+            SELECT Appointments.id, Appointments.Date, Appointments.Time, Appointments.id_doctor, Employees.FIO,
+                Employees.Specialization, Appointments.id_patient, Patients.FIO, Appointments.Complaints,
+                Appointments.PreliminaryDiagnosis
+            FROM {Appointments} AS Appointments
+            LEFT JOIN Employees ON Appointments.id_doctor = Employees.id
+            LEFT JOIN Patients ON Appointments.id_patient = Patients.id
+            WHERE Appointments.id > ? AND Appointments.id <= ?
+            ORDER BY Appointments.id
+            LIMIT ?
+        """,
+        'columns': [('id', 'int'), ('date', 'str'), ('time', 'str'), ('doctor_id', 'int'), ('doctor', 'str'),
+                    ('specialization', 'str'), ('patient_id', 'int'), ('patient', 'str'), ('complaints', 'str'),
+                    ('diagnosis', 'str')],
+    },
+}
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow', 'csv': '.csv.gz'}
+STATE_FILE = 'export_state.json'
+
+
+def default_format():
+    """Parquet, если установлен pyarrow, иначе csv."""
+    return 'parquet' if importlib.util.find_spec('pyarrow') else 'csv'
+
+
+def _arrow_schema(columns):
+    import pyarrow as pa
+
+    types = {'int': pa.int64(), 'float': pa.float64(), 'str': pa.string()}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+class _ArrowWriter:
+    """Записывает порции строк группами строк Parquet или пакетами Arrow IPC."""
+
+    def __init__(self, path, columns, file_format):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise RuntimeError(f'Для формата {file_format} нужен пакет pyarrow (pip install pyarrow)') from None
+        self._pa = pa
+        self.schema = _arrow_schema(columns)
+        if file_format == 'parquet':
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+            self._write = lambda batch: self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._writer = pa.ipc.new_file(path, self.schema)
+            self._write = self._writer.write_batch
+
+    def write(self, rows):
+        arrays = [self._pa.array(values, type=field.type) for values, field in zip(zip(*rows), self.schema)]
+        self._write(self._pa.record_batch(arrays, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+class _CsvWriter:
+    """Запасной формат без pyarrow: CSV в gzip с заголовком."""
+
+    def __init__(self, path, columns, file_format):
+        self._file = gzip.open(path, 'wt', encoding='utf-8', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([name for name, _ in columns])
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+def load_state(out_dir):
+    """Возвращает состояние инкрементальной выгрузки каталога out_dir."""
+    try:
+        with open(os.path.join(out_dir, STATE_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(out_dir, state):
+    path = os.path.join(out_dir, STATE_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def export_table(conn, name, out_dir, file_format, since_id=0, chunk_size=50000):
+    """Выгружает строки таблицы с id больше since_id в новый файл каталога out_dir/name.
+
+    Возвращает (путь к файлу или None, если новых строк нет, число строк, последний id).
+    """
+    spec = EXPORTS[name]
+    schemas = archive.attached_schemas(conn)
+    last_id = conn.execute(
+        "SELECT coalesce(max(id), 0) FROM ({})".format(
+            archive.union(f"SELECT max(id) AS id FROM {{{spec['table']}}}", schemas))).fetchone()[0]
+    query = archive.union(spec['query'], schemas)
+    if len(schemas) > 1:
+        query += " ORDER BY id LIMIT ?"
+    if last_id <= since_id:
+        return None, 0, since_id
+    os.makedirs(os.path.join(out_dir, name), exist_ok=True)
+    path = os.path.join(out_dir, name, f'{name}-{since_id + 1:010d}-{last_id:010d}{FORMATS[file_format]}')
+    writer_class = _CsvWriter if file_format == 'csv' else _ArrowWriter
+    writer = writer_class(path + '.tmp', spec['columns'], file_format)
+    rows_written = 0
+    cursor_id = since_id
+    try:
+        while True:
+            rows = conn.execute(query, (cursor_id, last_id, chunk_size) * len(schemas)
+                                + ((chunk_size,) if len(schemas) > 1 else ())).fetchall()
+            if not rows:
+                break
+            writer.write(rows)
+            rows_written += len(rows)
+            cursor_id = rows[-1][0]
+    finally:
+        writer.close()
+    os.replace(path + '.tmp', path)
+    return path, rows_written, last_id
+
+
+def export(db_path, out_dir, file_format=None, tables=tuple(EXPORTS), chunk_size=50000, incremental=True,
+           archive_dir=None):
+    """Выгружает таблицы tables; в инкрементальном режиме - только новые с прошлой выгрузки строки.
+
+    archive_dir - каталог архива закрытых лет (по умолчанию archive рядом с базой).
+
+    Возвращает словарь {таблица: (путь, число строк)}.
+    """
+    file_format = file_format or default_format()
+    if file_format != 'csv' and not importlib.util.find_spec('pyarrow'):
+        raise RuntimeError(f'Для формата {file_format} нужен пакет pyarrow (pip install pyarrow)')
+    os.makedirs(out_dir, exist_ok=True)
+    # Состояние читается и при полной выгрузке: в нем хранятся позиции таблиц не из tables
+    state = load_state(out_dir)
+    conn = db.connect(db_path)
+    results = {}
+    try:
+        archive.attach(conn, archive_dir or archive.default_dir(db_path))
+        for name in tables:
+            since_id = state.get(name, {}).get('last_id', 0) if incremental else 0
+            path, rows, last_id = export_table(conn, name, out_dir, file_format, since_id, chunk_size)
+            results[name] = (path, rows)
+            if path is not None and not incremental:
+                # Полная выгрузка заменяет прежние файлы таблицы, чтобы строки не повторялись
+                for file_name in os.listdir(os.path.join(out_dir, name)):
+                    if os.path.join(out_dir, name, file_name) != path:
+                        os.remove(os.path.join(out_dir, name, file_name))
+            if path is not None:
+                state[name] = {'last_id': last_id, 'format': file_format,
+                               'exported_at': datetime.datetime.now().isoformat(timespec='seconds')}
+                save_state(out_dir, state)
+    finally:
+        conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='medclinic.db')
+    parser.add_argument('--out', default=os.path.join('instance', 'export'))
+    parser.add_argument('--format', choices=list(FORMATS), default=None,
+                        help='по умолчанию parquet, если установлен pyarrow, иначе csv')
+    parser.add_argument('--tables', nargs='+', choices=list(EXPORTS), default=list(EXPORTS))
+    parser.add_argument('--chunk-size', type=int, default=50000, help='строк в группе строк (пакете)')
+    parser.add_argument('--full', action='store_true', help='выгрузить все строки, а не только новые')
+    args = parser.parse_args()
+
+    results = export(args.db, args.out, args.format, args.tables, args.chunk_size, incremental=not args.full)
+    for name, (path, rows) in results.items():
+        print(f"{name}: {rows} rows" + (f" -> {path}" if path else " (no new rows)"))
+
+
+if __name__ == '__main__':
+    main()
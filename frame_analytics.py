@@ -0,0 +1,129 @@
+"""Векторные расчеты выручки и посещаемости по столбцовым выгрузкам (см. export.py).
+
+Выгрузка читается в pandas.DataFrame целиком (для Parquet и Arrow - только нужные столбцы),
+а агрегаты считаются операциями над столбцами, без цикла по строкам в Python. Нужны pandas
+и numpy, для файлов Parquet и Arrow - еще pyarrow.
+
+Запуск:  python frame_analytics.py [--out instance/export] [--by day|month|weekday|service|cashier]
+"""
+import argparse
+import glob
+import os
+
+import export
+
+# Ключи группировки выручки: имя -> функция, возвращающая столбец ключа
+REVENUE_KEYS = {
+    'day': lambda frame: frame['date'].dt.date,
+    'month': lambda frame: frame['date'].dt.to_period('M'),
+    'weekday': lambda frame: frame['date'].dt.dayofweek,
+    'service': lambda frame: frame['service'],
+    'cashier': lambda frame: frame['cashier'].fillna('-'),
+}
+
+
+def _pandas():
+    try:
+        import pandas as pd
+    except ImportError:
+        raise RuntimeError('Для расчетов нужен пакет pandas (pip install pandas pyarrow)') from None
+    return pd
+
+
+def read_export(out_dir, name, columns=None):
+    """Читает все файлы выгрузки таблицы name из каталога out_dir в один DataFrame.
+
+    columns ограничивает читаемые столбцы; столбец date приводится к datetime64.
+    """
+    pd = _pandas()
+    columns = list(columns) if columns else [column for column, _ in export.EXPORTS[name]['columns']]
+    frames = []
+    for path in sorted(glob.glob(os.path.join(out_dir, name, f'{name}-*'))):
+        if path.endswith('.parquet'):
+            frames.append(pd.read_parquet(path, columns=columns))
+        elif path.endswith('.arrow'):
+            import pyarrow as pa
+
+            with pa.memory_map(path) as source:
+                frames.append(pa.ipc.open_file(source).read_all().select(columns).to_pandas())
+        elif path.endswith('.csv.gz'):
+            frames.append(pd.read_csv(path, usecols=columns, dtype={'time': str, 'service_code': str}))
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    frame = pd.concat(frames, ignore_index=True)
+    if 'date' in frame:
+        frame['date'] = pd.to_datetime(frame['date'], errors='coerce')
+    return frame
+
+
+def revenue(payments, by='day'):
+    """Выручка, число платежей и средний чек по ключу by (см. REVENUE_KEYS), по убыванию выручки
+    для справочных ключей и по возрастанию ключа для временных."""
+    grouped = payments.groupby(REVENUE_KEYS[by](payments).rename(by))['amount']
+    result = grouped.agg(total='sum', payments='count', average='mean')
+    if by in ('service', 'cashier'):
+        return result.sort_values('total', ascending=False)
+    return result.sort_index()
+
+
+def revenue_summary(payments):
+    """Общая выручка, число платежей и распределение суммы платежа и выручки на пациента."""
+    import numpy as np
+
+    amounts = payments['amount'].to_numpy(dtype=float)
+    per_patient = payments.groupby('patient_id')['amount'].sum().to_numpy()
+    if not len(amounts):
+        return {'total': 0.0, 'payments': 0, 'patients': 0}
+    return {
+        'total': float(amounts.sum()),
+        'payments': int(len(amounts)),
+        'patients': int(len(per_patient)),
+        'average': float(amounts.mean()),
+        'amount_quantiles': dict(zip(('p50', 'p90', 'p99'), np.percentile(amounts, [50, 90, 99]).tolist())),
+        'per_patient_quantiles': dict(zip(('p50', 'p90', 'p99'), np.percentile(per_patient, [50, 90, 99]).tolist())),
+    }
+
+
+def visit_stats(appointments):
+    """Статистика посещений: пациенты, доля повторных, интервал между визитами, нагрузка врачей,
+    распределение по дням недели и часам."""
+    import numpy as np
+
+    pd = _pandas()
+    if appointments.empty:
+        return {'visits': 0, 'patients': 0}
+    visits_per_patient = appointments.groupby('patient_id').size()
+    # Интервалы между соседними визитами одного пациента: сортировка и разность внутри групп
+    ordered = appointments.sort_values(['patient_id', 'date'])
+    intervals = ordered.groupby('patient_id')['date'].diff().dt.days.dropna().to_numpy()
+    per_doctor_day = appointments.groupby(['doctor_id', 'date']).size()
+    hours = pd.to_numeric(appointments['time'].str.slice(0, 2), errors='coerce').dropna().astype(int).to_numpy()
+    return {
+        'visits': int(len(appointments)),
+        'patients': int(len(visits_per_patient)),
+        'repeat_share': float((visits_per_patient.to_numpy() > 1).mean()),
+        'days_between_visits_median': float(np.median(intervals)) if len(intervals) else None,
+        'doctor_visits_per_day': float(per_doctor_day.mean()),
+        'by_doctor': appointments.groupby(appointments['doctor'].fillna('-')).size()
+                     .sort_values(ascending=False).to_dict(),
+        'by_weekday': np.bincount(appointments['date'].dt.dayofweek.dropna().astype(int).to_numpy(),
+                                  minlength=7).tolist(),
+        'by_hour': np.bincount(hours, minlength=24).tolist(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', default=os.path.join('instance', 'export'), help='каталог выгрузки')
+    parser.add_argument('--by', choices=list(REVENUE_KEYS), default='month')
+    args = parser.parse_args()
+
+    payments = read_export(args.out, 'payments', ['date', 'patient_id', 'service', 'amount', 'cashier'])
+    appointments = read_export(args.out, 'appointments', ['date', 'time', 'doctor_id', 'doctor', 'patient_id'])
+    print(revenue(payments, args.by).to_string())
+    print(revenue_summary(payments))
+    print(visit_stats(appointments))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""Генерация синтетической базы данных заданного размера для нагрузочного тестирования.
+
+Распределения приближены к реальной работе клиники: нагрузка на врачей и частота визитов
+пациентов неравномерны, приемы идут в рабочие часы с утренним пиком и реже по выходным,
+популярность услуг убывает по закону Ципфа.
+
+С --fixtures каждая сгенерированная база сохраняется как эталон (см. backup.py), и повторный
+запуск с теми же параметрами восстанавливает ее копированием файла вместо генерации.
+
+Запуск:  python generate_data.py [--db instance/synthetic.db] [--patients 100000]
+         [--appointments 1000000] [--payments 2000000] [--fixtures instance/fixtures]
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import time
+
+import backup
+import migrations
+from reset_db import create_schema
+
+BATCH_SIZE = 50000
+
+MALE_SURNAMES = ['Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов',
+                 'Новиков', 'Федоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семенов', 'Егоров',
+                 'Павлов', 'Козлов', 'Степанов', 'Николаев', 'Орлов', 'Андреев', 'Макаров', 'Никитин',
+                 'Захаров', 'Зайцев', 'Соловьев', 'Борисов', 'Яковлев', 'Григорьев', 'Романов', 'Воробьев']
+MALE_NAMES = ['Александр', 'Алексей', 'Андрей', 'Дмитрий', 'Евгений', 'Иван', 'Игорь', 'Максим',
+              'Михаил', 'Николай', 'Олег', 'Павел', 'Петр', 'Роман', 'Сергей', 'Владимир', 'Юрий']
+FEMALE_NAMES = ['Анна', 'Екатерина', 'Елена', 'Ирина', 'Мария', 'Наталья', 'Ольга', 'Светлана',
+                'Татьяна', 'Юлия', 'Анастасия', 'Дарья', 'Виктория', 'Ксения', 'Людмила', 'Галина']
+# Основы отчеств: к ним добавляется 'ич' или 'на'
+PATRONYMICS = ['Александров', 'Алексеев', 'Андреев', 'Иванов', 'Михайлов', 'Николаев', 'Петров', 'Сергеев',
+               'Владимиров', 'Юрьев', 'Павлов', 'Дмитриев', 'Евгеньев', 'Олегов', 'Игорев', 'Романов']
+STREETS = ['ул. Ленина', 'ул. Пушкина', 'ул. Гагарина', 'ул. Мира', 'ул. Советская', 'ул. Садовая',
+           'пр. Победы', 'ул. Лесная', 'ул. Школьная', 'ул. Молодежная', 'ул. Чехова', 'ул. Кирова']
+
+DOCTOR_POSITIONS = [
+    ('Терапевт', 'Общая практика'), ('Хирург', 'Общая хирургия'), ('Кардиолог', 'Кардиология'),
+    ('Невролог', 'Неврология'), ('Офтальмолог', 'Офтальмология'), ('Оториноларинголог', 'ЛОР'),
+    ('Педиатр', 'Педиатрия'), ('Гинеколог', 'Гинекология'), ('Эндокринолог', 'Эндокринология'),
+    ('Дерматолог', 'Дерматология'), ('Уролог', 'Урология'), ('Травматолог', 'Травматология'),
+]
+STAFF_POSITIONS = [('Медсестра', 'Процедурный кабинет'), ('Администратор', 'Регистратура')]
+
+SERVICE_KINDS = [
+    ('Консультация', 'CONS', 1500), ('Повторный прием', 'REP', 1000), ('Анализ', 'LAB', 700),
+    ('УЗИ', 'USI', 2500), ('ЭКГ', 'ECG', 1800), ('Рентген', 'XR', 2200), ('Процедура', 'PRC', 900),
+    ('МРТ', 'MRI', 6500), ('Вакцинация', 'VAC', 1200), ('Справка', 'DOC', 500),
+]
+COMPLAINTS = [
+    ('головная боль', 'Мигрень?'), ('кашель', 'Бронхит?'), ('слабость', 'ОРЗ?'), ('температура', 'ОРВИ?'),
+    ('боль в спине', 'Остеохондроз?'), ('боль в груди', 'Стенокардия?'), ('сыпь', 'Дерматит?'),
+    ('боль в горле', 'Фарингит?'), ('головокружение', 'Гипертония?'), ('профосмотр', None),
+    (None, None),
+]
+
+# Начало приема каждые 15 минут с 08:00 до 19:45; утром записей больше
+SLOTS = [f'{hour:02d}:{minute:02d}' for hour in range(8, 20) for minute in (0, 15, 30, 45)]
+SLOT_WEIGHTS = [1.6 if slot < '12:00' else 1.0 if slot < '17:00' else 0.7 for slot in SLOTS]
+# Понедельник ... воскресенье
+WEEKDAY_WEIGHTS = [1.2, 1.1, 1.0, 1.0, 1.1, 0.5, 0.15]
+
+
+def cumulative(weights):
+    """Возвращает накопленные веса для random.choices."""
+    total = 0.0
+    result = []
+    for weight in weights:
+        total += weight
+        result.append(total)
+    return result
+
+
+def person(rng):
+    """Возвращает случайное ФИО с согласованным по полу окончанием."""
+    surname = rng.choice(MALE_SURNAMES)
+    patronymic = rng.choice(PATRONYMICS)
+    if rng.random() < 0.5:
+        return f'{surname} {rng.choice(MALE_NAMES)} {patronymic}ич'
+    return f'{surname}а {rng.choice(FEMALE_NAMES)} {patronymic}на'
+
+
+def phone(rng):
+    return f'+79{rng.randrange(10 ** 9):09d}'
+
+
+def date_range(start, end):
+    """Возвращает даты периода и их веса по дням недели."""
+    days = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+    return [day.isoformat() for day in days], cumulative(WEEKDAY_WEIGHTS[day.weekday()] for day in days)
+
+
+def iter_patients(rng, count):
+    today = datetime.date.today()
+    for _ in range(count):
+        age = rng.triangular(0, 95, 40)
+        birth = today - datetime.timedelta(days=int(age * 365.25))
+        yield (person(rng), birth.isoformat(), phone(rng),
+               f'{rng.choice(STREETS)}, д. {rng.randint(1, 150)}, кв. {rng.randint(1, 300)}',
+               f'{rng.randrange(10 ** 16):016d}')
+
+
+def iter_employees(rng, count):
+    doctors = staff = 0
+    for i in range(count):
+        # Примерно 70% врачей, остальные - медсестры и администраторы (кассиры)
+        if i % 10 < 7:
+            position, specialization = DOCTOR_POSITIONS[doctors % len(DOCTOR_POSITIONS)]
+            doctors += 1
+        else:
+            position, specialization = STAFF_POSITIONS[staff % len(STAFF_POSITIONS)]
+            staff += 1
+        yield person(rng), position, phone(rng), specialization
+
+
+def iter_services(rng, count):
+    for i in range(count):
+        name, prefix, base_cost = SERVICE_KINDS[i % len(SERVICE_KINDS)]
+        position, specialization = DOCTOR_POSITIONS[(i // len(SERVICE_KINDS)) % len(DOCTOR_POSITIONS)]
+        cost = round(base_cost * rng.lognormvariate(0, 0.3) / 50) * 50
+        yield (f'{name} ({specialization.lower()})', f'{prefix}-{i + 1:04d}', cost,
+               f'{name}: {position.lower()}', f'{name} по направлению «{specialization}».')
+
+
+def iter_appointments(rng, count, doctor_ids, patient_ids, dates, date_weights):
+    # Нагрузка на врачей и частота визитов пациентов распределены по Парето
+    doctor_weights = cumulative(rng.paretovariate(2.5) for _ in doctor_ids)
+    patient_weights = cumulative(rng.paretovariate(1.5) for _ in patient_ids)
+    slot_weights = cumulative(SLOT_WEIGHTS)
+    while count > 0:
+        size = min(count, BATCH_SIZE)
+        doctors = rng.choices(doctor_ids, cum_weights=doctor_weights, k=size)
+        patients = rng.choices(patient_ids, cum_weights=patient_weights, k=size)
+        days = rng.choices(dates, cum_weights=date_weights, k=size)
+        slots = rng.choices(SLOTS, cum_weights=slot_weights, k=size)
+        complaints = rng.choices(COMPLAINTS, k=size)
+        for row in zip(doctors, patients, days, slots, complaints):
+            yield row[:4] + row[4]
+        count -= size
+
+
+def iter_payments(rng, count, patient_ids, services, cashier_ids, dates, date_weights):
+    patient_weights = cumulative(rng.paretovariate(1.5) for _ in patient_ids)
+    # Популярность услуг по закону Ципфа: i-я по популярности услуга встречается в 1/i раз реже
+    service_ids = [service_id for service_id, _ in services]
+    rng.shuffle(service_ids)
+    service_weights = cumulative(1 / rank for rank in range(1, len(service_ids) + 1))
+    costs = dict(services)
+    slot_weights = cumulative(SLOT_WEIGHTS)
+    while count > 0:
+        size = min(count, BATCH_SIZE)
+        patients = rng.choices(patient_ids, cum_weights=patient_weights, k=size)
+        chosen = rng.choices(service_ids, cum_weights=service_weights, k=size)
+        days = rng.choices(dates, cum_weights=date_weights, k=size)
+        slots = rng.choices(SLOTS, cum_weights=slot_weights, k=size)
+        cashiers = rng.choices(cashier_ids, k=size)
+        for patient, service, day, slot, cashier in zip(patients, chosen, days, slots, cashiers):
+            # Примерно каждый десятый платеж - со скидкой 10%
+            summ = costs[service] * 0.9 if rng.random() < 0.1 else costs[service]
+            yield patient, service, day, summ, slot, cashier
+        count -= size
+
+
+def insert_batches(conn, query, rows):
+    """Вставляет строки пачками по BATCH_SIZE и возвращает их число."""
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(query, batch)
+            total += len(batch)
+            batch.clear()
+    conn.executemany(query, batch)
+    return total + len(batch)
+
+
+def generate(db_path, patients=10000, employees=60, services=120, appointments=100000, payments=200000,
+             start=None, end=None, seed=42, log=print, fixtures=None):
+    """Создает базу db_path и заполняет ее синтетическими данными.
+
+    fixtures - каталог эталонных баз: если база с такими же параметрами уже генерировалась,
+    она восстанавливается из эталона, иначе сохраняется в него после генерации.
+    """
+    end = end or datetime.date.today()
+    start = start or end - datetime.timedelta(days=3 * 365)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    fixture = fixtures and os.path.join(fixtures, f'synthetic-{patients}-{employees}-{services}-{appointments}-'
+                                                  f'{payments}-{start}-{end}-{seed}-v{migrations.LATEST_VERSION}.db')
+    if fixture and os.path.exists(fixture):
+        started = time.perf_counter()
+        backup.load_fixture(fixture, db_path)
+        log(f'Restored from fixture {fixture} in {(time.perf_counter() - started) * 1000:.0f} ms')
+        return
+    rng = random.Random(seed)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    conn = sqlite3.connect(db_path)
+    # База создается с нуля, поэтому журнал и синхронизация на время загрузки не нужны
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -200000")
+    create_schema(conn.cursor())
+
+    def step(title, query, rows):
+        started = time.perf_counter()
+        count = insert_batches(conn, query, rows)
+        conn.commit()
+        log(f'{title}: {count} rows in {time.perf_counter() - started:.1f}s')
+
+    step('Employees', "INSERT INTO Employees (FIO, Position, PhoneNumber, Specialization) VALUES (?, ?, ?, ?)",
+         iter_employees(rng, employees))
+    step('Services', "INSERT INTO Services (Name, Code, Cost, Description, DetailedDescription) VALUES (?, ?, ?, ?, ?)",
+         iter_services(rng, services))
+    step('Patients',
+         "INSERT INTO Patients (FIO, DateOfBirth, PhoneNumber, Address, InsurancePolicy) VALUES (?, ?, ?, ?, ?)",
+         iter_patients(rng, patients))
+    conn.execute("INSERT INTO ClinicInfo (Name, Address, PhoneNumber) VALUES (?, ?, ?)",
+                 ("Медицинская клиника", "ул. Примерная, д. 1", "+74951234567"))
+
+    doctor_ids = [row[0] for row in conn.execute(
+        "SELECT id FROM Employees WHERE Position NOT IN ('Медсестра', 'Администратор')")]
+    cashier_ids = [row[0] for row in conn.execute("SELECT id FROM Employees WHERE Position = 'Администратор'")]
+    patient_ids = [row[0] for row in conn.execute("SELECT id FROM Patients")]
+    service_rows = conn.execute("SELECT id, Cost FROM Services").fetchall()
+    dates, date_weights = date_range(start, end)
+
+    step('Appointments',
+         "INSERT INTO Appointments (id_doctor, id_patient, Date, Time, Complaints, PreliminaryDiagnosis) "
+         "VALUES (?, ?, ?, ?, ?, ?)",
+         iter_appointments(rng, appointments, doctor_ids, patient_ids, dates, date_weights))
+    step('Payments',
+         "INSERT INTO Payments (id_patient, id_service, Date, Summ, payment_time, employee_id) "
+         "VALUES (?, ?, ?, ?, ?, ?)",
+         iter_payments(rng, payments, patient_ids, service_rows, cashier_ids or doctor_ids, dates, date_weights))
+
+    # Индексы, поисковый индекс и сводные таблицы строятся миграциями по уже загруженным данным
+    started = time.perf_counter()
+    conn.execute("PRAGMA user_version = 0")
+    migrations.migrate(conn)
+    conn.execute("ANALYZE")
+    conn.close()
+    log(f'Migrations: {time.perf_counter() - started:.1f}s')
+    if fixture:
+        log(f'Saved fixture {backup.save_fixture(db_path, fixture)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=os.path.join('instance', 'synthetic.db'))
+    parser.add_argument('--patients', type=int, default=10000)
+    parser.add_argument('--employees', type=int, default=60)
+    parser.add_argument('--services', type=int, default=120)
+    parser.add_argument('--appointments', type=int, default=100000)
+    parser.add_argument('--payments', type=int, default=200000)
+    parser.add_argument('--start', type=datetime.date.fromisoformat, help='начало периода (по умолчанию 3 года назад)')
+    parser.add_argument('--end', type=datetime.date.fromisoformat, help='конец периода (по умолчанию сегодня)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--fixtures', default=None, help='каталог эталонных баз для повторных запусков')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    generate(args.db, args.patients, args.employees, args.services, args.appointments, args.payments,
+             args.start, args.end, args.seed, fixtures=args.fixtures)
+    print(f'Database {args.db} generated in {time.perf_counter() - started:.1f}s.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueFull(Exception):
+    """Очередь заданий переполнена."""
+
+
+class Job:
+    """Задание на формирование документа в фоновом потоке."""
+
+    def __init__(self, kind, download_name):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.download_name = download_name
+        self.status = QUEUED
+        self.attempts = 0
+        self.error = None
+        self.path = None
+        self.created = time.time()
+        self.finished = None
+
+    def to_dict(self):
+        """Возвращает описание задания для ответа в формате JSON."""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'download_name': self.download_name,
+        }
+
+    def state(self):
+        """Возвращает полное состояние задания для сохранения в файл."""
+        return dict(self.to_dict(), path=self.path, created=self.created, finished=self.finished)
+
+    @classmethod
+    def from_state(cls, state):
+        """Восстанавливает задание из состояния, сохраненного методом state."""
+        job = cls(state['kind'], state['download_name'])
+        for name, value in state.items():
+            setattr(job, name, value)
+        return job
+
+
+class JobQueue:
+    """Локальная очередь заданий поверх пула потоков.
+
+    Функция-исполнитель вызывается как payload(*args, output_path) и должна записать
+    результат в output_path. При ошибке задание повторяется до retries раз.
+
+    Состояние каждого задания дублируется в файл <id>.json в artifact_dir, поэтому при запуске
+    приложения в нескольких процессах любой из них может сообщить о задании и отдать результат.
+    """
+
+    def __init__(self, artifact_dir, max_workers=2, max_pending=100, retries=2, retry_delay=1.0, ttl=3600):
+        self.artifact_dir = artifact_dir
+        self.max_pending = max_pending
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.ttl = ttl
+        os.makedirs(artifact_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='medclinic-job')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._jobs = {}
+        self._futures = {}  # id задания -> Future, пока задание не завершено
+        self._lock = threading.Lock()
+
+    def submit(self, kind, download_name, payload, *args):
+        """Ставит задание в очередь и возвращает его; при переполнении очереди вызывает QueueFull."""
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull(f'В очереди уже {self.max_pending} заданий')
+        self.cleanup()
+        job = Job(kind, download_name)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._save(job)
+        with self._lock:
+            self._futures[job.id] = self._executor.submit(self._run, job, payload, args)
+        return job
+
+    def _state_path(self, job_id):
+        return os.path.join(self.artifact_dir, f'{job_id}.json')
+
+    def _save(self, job):
+        """Записывает состояние задания в файл, заменяя его атомарно."""
+        path = self._state_path(job.id)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(job.state(), f)
+        os.replace(path + '.tmp', path)
+
+    def _run(self, job, payload, args):
+        """Выполняет задание с повторными попытками."""
+        output_path = os.path.join(self.artifact_dir, f'{job.id}_{job.download_name}')
+        try:
+            while True:
+                job.attempts += 1
+                job.status = RUNNING
+                self._save(job)
+                try:
+                    payload(*args, output_path)
+                except Exception as e:
+                    job.error = str(e)
+                    if job.attempts > self.retries:
+                        if os.path.exists(output_path):
+                            os.remove(output_path)
+                        job.status = FAILED
+                        break
+                    time.sleep(self.retry_delay * job.attempts)
+                else:
+                    job.path = output_path
+                    job.error = None
+                    job.status = DONE
+                    break
+        finally:
+            job.finished = time.time()
+            self._save(job)
+            with self._lock:
+                self._futures.pop(job.id, None)
+            self._slots.release()
+
+    def get(self, job_id):
+        """Возвращает задание по идентификатору или None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None or not job_id.isalnum():
+            return job
+        # Задание могло быть создано другим процессом приложения
+        try:
+            with open(self._state_path(job_id), encoding='utf-8') as f:
+                return Job.from_state(json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def cleanup(self, now=None):
+        """Удаляет завершенные задания старше ttl секунд вместе с их файлами.
+
+        Кроме заданий этого процесса удаляются и любые файлы artifact_dir, не изменявшиеся
+        дольше ttl секунд: их оставляют другие процессы приложения и прежние запуски.
+        Возвращает число удаленных заданий.
+        """
+        now = now or time.time()
+        with self._lock:
+            expired = [job for job in self._jobs.values()
+                       if job.finished is not None and now - job.finished > self.ttl]
+            for job in expired:
+                del self._jobs[job.id]
+            running = {job_id for job_id, job in self._jobs.items() if job.finished is None}
+        for job in expired:
+            for path in (job.path, self._state_path(job.id)):
+                if path and os.path.exists(path):
+                    os.remove(path)
+        removed = len(expired)
+        with os.scandir(self.artifact_dir) as entries:
+            for entry in entries:
+                # Файлы задания: <id>.json, <id>.json.tmp и <id>_<имя документа>
+                if entry.name.split('_', 1)[0].split('.', 1)[0] in running:
+                    continue
+                try:
+                    if not entry.is_file() or now - entry.stat().st_mtime <= self.ttl:
+                        continue
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue  # удален другим процессом
+                if entry.name.endswith('.json'):
+                    removed += 1
+        return removed
+
+    def shutdown(self, wait=True):
+        """Останавливает пул потоков, дожидаясь выполнения начатых заданий.
+
+        Задания, которые еще не начались, отменяются и сохраняются неудавшимися, чтобы их
+        состояние не оставалось "в очереди" после перезапуска приложения.
+        """
+        with self._lock:
+            pending = [(self._jobs[job_id], future) for job_id, future in self._futures.items()]
+        for job, future in pending:
+            if not future.cancel():
+                continue  # задание уже выполняется
+            with self._lock:
+                self._futures.pop(job.id, None)
+            job.status = FAILED
+            job.error = 'Очередь заданий остановлена до начала выполнения'
+            job.finished = time.time()
+            self._save(job)
+            self._slots.release()
+        self._executor.shutdown(wait=wait)
@@ -1,154 +1,927 @@
-from flask import Flask, render_template, redirect, url_for, request, send_file
-import sqlite3
-from docxtpl import DocxTemplate
+from flask import Flask, render_template, redirect, url_for, request, send_file, Response, stream_with_context, \
+    jsonify, abort, g, has_app_context, before_render_template, template_rendered
+import atexit
+import csv
 import datetime
-import openpyxl
+import functools
+import heapq
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice, repeat
+from time import perf_counter
+
+import archive
+import backup
+import bulk_import
+from cache import TTLCache, cached, content_fingerprint
+from db import ConnectionPool
+from docstore import DocumentStore
+from documents import CompiledDocxTemplate, RenderCache, iter_zip, merge_documents
+from jobs import JobQueue, QueueFull, DONE
+import migrations
+from pagination import Page, decode_cursor, encode_cursor, keyset_query, make_page
+from profiling import Metrics, RequestProfile, SlowQueryLog
+from rows import (AppointmentListRow, AppointmentRow, ClinicRow, EmployeeListRow, EmployeeRefRow, EmployeeRow,
+                  PatientHeaderRow, PatientListRow, PatientRow, PaymentListRow, PaymentRow, ServiceListRow,
+                  ServiceRefRow, ServiceRow, factory, project)
+from scheduling import SlotIndex
+from writer import GroupCommitWriter
 
 app = Flask(__name__)
+app.config.setdefault('DATABASE', 'medclinic.db')
+app.config.setdefault('DB_POOL_SIZE', 8)
+app.config.setdefault('DB_PRAGMAS', None)  # None - настройки по умолчанию из db.DEFAULT_PRAGMAS
+app.config.setdefault('DB_AUTO_MIGRATE', True)  # обновлять схему базы при первом подключении
+app.config.setdefault('WRITER_ENABLED', True)  # выполнять изменения единственным потоком записи
+app.config.setdefault('WRITER_DURABILITY', None)  # 'off', 'normal' или 'full'; None - как в DB_PRAGMAS
+app.config.setdefault('WRITER_MAX_BATCH', 256)  # изменений в одной транзакции
+app.config.setdefault('WRITER_MAX_DELAY_MS', 0)  # сколько ждать новых изменений для общей фиксации
+app.config.setdefault('WRITER_BUSY_TIMEOUT_MS', 5000)  # ожидание блокировки, занятой другим процессом
+app.config.setdefault('WRITER_RETRIES', 3)  # повторов транзакции, если база осталась занята
+app.config.setdefault('PAGE_SIZE', 50)  # строк на странице списков по умолчанию
+app.config.setdefault('TIMELINE_PAGE_SIZE', 20)  # записей истории пациента, загружаемых за один раз
+app.config.setdefault('MAX_PAGE_SIZE', 500)
+app.config.setdefault('REPORT_CHUNK_SIZE', 1000)  # строк, читаемых из курсора за один раз при выгрузке отчетов
+app.config.setdefault('JOBS_DIR', os.path.join(app.instance_path, 'jobs'))  # файлы фоновых заданий
+app.config.setdefault('JOBS_WORKERS', 2)  # одновременно выполняемых заданий
+app.config.setdefault('JOBS_MAX_PENDING', 100)
+app.config.setdefault('JOBS_RETRIES', 2)
+app.config.setdefault('JOBS_TTL', 3600)  # секунд хранения готовых документов
+app.config.setdefault('CHEQUE_TEMPLATE', os.path.join(app.root_path, 'templates', 'documents', 'cheque.docx'))
+app.config.setdefault('RECEIPT_CACHE_SIZE', 256)  # готовых чеков в памяти
+app.config.setdefault('RECEIPT_PROCESSES', os.cpu_count() or 1)  # процессов для пакетного формирования чеков
+app.config.setdefault('RECEIPT_BATCH_LIMIT', 5000)  # наибольшее число чеков в одном архиве
+app.config.setdefault('DOCUMENTS_DIR', os.path.join(app.instance_path, 'documents'))  # хранилище готовых документов
+app.config.setdefault('DOCUMENTS_LAYOUT', '%Y/%m/%d')  # каталоги по дате сохранения (формат strftime)
+app.config.setdefault('DOCUMENTS_MAX_BYTES', 1 << 30)  # объем хранилища, сверх которого удаляются старые документы
+app.config.setdefault('DOCUMENTS_MAX_AGE', 90 * 86400)  # секунд хранения документа
+app.config.setdefault('DOCUMENTS_ARCHIVE_AFTER', 7 * 86400)  # сжимать документы, не запрошенные столько секунд
+app.config.setdefault('DOCUMENTS_MAINTENANCE_INTERVAL', 3600)  # секунд между архивированием и вытеснением
+app.config.setdefault('ARCHIVE_DIR', None)  # архив закрытых лет (archive.py); None - каталог archive рядом с базой
+app.config.setdefault('BACKUP_DIR', None)  # снимки базы (backup.py); None - каталог backups рядом с базой
+app.config.setdefault('BACKUP_INTERVAL', 0)  # секунд между снимками; 0 - снимки по расписанию не снимаются
+app.config.setdefault('BACKUP_KEEP', 7)  # сколько последних снимков хранить
+app.config.setdefault('BACKUP_STEP_PAGES', backup.DEFAULT_PAGES)  # страниц базы за шаг копирования
+app.config.setdefault('BACKUP_STEP_PAUSE', backup.DEFAULT_PAUSE)  # секунд между шагами копирования
+app.config.setdefault('REFERENCE_CACHE_TTL', 60)  # секунд жизни справочников в кэше
+app.config.setdefault('REFERENCE_CACHE_SIZE', 128)
+app.config.setdefault('SEARCH_LIMIT', 10)  # подсказок в ответе поиска по умолчанию
+app.config.setdefault('MAX_SEARCH_LIMIT', 50)
+app.config.setdefault('IMPORT_BATCH_SIZE', bulk_import.DEFAULT_BATCH_SIZE)
+app.config.setdefault('IMPORT_MAX_REJECTED_SHOWN', 100)  # отклоненных строк в отчете о загрузке
+app.config.setdefault('PROFILING', False)  # замеры SQL, шаблонов и документов, заголовок Server-Timing и /metrics
+app.config.setdefault('PROFILING_SLOW_QUERY_MS', 100)  # порог журнала медленных запросов; None - не вести
+app.config.setdefault('PROFILING_RECENT_REQUESTS', 50)  # последних запросов с замерами на странице /profiling
+app.config.setdefault('SCHEDULE_DAY_START', '08:00')  # рабочие часы врачей
+app.config.setdefault('SCHEDULE_DAY_END', '20:00')
+app.config.setdefault('SCHEDULE_WORKDAYS', (0, 1, 2, 3, 4, 5))  # рабочие дни недели, 0 - понедельник
+app.config.setdefault('SCHEDULE_HORIZON_DAYS', 90)  # на сколько дней вперед искать свободное время
+app.config.setdefault('SCHEDULE_TTL', 60)  # секунд до перечитывания расписания врача из базы
+app.config.setdefault('SLOTS_LIMIT', 10)  # свободных слотов в ответе по умолчанию
+app.config.setdefault('MAX_SLOTS_LIMIT', 100)
+app.config.setdefault('SERVER_BIND', '127.0.0.1:8000')  # адрес рабочего сервера (wsgi.py)
+app.config.setdefault('SERVER_WORKERS', os.cpu_count() or 1)  # процессов рабочего сервера
+app.config.setdefault('SERVER_THREADS', 4)  # потоков в каждом процессе
+app.config.setdefault('HTTP_ETAGS', True)  # ETag по версиям таблиц и ответы 304 для списков и карточек
+app.config.setdefault('HTML_CACHE_SIZE', 0)  # готовых страниц в памяти, ключ - ETag; 0 - не кэшировать
+app.config.setdefault('STATIC_MAX_AGE', 365 * 24 * 3600)  # секунд хранения статики с отпечатком в адресе
+app.config.setdefault('API_BATCH_LIMIT', 1000)  # наибольшее число элементов в пакетном запросе API
+
+# Справочники для выпадающих списков и чеков; сбрасываются маршрутами, изменяющими таблицы.
+# Остальные объекты, зависящие от настроек, создает init_resources.
+reference_cache = TTLCache(app.config['REFERENCE_CACHE_TTL'], app.config['REFERENCE_CACHE_SIZE'])
+metrics = Metrics()
+
+_db_lock = threading.Lock()
+
 
 # --- Функции для работы с базой данных ---
-def execute_query(query, params=None, fetchone=False, commit=False):
-    """Выполняет SQL-запрос к базе данных и возвращает результат."""
-    conn = sqlite3.connect('medclinic.db')
-    cursor = conn.cursor()
-    cursor.execute(query, params or ())
-    if commit:
-        conn.commit()
-    result = cursor.fetchone() if fetchone else cursor.fetchall()
-    conn.close()
-    return result
+def get_db():
+    """Возвращает пул соединений приложения, создавая его при первом обращении."""
+    pool = app.extensions.get('db_pool')
+    if pool is None:
+        with _db_lock:
+            pool = app.extensions.get('db_pool')
+            if pool is None:
+                if app.config['DB_AUTO_MIGRATE']:
+                    migrations.upgrade(app.config['DATABASE'])
+                pool = ConnectionPool(app.config['DATABASE'], size=app.config['DB_POOL_SIZE'],
+                                      pragmas=app.config['DB_PRAGMAS'])
+                pool.on_connect.append(functools.partial(archive.attach, archive_dir=get_archive_dir()))
+                app.extensions['db_pool'] = pool
+                atexit.register(pool.close)
+    return pool
+
+
+def get_archive_dir():
+    """Возвращает каталог архива закрытых лет."""
+    return app.config['ARCHIVE_DIR'] or archive.default_dir(app.config['DATABASE'])
+
+
+@cached(reference_cache, 'archive')
+def load_archive_years():
+    """Читает из базы перенесенные в архив годы."""
+    with get_db().connection() as conn:
+        return tuple(archive.archived_years(conn))
+
+
+def get_archive_years():
+    """Возвращает перенесенные в архив годы.
+
+    Список хранится в кэше справочников и перечитывается, когда меняются приемы или платежи
+    (см. get_table_versions). Архивы подключаются к соединению при его открытии, поэтому после
+    переноса нового года пул закрывает старые соединения, и следующие запросы получают
+    соединения со всеми архивами.
+    """
+    global archive_years
+    years = load_archive_years()
+    if years != archive_years:
+        get_db().recycle()
+        archive_years = years
+    return years
+
+
+def partition_schemas(date_from=None, date_to=None):
+    """Возвращает разделы с приемами и платежами за период: архивы пересекающихся с ним лет и main."""
+    return [archive.schema(year) for year in archive.overlapping(get_archive_years(), date_from, date_to)] + ['main']
+
+
+def get_jobs():
+    """Возвращает очередь фоновых заданий приложения, создавая ее при первом обращении."""
+    queue = app.extensions.get('job_queue')
+    if queue is None:
+        with _db_lock:
+            queue = app.extensions.get('job_queue')
+            if queue is None:
+                queue = JobQueue(app.config['JOBS_DIR'], max_workers=app.config['JOBS_WORKERS'],
+                                 max_pending=app.config['JOBS_MAX_PENDING'], retries=app.config['JOBS_RETRIES'],
+                                 ttl=app.config['JOBS_TTL'])
+                app.extensions['job_queue'] = queue
+                atexit.register(queue.shutdown)
+    return queue
+
+
+def get_documents():
+    """Возвращает хранилище готовых документов, создавая его при первом обращении."""
+    store = app.extensions.get('document_store')
+    if store is None:
+        with _db_lock:
+            store = app.extensions.get('document_store')
+            if store is None:
+                store = DocumentStore(app.config['DOCUMENTS_DIR'], layout=app.config['DOCUMENTS_LAYOUT'],
+                                      max_bytes=app.config['DOCUMENTS_MAX_BYTES'],
+                                      max_age=app.config['DOCUMENTS_MAX_AGE'],
+                                      archive_after=app.config['DOCUMENTS_ARCHIVE_AFTER'],
+                                      maintenance_interval=app.config['DOCUMENTS_MAINTENANCE_INTERVAL'])
+                app.extensions['document_store'] = store
+                atexit.register(store.close)
+    return store
+
+
+def get_render_pool():
+    """Возвращает пул процессов для пакетного формирования документов."""
+    pool = app.extensions.get('render_pool')
+    if pool is None:
+        with _db_lock:
+            pool = app.extensions.get('render_pool')
+            if pool is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                # Процессы запускаются заново (spawn), а не копией приложения с работающими потоками
+                # и их блокировками; настройки, от которых зависит чек, передаются инициализатору
+                pool = ProcessPoolExecutor(max_workers=app.config['RECEIPT_PROCESSES'],
+                                           mp_context=multiprocessing.get_context('spawn'),
+                                           initializer=init_render_worker,
+                                           initargs=(app.config['CHEQUE_TEMPLATE'], app.config['RECEIPT_CACHE_SIZE']))
+                app.extensions['render_pool'] = pool
+                atexit.register(pool.shutdown)
+    return pool
+
+
+def get_backup_dir():
+    """Возвращает каталог снимков базы."""
+    return app.config['BACKUP_DIR'] or backup.default_dir(app.config['DATABASE'])
+
+
+def get_backups():
+    """Возвращает поток снимков по расписанию, запуская его при первом обращении; None, если снимки отключены."""
+    if not app.config['BACKUP_INTERVAL']:
+        return None
+    scheduler = app.extensions.get('backup_scheduler')
+    if scheduler is None:
+        with _db_lock:
+            scheduler = app.extensions.get('backup_scheduler')
+            if scheduler is None:
+                scheduler = backup.BackupScheduler(app.config['DATABASE'], get_backup_dir(),
+                                                   app.config['BACKUP_INTERVAL'], keep=app.config['BACKUP_KEEP'],
+                                                   archive_dir=get_archive_dir(),
+                                                   pages=app.config['BACKUP_STEP_PAGES'],
+                                                   pause=app.config['BACKUP_STEP_PAUSE'])
+                app.extensions['backup_scheduler'] = scheduler
+                atexit.register(scheduler.close)
+    return scheduler
+
+
+def close_db():
+    """Останавливает поток записи, снимки по расписанию и закрывает пул соединений приложения."""
+    scheduler = app.extensions.pop('backup_scheduler', None)
+    if scheduler is not None:
+        scheduler.close()
+    writer = app.extensions.pop('db_writer', None)
+    if writer is not None:
+        writer.close()
+    pool = app.extensions.pop('db_pool', None)
+    if pool is not None:
+        pool.close()
+
+
+def get_writer():
+    """Возвращает поток записи с групповой фиксацией, создавая его при первом обращении."""
+    writer = app.extensions.get('db_writer')
+    if writer is None:
+        get_db()  # схема базы обновляется до начала записи
+        with _db_lock:
+            writer = app.extensions.get('db_writer')
+            if writer is None:
+                writer = GroupCommitWriter(app.config['DATABASE'], pragmas=app.config['DB_PRAGMAS'],
+                                           durability=app.config['WRITER_DURABILITY'],
+                                           max_batch=app.config['WRITER_MAX_BATCH'],
+                                           max_delay=app.config['WRITER_MAX_DELAY_MS'] / 1000,
+                                           busy_timeout=app.config['WRITER_BUSY_TIMEOUT_MS'],
+                                           retries=app.config['WRITER_RETRIES'])
+                app.extensions['db_writer'] = writer
+                atexit.register(writer.close)
+    return writer
+
+
+def run_write(func):
+    """Выполняет func(conn) атомарно и возвращает ее результат.
+
+    При включенном WRITER_ENABLED функция выполняется потоком записи в составе общей
+    транзакции, иначе - в отдельной транзакции на соединении из пула.
+    """
+    if app.config['WRITER_ENABLED']:
+        return get_writer().call(func)
+    with get_db().connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")  # блокировка записи берется сразу, без повышения из чтения
+        try:
+            result = func(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return result
+
 
+def execute_query(query, params=None, fetchone=False, commit=False, row_type=None):
+    """Выполняет SQL-запрос к базе данных и возвращает результат.
 
+    row_type - тип строк из rows.py: строки создаются им сразу при чтении с курсора.
+    """
+    profile = current_profile()
+    if commit and app.config['WRITER_ENABLED']:
+        started = perf_counter()
+        result, rowcount, _ = get_writer().execute(query, params or ())
+        if profile is not None:
+            with get_db().connection() as conn:
+                record_query(conn, profile, query, params, perf_counter() - started, rowcount)
+        return (result[0] if result else None) if fetchone else result
+    with get_db().connection() as conn:
+        started = perf_counter()
+        cursor = conn.cursor()
+        if row_type is not None:
+            cursor.row_factory = factory(row_type)
+        cursor.execute(query, params or ())
+        if commit:
+            conn.commit()
+        result = cursor.fetchone() if fetchone else cursor.fetchall()
+        if profile is not None:
+            rows = cursor.rowcount if commit else int(result is not None) if fetchone else len(result)
+            record_query(conn, profile, query, params, perf_counter() - started, rows)
+        return result
+
+
+def iterate_query(query, params=None, chunk_size=None):
+    """Выполняет SQL-запрос и выдает строки результата порциями, не загружая их все в память."""
+    rows = get_db().iterate(query, params or (), chunk_size or app.config['REPORT_CHUNK_SIZE'])
+    profile = current_profile()
+    if profile is None:
+        return rows
+    return _profiled_rows(profile, query, params, rows)
+
+
+def _profiled_rows(profile, query, params, rows):
+    """Выдает строки rows, учитывая время их получения из базы в замерах запроса."""
+    duration = 0.0
+    count = 0
+    rows = iter(rows)
+    while True:
+        started = perf_counter()
+        row = next(rows, None)
+        duration += perf_counter() - started
+        if row is None:
+            break
+        count += 1
+        yield row
+    with get_db().connection() as conn:
+        record_query(conn, profile, query, params, duration, count)
+
+
+# --- Профилирование ---
+def current_profile():
+    """Возвращает замеры текущего запроса или None, если профилирование выключено или запроса нет."""
+    return g.get('profile') if has_app_context() else None
+
+
+def record_query(conn, profile, query, params, duration, rows):
+    """Учитывает SQL-запрос в замерах и при превышении порога записывает его в журнал медленных запросов."""
+    profile.add_query(' '.join(query.split()), duration, rows)
+    slow_queries.check(conn, query, params or (), duration, profile.path)
+
+
+@contextmanager
+def timed(stage):
+    """Учитывает время выполнения блока как этап stage в замерах текущего запроса."""
+    profile = current_profile()
+    if profile is None:
+        yield
+        return
+    profile.start(stage)
+    try:
+        yield
+    finally:
+        profile.stop(stage)
+
+
+metrics.describe('medclinic_requests_total', 'Обработанные запросы по маршруту, методу и коду ответа.')
+metrics.describe('medclinic_request_duration_seconds', 'Время обработки запроса.')
+metrics.describe('medclinic_sql_queries_total', 'Выполненные SQL-запросы.')
+metrics.describe('medclinic_sql_duration_seconds', 'Суммарное время SQL-запросов за один запрос к приложению.')
+metrics.describe('medclinic_render_duration_seconds', 'Время формирования шаблонов и документов за один запрос.')
+
+
+@app.before_request
+def start_profile():
+    """Начинает замеры запроса, если профилирование включено."""
+    if app.config['PROFILING']:
+        g.profile = RequestProfile(request.method, request.path)
+
+
+@app.before_request
+def start_backups():
+    """Запускает снимки базы по расписанию с первым запросом (в каждом процессе сервера)."""
+    get_backups()
+
+
+@app.after_request
+def finish_profile(response):
+    """Добавляет заголовок Server-Timing и учитывает замеры запроса в метриках."""
+    profile = current_profile()
+    if profile is None:
+        return response
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    response.headers['Server-Timing'] = profile.server_timing()
+    metrics.inc('medclinic_requests_total', route=route, method=request.method, status=response.status_code)
+    metrics.observe('medclinic_request_duration_seconds', profile.elapsed, route=route, method=request.method)
+    metrics.inc('medclinic_sql_queries_total', len(profile.queries), route=route)
+    metrics.observe('medclinic_sql_duration_seconds', profile.timings.get('sql', 0.0), route=route)
+    for stage, duration in profile.timings.items():
+        if stage != 'sql':
+            metrics.observe('medclinic_render_duration_seconds', duration, route=route, stage=stage)
+    recent_profiles.append(profile.to_dict())
+    return response
+
+
+@before_render_template.connect_via(app)
+def start_template_timer(sender, template, context, **extra):
+    profile = current_profile()
+    if profile is not None:
+        profile.start('template')
+
+
+@template_rendered.connect_via(app)
+def stop_template_timer(sender, template, context, **extra):
+    profile = current_profile()
+    if profile is not None:
+        profile.stop('template')
+
+
+@cached(reference_cache, 'services')
 def get_services_from_db():
-    """Возвращает список всех услуг."""
-    return execute_query("SELECT * FROM Services")
+    """Возвращает справочник услуг: id, название, код и стоимость."""
+    return execute_query(f"SELECT {ServiceRefRow.select} FROM Services", row_type=ServiceRefRow)
 
 
 def get_service_from_db(service_id):
     """Возвращает информацию об услуге по ID."""
-    return execute_query("SELECT * FROM Services WHERE id = ?", (service_id,), fetchone=True)
-
-
-def get_patients_from_db():
-    """Возвращает список всех пациентов."""
-    return execute_query("SELECT * FROM Patients")
+    return execute_query(f"SELECT {ServiceRow.select} FROM Services WHERE id = ?", (service_id,), fetchone=True,
+                         row_type=ServiceRow)
 
 
 def get_patient_from_db(patient_id):
     """Возвращает информацию о пациенте по ID."""
-    return execute_query("SELECT * FROM Patients WHERE id = ?", (patient_id,), fetchone=True)
+    return execute_query(f"SELECT {PatientRow.select} FROM Patients WHERE id = ?", (patient_id,), fetchone=True,
+                         row_type=PatientRow)
 
 
-def get_patient_with_visits_from_db(patient_id):
-    """Возвращает информацию о пациенте и его посещениях."""
-    query = """
-        SELECT 
-            p.id, p.FIO, p.DateOfBirth, p.PhoneNumber, p.Address, p.InsurancePolicy,
-            a.Date, a.Time, e.FIO, a.Complaints, a.PreliminaryDiagnosis
-        FROM Patients p
-        LEFT JOIN Appointments a ON p.id = a.id_patient
-        LEFT JOIN Employees e ON a.id_doctor = e.id
-        WHERE p.id = ?
-    """
-    visits = execute_query(query, (patient_id,))
+def get_patient_header(patient_id):
+    """Возвращает данные пациента, число его приемов и платежей и дату последнего приема.
 
-    if not visits:  # Если нет посещений, но есть пациент
-        patient = get_patient_from_db(patient_id)
-        if patient:
-            return [patient + (None, None, None, None, None,)]  # Возвращаем данные пациента с None для посещений
-        else:
-            return None
-    return visits
+    Счетчики основной базы считаются тем же запросом, что и данные пациента; если есть архив,
+    к ним добавляются счетчики архивных лет.
+    """
+    header = execute_query(f"SELECT {PatientHeaderRow.select} FROM Patients WHERE Patients.id = ?", (patient_id,),
+                           fetchone=True, row_type=PatientHeaderRow)
+    archived = partition_schemas()[:-1]
+    if header is None or not archived:
+        return header
+    query = archive.union("""
+        SELECT (SELECT count(*) FROM {Appointments} WHERE id_patient = ?) AS appointments,
+            (SELECT count(*) FROM {Payments} WHERE id_patient = ?) AS payments,
+            (SELECT max(Date) FROM {Appointments} WHERE id_patient = ?) AS last_visit
+    """, archived)
+    appointments, payments, last_visit = execute_query(
+        f"SELECT sum(appointments), sum(payments), max(last_visit) FROM ({query})",
+        (patient_id,) * 3 * len(archived), fetchone=True)
+    return header._replace(appointments=header.appointments + appointments, payments=header.payments + payments,
+                           last_visit=max(filter(None, (header.last_visit, last_visit)), default=None))
+
+
+# Порядок видов записей истории в пределах одной даты (по убыванию) и значение, большее любого id
+TIMELINE_KINDS = {'appointment': 0, 'payment': 1}
+MAX_ROWID = 2 ** 63 - 1
+
+
+def get_patient_timeline(patient_id, cursor=None, per_page=20):
+    """Возвращает страницу истории пациента: приемы и платежи от новых к старым.
+
+    Строка: (вид, дата, время, id, врач или услуга, жалобы, диагноз, сумма). Курсор -
+    (дата, вид, id) последней показанной строки; в пределах даты платежи идут перед приемами.
+    Каждая ветка запроса читает не больше per_page + 1 строк диапазоном покрывающего индекса
+    (id_patient, Date, id), поэтому страница стоит одинаково при любой длине истории.
+    Архивы лет позже даты курсора не читаются.
+    """
+    date, kind, last_id = cursor or ('9999-12-31', None, MAX_ROWID)
+    rank = TIMELINE_KINDS.get(kind, len(TIMELINE_KINDS))
+
+    def bound(branch):
+        # Строки той же даты: своего вида - до last_id, следующих видов - все, предыдущих - ни одной
+        return last_id if branch == rank else MAX_ROWID if branch < rank else 0
+
+    schemas = partition_schemas(date_to=date)
+    branches = archive.union("""
+        SELECT * FROM (
+            SELECT 1 AS kind, Date, payment_time AS Time, id, id_service AS ref, NULL AS Complaints,
+                NULL AS PreliminaryDiagnosis, Summ
+            FROM {Payments} WHERE id_patient = ? AND (Date, id) < (?, ?)
+            ORDER BY Date DESC, id DESC LIMIT ?
+        )
+        UNION ALL
+        SELECT * FROM (
+            SELECT 0, Date, Time, id, id_doctor, Complaints, PreliminaryDiagnosis, NULL
+            FROM {Appointments} WHERE id_patient = ? AND (Date, id) < (?, ?)
+            ORDER BY Date DESC, id DESC LIMIT ?
+        )
+    """, schemas)
+    query = f"""
+        SELECT CASE t.kind WHEN 1 THEN 'payment' ELSE 'appointment' END, t.Date, t.Time, t.id,
+            coalesce(e.FIO, s.Name), t.Complaints, t.PreliminaryDiagnosis, t.Summ
+        FROM ({branches}) AS t
+        LEFT JOIN Employees e ON t.kind = 0 AND e.id = t.ref
+        LEFT JOIN Services s ON t.kind = 1 AND s.id = t.ref
+        ORDER BY t.Date DESC, t.kind DESC, t.id DESC
+        LIMIT ?
+    """
+    params = (patient_id, date, bound(TIMELINE_KINDS['payment']), per_page + 1,
+              patient_id, date, bound(TIMELINE_KINDS['appointment']), per_page + 1)
+    rows = execute_query(query, params * len(schemas) + (per_page + 1,))
+    if len(rows) <= per_page:
+        return Page(rows)
+    rows = rows[:per_page]
+    return Page(rows, encode_cursor([rows[-1][1], rows[-1][0], rows[-1][3]]))
 
 
+@cached(reference_cache, 'employees')
 def get_employees_from_db():
-    """Возвращает список всех сотрудников."""
-    return execute_query("SELECT * FROM Employees")
+    """Возвращает справочник сотрудников: id, ФИО и специализация."""
+    return execute_query(f"SELECT {EmployeeRefRow.select} FROM Employees", row_type=EmployeeRefRow)
 
 
 def get_employee_from_db(employee_id):
     """Возвращает информацию о сотруднике по ID."""
-    return execute_query("SELECT * FROM Employees WHERE id = ?", (employee_id,), fetchone=True)
+    return execute_query(f"SELECT {EmployeeRow.select} FROM Employees WHERE id = ?", (employee_id,), fetchone=True,
+                         row_type=EmployeeRow)
 
 
-def get_appointments_from_db():
-    """Возвращает список всех приемов."""
-    query = """
-        SELECT Appointments.id, Appointments.Date, Appointments.Time, Employees.FIO, Patients.FIO 
-        FROM Appointments 
+def get_appointment_from_db(appointment_id, archived=True):
+    """Возвращает информацию о приеме по ID; archived=False - только из основной базы (для изменения)."""
+    schemas = partition_schemas() if archived else ['main']
+    query = archive.union(f"""
+        SELECT {AppointmentRow.select}
+        FROM {{Appointments}} AS Appointments 
         JOIN Employees ON Appointments.id_doctor = Employees.id 
-        JOIN Patients ON Appointments.id_patient = Patients.id
+        JOIN Patients ON Appointments.id_patient = Patients.id 
+        WHERE Appointments.id = ?
+    """, schemas)
+    return execute_query(query, (appointment_id,) * len(schemas), fetchone=True, row_type=AppointmentRow)
+
+
+def get_payment_from_db(payment_id, archived=True):
+    """Возвращает информацию о платеже по ID; archived=False - только из основной базы (для изменения)."""
+    schemas = partition_schemas() if archived else ['main']
+    query = archive.union(f"""
+        SELECT {PaymentRow.select}
+        FROM {{Payments}} AS Payments 
+        JOIN Patients ON Payments.id_patient = Patients.id 
+        JOIN Services ON Payments.id_service = Services.id 
+        JOIN Employees ON Payments.employee_id = Employees.id
+        WHERE Payments.id = ?
+    """, schemas)
+    return execute_query(query, (payment_id,) * len(schemas), fetchone=True, row_type=PaymentRow)
+
+
+def is_editable(table, row_id):
+    """Проверяет, что строка приемов или платежей лежит в основной базе: архивные строки не изменяются."""
+    if not get_archive_years():
+        return True
+    return execute_query(f"SELECT 1 FROM {table} WHERE id = ?", (row_id,), fetchone=True) is not None
+
+
+def parse_payment_form(services):
+    """Возвращает параметры платежа из формы: (пациент, услуга, дата, сумма, время, кассир) или None.
+
+    Скрытые поля выбора пациента и кассира могут прийти пустыми или с несуществующим id,
+    поэтому ссылки проверяются по базе.
+    """
+    patient_id = request.form.get('patient', type=int)
+    service_id = request.form.get('service', type=int)
+    employee_id = request.form.get('employee', type=int)
+    summ = request.form.get('summ', type=float)
+    moment = parse_date_time(request.form.get('date', ''), request.form.get('time', ''))
+    if (moment is None or summ is None or service_id not in {service.id for service in services}
+            or patient_id is None or get_patient_from_db(patient_id) is None
+            or employee_id is None or get_employee_from_db(employee_id) is None):
+        return None
+    date, payment_time = moment
+    return patient_id, service_id, date, summ, payment_time, employee_id
+
+
+def get_payments_for_checks(payment_ids=None, date_from=None, date_to=None, limit=None):
+    """Возвращает одним запросом платежи для пакетного формирования чеков."""
+    query = f"""
+        SELECT {PaymentRow.select}
+        FROM {{Payments}} AS Payments 
+        JOIN Patients ON Payments.id_patient = Patients.id 
+        JOIN Services ON Payments.id_service = Services.id 
+        JOIN Employees ON Payments.employee_id = Employees.id
     """
-    return execute_query(query)
+    conditions, params = [], []
+    if payment_ids:
+        conditions.append("Payments.id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(payment_ids)))
+    if date_from:
+        conditions.append("Payments.Date >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("Payments.Date <= ?")
+        params.append(date_to)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    schemas = partition_schemas() if payment_ids else partition_schemas(date_from, date_to)
+    query = archive.union(query, schemas) + " ORDER BY date, id"
+    params *= len(schemas)
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    return execute_query(query, params, row_type=PaymentRow)
+
+
+@cached(reference_cache, 'clinic')
+def get_clinic_info():
+    """Возвращает информацию о клинике."""
+    return execute_query(f"SELECT {ClinicRow.select} FROM ClinicInfo", fetchone=True, row_type=ClinicRow)
 
 
-def get_appointment_from_db(appointment_id):
-    """Возвращает информацию о приеме по ID."""
+# --- Аналитика (читается только из сводных таблиц) ---
+def get_daily_revenue(date_from, date_to):
+    """Возвращает выручку и число платежей по дням."""
     query = """
-        SELECT Appointments.id, Appointments.Date, Appointments.Time, Employees.FIO, Patients.FIO 
-        FROM Appointments 
-        JOIN Employees ON Appointments.id_doctor = Employees.id 
-        JOIN Patients ON Appointments.id_patient = Patients.id 
-        WHERE Appointments.id = ?
+        SELECT Date, SUM(Total), SUM(PaymentsCount) FROM RevenueByServiceDaily
+        WHERE Date BETWEEN ? AND ?
+        GROUP BY Date ORDER BY Date
     """
-    return execute_query(query, (appointment_id,), fetchone=True)
+    return execute_query(query, (date_from, date_to))
 
 
-def get_payments_from_db():
-    """Возвращает список всех платежей."""
+def get_revenue_by_service(date_from, date_to):
+    """Возвращает выручку и число платежей по услугам за период."""
     query = """
-        SELECT Payments.id, Payments.Date, Payments.payment_time, Patients.FIO, Services.Name, Payments.Summ, 
-        Employees.FIO, Services.Code 
-        FROM Payments 
-        JOIN Patients ON Payments.id_patient = Patients.id 
-        JOIN Services ON Payments.id_service = Services.id 
-        JOIN Employees ON Payments.employee_id = Employees.id
+        SELECT r.id_service, Services.Name, SUM(r.Total), SUM(r.PaymentsCount)
+        FROM RevenueByServiceDaily r
+        LEFT JOIN Services ON Services.id = r.id_service
+        WHERE r.Date BETWEEN ? AND ?
+        GROUP BY r.id_service ORDER BY SUM(r.Total) DESC
+    """
+    return execute_query(query, (date_from, date_to))
+
+
+def get_revenue_by_cashier(date_from, date_to):
+    """Возвращает выручку и число платежей по кассирам за период."""
+    query = """
+        SELECT r.employee_id, Employees.FIO, SUM(r.Total), SUM(r.PaymentsCount)
+        FROM RevenueByCashierDaily r
+        LEFT JOIN Employees ON Employees.id = r.employee_id
+        WHERE r.Date BETWEEN ? AND ?
+        GROUP BY r.employee_id ORDER BY SUM(r.Total) DESC
     """
-    return execute_query(query)
+    return execute_query(query, (date_from, date_to))
 
 
-def get_payment_from_db(payment_id):
-    """Возвращает информацию о платеже по ID."""
+def get_doctor_load(date_from, date_to):
+    """Возвращает число приемов каждого врача по дням."""
+    query = """
+        SELECT d.Date, d.id_doctor, Employees.FIO, d.AppointmentsCount
+        FROM DoctorLoadDaily d
+        LEFT JOIN Employees ON Employees.id = d.id_doctor
+        WHERE d.Date BETWEEN ? AND ?
+        ORDER BY d.Date, Employees.FIO
+    """
+    return execute_query(query, (date_from, date_to))
+
+
+# --- Поиск для подсказок в формах ---
+def search_patients(text, limit=10):
+    """Ищет пациентов по началу и фрагменту ФИО, телефона и номера полиса.
+
+    Фрагменты от трех символов ищутся по полнотекстовому индексу PatientsSearch (триграммы),
+    более короткий запрос ищется по началу ФИО. Совпадения с начала ФИО выводятся первыми.
+    """
+    text = ' '.join(text.split())
+    terms = [term for term in text.split(' ') if len(term) >= 3]
+    if terms:
+        match = ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+        query = """
+            SELECT Patients.id, Patients.FIO, Patients.DateOfBirth, Patients.PhoneNumber, Patients.InsurancePolicy
+            FROM PatientsSearch
+            JOIN Patients ON Patients.id = PatientsSearch.rowid
+            WHERE PatientsSearch MATCH ?
+            ORDER BY Patients.FIO LIKE ? || '%' DESC, PatientsSearch.rank
+            LIMIT ?
+        """
+        return execute_query(query, (match, text, limit))
+    if not text:
+        return []
     query = """
-        SELECT Payments.id, Payments.Date, Payments.payment_time, Patients.FIO, Services.Name, Payments.Summ, 
-        Employees.FIO, Services.Code 
-        FROM Payments 
+        SELECT id, FIO, DateOfBirth, PhoneNumber, InsurancePolicy FROM Patients
+        WHERE FIO >= ? AND FIO < ?
+        ORDER BY FIO
+        LIMIT ?
+    """
+    return execute_query(query, (text, text + '\U0010ffff', limit))
+
+
+def search_employees(text, limit=10):
+    """Ищет сотрудников по фрагменту ФИО, должности или специализации."""
+    text = ' '.join(text.split())
+    if not text:
+        return []
+    query = """
+        SELECT id, FIO, Position, Specialization FROM Employees
+        WHERE FIO LIKE '%' || ? || '%' OR Position LIKE '%' || ? || '%' OR Specialization LIKE '%' || ? || '%'
+        ORDER BY FIO LIKE ? || '%' DESC, FIO
+        LIMIT ?
+    """
+    return execute_query(query, (text, text, text, text, limit))
+
+
+# --- Расписание приемов ---
+# Сообщение триггера миграции 5, запрещающего повторную запись на занятое время
+SLOT_TAKEN_ERROR = 'врач уже занят в это время'
+
+
+def get_booked_slots(doctor_id, date_from):
+    """Возвращает даты и время приемов врача начиная с date_from."""
+    return execute_query("SELECT Date, Time FROM Appointments WHERE id_doctor = ? AND Date >= ?",
+                         (doctor_id, date_from))
+
+
+def get_doctors_by_specialization(specialization):
+    """Возвращает идентификаторы сотрудников с указанной специализацией (без учета регистра)."""
+    # Сравнение в SQLite без учета регистра работает только для латиницы, поэтому сравниваем здесь
+    specialization = specialization.casefold()
+    return [employee.id for employee in get_employees_from_db()
+            if (employee.specialization or '').casefold() == specialization]
+
+
+def find_free_slots(doctor_ids, start, limit):
+    """Возвращает ближайшие свободные слоты врачей после start в порядке времени: (дата, время, id врача)."""
+    per_doctor = [[(date, time, doctor_id) for date, time in schedule.next_free(doctor_id, start, limit)]
+                  for doctor_id in doctor_ids]
+    return list(islice(heapq.merge(*per_doctor), limit))
+
+
+def suggest_slots(doctor_id, date, time, limit=5):
+    """Возвращает свободные слоты врача, начиная с указанных даты и времени, но не раньше текущего момента."""
+    if doctor_id is None:
+        return []
+    start = datetime.datetime.now()
+    try:
+        start = max(start, datetime.datetime.fromisoformat(f'{date}T{time}'))
+    except ValueError:
+        pass
+    return find_free_slots([doctor_id], start, limit)
+
+
+def parse_date_time(date, time):
+    """Приводит дату и время к виду 'ГГГГ-ММ-ДД' и 'ЧЧ:ММ'; возвращает None, если они неверны."""
+    try:
+        return datetime.date.fromisoformat(date).isoformat(), datetime.time.fromisoformat(time).strftime('%H:%M')
+    except ValueError:
+        return None
+
+
+def is_slot_taken(error):
+    """Проверяет, что ошибка базы данных вызвана попыткой записи на занятое время."""
+    return isinstance(error, sqlite3.IntegrityError) and SLOT_TAKEN_ERROR in str(error)
+
+
+# --- Постраничные списки ---
+# Для каждого списка: допустимые сортировки -> (выражение SQL, поле строки результата).
+# Сортировать можно только по столбцам NOT NULL, иначе курсор пропустит строки с NULL.
+PATIENT_SORTS = {'fio': ('Patients.FIO', 'fio'), 'id': ('Patients.id', 'id')}
+EMPLOYEE_SORTS = {'fio': ('Employees.FIO', 'fio'), 'position': ('Employees.Position', 'position'),
+                  'id': ('Employees.id', 'id')}
+SERVICE_SORTS = {'name': ('Services.Name', 'name'), 'cost': ('Services.Cost', 'cost'), 'id': ('Services.id', 'id')}
+APPOINTMENT_SORTS = {'date': ('Appointments.Date', 'date'), 'id': ('Appointments.id', 'id')}
+PAYMENT_SORTS = {'date': ('Payments.Date', 'date'), 'id': ('Payments.id', 'id')}
+
+
+def query_page(row_type, source, conditions, params, sorts, id_expr, sort, descending, cursor, per_page,
+               schemas=('main',)):
+    """Выполняет запрос списка с фильтрами и курсорной (keyset) пагинацией.
+
+    Выбираются только столбцы типа строки row_type; source - часть запроса после SELECT (FROM и JOIN),
+    в которой {Appointments} и {Payments} заменяются таблицами разделов schemas. Для нескольких
+    разделов каждый отдает не больше страницы строк, а общий порядок задает внешний запрос.
+    """
+    sort_expr, sort_field = sorts[sort]
+    query, params = keyset_query(f"SELECT {row_type.select} {source}", conditions, params, sort_expr, id_expr,
+                                 descending, cursor, per_page)
+    query = archive.union(query, schemas)
+    if len(schemas) > 1:
+        direction = 'DESC' if descending else 'ASC'
+        query += f" ORDER BY {sort_field} {direction}, id {direction} LIMIT ?"
+        params = list(params) * len(schemas) + [per_page + 1]
+    return make_page(execute_query(query, params, row_type=row_type), per_page,
+                     row_type._fields.index(sort_field), row_type._fields.index('id'))
+
+
+def get_patients_page(search=None, sort='fio', descending=False, cursor=None, per_page=50, row_type=PatientListRow):
+    """Возвращает страницу списка пациентов с поиском по началу ФИО."""
+    conditions, params = [], []
+    if search:
+        conditions.append("FIO LIKE ? || '%'")
+        params.append(search)
+    return query_page(row_type, "FROM Patients", conditions, params, PATIENT_SORTS, 'Patients.id',
+                      sort, descending, cursor, per_page)
+
+
+def get_employees_page(search=None, specialization=None, sort='fio', descending=False, cursor=None,
+                       per_page=50, row_type=EmployeeListRow):
+    """Возвращает страницу списка сотрудников с поиском по ФИО и отбором по специализации."""
+    conditions, params = [], []
+    if search:
+        conditions.append("FIO LIKE ? || '%'")
+        params.append(search)
+    if specialization:
+        conditions.append("Specialization = ?")
+        params.append(specialization)
+    return query_page(row_type, "FROM Employees", conditions, params, EMPLOYEE_SORTS, 'Employees.id',
+                      sort, descending, cursor, per_page)
+
+
+def get_services_page(search=None, sort='name', descending=False, cursor=None, per_page=50, row_type=ServiceListRow):
+    """Возвращает страницу списка услуг с поиском по названию или коду."""
+    conditions, params = [], []
+    if search:
+        conditions.append("(Name LIKE '%' || ? || '%' OR Code LIKE ? || '%')")
+        params.extend((search, search))
+    return query_page(row_type, "FROM Services", conditions, params, SERVICE_SORTS, 'Services.id',
+                      sort, descending, cursor, per_page)
+
+
+def get_appointments_page(date_from=None, date_to=None, doctor=None, patient=None, sort='date',
+                          descending=True, cursor=None, per_page=50, row_type=AppointmentListRow):
+    """Возвращает страницу списка приемов с отбором по датам, врачу и пациенту."""
+    source = """
+        FROM {Appointments} AS Appointments 
+        JOIN Employees ON Appointments.id_doctor = Employees.id 
+        JOIN Patients ON Appointments.id_patient = Patients.id
+    """
+    conditions, params = [], []
+    if date_from:
+        conditions.append("Appointments.Date >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("Appointments.Date <= ?")
+        params.append(date_to)
+    if doctor:
+        conditions.append("Appointments.id_doctor = ?")
+        params.append(doctor)
+    if patient:
+        conditions.append("Appointments.id_patient = ?")
+        params.append(patient)
+    return query_page(row_type, source, conditions, params, APPOINTMENT_SORTS, 'Appointments.id',
+                      sort, descending, cursor, per_page, partition_schemas(date_from, date_to))
+
+
+def get_payments_page(date_from=None, date_to=None, patient=None, service=None, employee=None, sort='date',
+                      descending=True, cursor=None, per_page=50, row_type=PaymentListRow):
+    """Возвращает страницу списка платежей с отбором по датам, пациенту, услуге и кассиру."""
+    source = """
+        FROM {Payments} AS Payments 
         JOIN Patients ON Payments.id_patient = Patients.id 
         JOIN Services ON Payments.id_service = Services.id 
         JOIN Employees ON Payments.employee_id = Employees.id
-        WHERE Payments.id = ?
     """
-    return execute_query(query, (payment_id,), fetchone=True)
-
-
-def get_clinic_info():
-    """Возвращает информацию о клинике."""
-    return execute_query("SELECT * FROM ClinicInfo", fetchone=True)
+    conditions, params = [], []
+    if date_from:
+        conditions.append("Payments.Date >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("Payments.Date <= ?")
+        params.append(date_to)
+    if patient:
+        conditions.append("Payments.id_patient = ?")
+        params.append(patient)
+    if service:
+        conditions.append("Payments.id_service = ?")
+        params.append(service)
+    if employee:
+        conditions.append("Payments.employee_id = ?")
+        params.append(employee)
+    return query_page(row_type, source, conditions, params, PAYMENT_SORTS, 'Payments.id',
+                      sort, descending, cursor, per_page, partition_schemas(date_from, date_to))
+
+
+def list_args(sorts, default_sort, default_order='asc'):
+    """Разбирает параметры сортировки и постраничного вывода из строки запроса."""
+    sort = request.args.get('sort', default_sort)
+    if sort not in sorts:
+        sort = default_sort
+    order = request.args.get('order', default_order)
+    per_page = request.args.get('per_page', app.config['PAGE_SIZE'], type=int)
+    return {
+        'sort': sort,
+        'descending': order == 'desc',
+        'cursor': decode_cursor(request.args.get('cursor')),
+        'per_page': max(1, min(per_page, app.config['MAX_PAGE_SIZE'])),
+    }
+
+
+def next_page_url(page):
+    """Возвращает ссылку на следующую страницу текущего списка с сохранением фильтров."""
+    if not page.has_next:
+        return None
+    args = request.args.to_dict()
+    args['cursor'] = page.next_cursor
+    return url_for(request.endpoint, **args)
+
+
+def first_page_url():
+    """Возвращает ссылку на первую страницу текущего списка с сохранением фильтров."""
+    args = request.args.to_dict()
+    args.pop('cursor', None)
+    return url_for(request.endpoint, **args)
 
 
 # --- Функции для генерации документов ---
-def generate_payment_check(payment_data, clinic_info):
-    """Генерирует чек об оплате."""
-    template_path = 'templates/documents/cheque.docx'
-    template = DocxTemplate(template_path)
-
+def payment_check_context(payment_data, clinic_info):
+    """Возвращает данные для заполнения шаблона чека об оплате."""
     if payment_data:
-        context = {
-            'CLINIC_NAME': clinic_info[1] if clinic_info else "Неизвестно",
-            'CLINIC_ADDRESS': clinic_info[2] if clinic_info else "Неизвестно",
-            'CLINIC_PHONE': clinic_info[3] if clinic_info else "Неизвестно",
-            'CHECK_NUMBER': payment_data[0] if payment_data else "Неизвестно",
-            'PAYMENT_DATE': payment_data[1] if payment_data else "Неизвестно",
-            'PAYMENT_TIME': payment_data[2] if payment_data else "Неизвестно",
-            'PATIENT_FULLNAME': payment_data[3] if payment_data else "Неизвестно",
-            'PATIENT_ID': payment_data[0] if payment_data else "Неизвестно",
-            'SERVICE_NAME': payment_data[4] if payment_data else "Неизвестно",
-            'SERVICE_CODE': payment_data[7] if payment_data else "Неизвестно",
-            'SERVICE_COST': payment_data[5] if payment_data else "Неизвестно",
-            'EMPLOYEE_NAME': payment_data[6] if payment_data else "Неизвестно"
+        return {
+            'CLINIC_NAME': clinic_info.name if clinic_info else "Неизвестно",
+            'CLINIC_ADDRESS': clinic_info.address if clinic_info else "Неизвестно",
+            'CLINIC_PHONE': clinic_info.phone if clinic_info else "Неизвестно",
+            'CHECK_NUMBER': payment_data.id if payment_data else "Неизвестно",
+            'PAYMENT_DATE': payment_data.date if payment_data else "Неизвестно",
+            'PAYMENT_TIME': payment_data.time if payment_data else "Неизвестно",
+            'PATIENT_FULLNAME': payment_data.patient if payment_data else "Неизвестно",
+            'PATIENT_ID': payment_data.id if payment_data else "Неизвестно",
+            'SERVICE_NAME': payment_data.service if payment_data else "Неизвестно",
+            'SERVICE_CODE': payment_data.service_code if payment_data else "Неизвестно",
+            'SERVICE_COST': payment_data.amount if payment_data else "Неизвестно",
+            'EMPLOYEE_NAME': payment_data.cashier if payment_data else "Неизвестно"
         }
     else:
-        context = {
+        return {
             'CLINIC_NAME': None,
             'CLINIC_ADDRESS': None,
             'CLINIC_PHONE': None,
@@ -162,16 +935,73 @@ def generate_payment_check(payment_data, clinic_info):
             'SERVICE_COST': None,
             'EMPLOYEE_NAME': None
         }
-    output_path = f'templates/documents/payment_{payment_data[0] if payment_data else "unknown"}_cheque.docx'
-    template.render(context)
-    template.save(output_path)
-    return output_path
 
 
-def generate_workload_report(start_date, end_date, employee_id):
-    """Генерирует отчет о загрузке персонала."""
+def render_payment_check(payment_data, clinic_info, stored=False):
+    """Возвращает чек об оплате (DOCX) в виде bytes.
+
+    Готовые чеки кэшируются по хэшу данных платежа, сведений о клинике и версии шаблона,
+    поэтому изменение любого из них приводит к формированию нового чека. При stored=True
+    чек также ищется в хранилище документов и сохраняется в него, так что повторная выгрузка
+    после перезапуска или в другом процессе не требует формирования.
+    """
+    context = payment_check_context(payment_data, clinic_info)
+    key = receipt_cache.key(context, cheque_template.version)
+    data = receipt_cache.get(key)
+    if data is None and stored:
+        data = get_documents().get(key)
+    if data is None:
+        with timed('docx'):
+            data = cheque_template.render(context)
+        if stored:
+            get_documents().put_async(key, data, f'payment_{payment_data.id}_cheque.docx')
+    receipt_cache.put(key, data)
+    return data
+
+
+def generate_payment_check(payment_data, clinic_info, output):
+    """Генерирует чек об оплате и записывает его в output (путь или файл)."""
+    data = render_payment_check(payment_data, clinic_info, stored=True)
+    if hasattr(output, 'write'):
+        output.write(data)
+    else:
+        with open(output, 'wb') as f:
+            f.write(data)
+    return output
+
+
+def init_render_worker(template_path, cache_size):
+    """Загружает в процессе пула шаблон чека и создает кэш чеков по настройкам приложения."""
+    global cheque_template, receipt_cache
+    cheque_template = CompiledDocxTemplate(template_path)
+    receipt_cache = RenderCache(cache_size)
+
+
+def render_payment_checks(payments, clinic_info):
+    """Формирует чеки для списка платежей, распределяя работу по процессам.
+
+    Выдает пары (строка платежа, bytes) в исходном порядке. Платежи передаются процессам
+    порциями, поэтому в памяти одновременно находится лишь небольшая часть чеков.
+    """
+    processes = app.config['RECEIPT_PROCESSES']
+    if processes <= 1 or len(payments) < 2 * processes:
+        for payment in payments:
+            yield payment, render_payment_check(payment, clinic_info)
+        return
+    window = processes * 8
+    pool = get_render_pool()
+    for start in range(0, len(payments), window):
+        chunk = payments[start:start + window]
+        yield from zip(chunk, pool.map(render_payment_check, chunk, repeat(clinic_info), chunksize=8))
+
+
+def workload_report_query(start_date, end_date, employee_id):
+    """Возвращает SQL-запрос и параметры для отчета о загрузке персонала.
+
+    Запрос читает только архивы лет, пересекающихся с периодом отчета.
+    """
     query = """
-        SELECT a.Date, a.Time, p.FIO AS patient_name, e.FIO AS employee_name FROM Appointments a
+        SELECT a.Date, a.Time, p.FIO AS patient_name, e.FIO AS employee_name FROM {Appointments} a
         JOIN Patients p ON a.id_patient = p.id
         JOIN Employees e ON a.id_doctor = e.id
         WHERE a.Date BETWEEN ? AND ?
@@ -180,18 +1010,195 @@ def generate_workload_report(start_date, end_date, employee_id):
     if employee_id:
         query += " AND e.id = ? "
         params = (start_date, end_date, employee_id)
+    schemas = partition_schemas(start_date, end_date)
+    return archive.union(query, schemas), params * len(schemas)
+
+
+WORKLOAD_REPORT_HEADER = ["Дата", "Время", "Пациент", "Сотрудник"]
+WORKLOAD_REPORT_FORMATS = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def generate_workload_report(start_date, end_date, employee_id, output):
+    """Генерирует отчет о загрузке персонала в формате XLSX и записывает его в output (путь или файл).
+
+    Книга создается в режиме write-only, поэтому строки не накапливаются в памяти.
+    """
+    import openpyxl
+
+    query, params = workload_report_query(start_date, end_date, employee_id)
+    with timed('xlsx'):
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(WORKLOAD_REPORT_HEADER)
+        for appointment in iterate_query(query, params):
+            ws.append(appointment)
+        wb.save(output)
+    return output
+
+
+def iter_workload_report_csv(start_date, end_date, employee_id):
+    """Выдает отчет о загрузке персонала в формате CSV частями по REPORT_CHUNK_SIZE строк."""
+    query, params = workload_report_query(start_date, end_date, employee_id)
+    chunk_size = app.config['REPORT_CHUNK_SIZE']
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    buffer.write('\ufeff')  # BOM, чтобы Excel распознал UTF-8
+    writer.writerow(WORKLOAD_REPORT_HEADER)
+    for number, appointment in enumerate(iterate_query(query, params, chunk_size), 1):
+        writer.writerow(appointment)
+        if number % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_workload_report_ndjson(start_date, end_date, employee_id):
+    """Выдает отчет о загрузке персонала в формате NDJSON, по одному объекту JSON на строку."""
+    query, params = workload_report_query(start_date, end_date, employee_id)
+    keys = ('date', 'time', 'patient', 'employee')
+    for appointment in iterate_query(query, params):
+        yield json.dumps(dict(zip(keys, appointment)), ensure_ascii=False) + '\n'
+
+
+# --- HTTP-кэширование ---
+# Группы кэша справочников, построенные по таблицам базы. Перенос года в архив удаляет
+# приемы и платежи из основной базы, поэтому их изменение сбрасывает список архивных лет.
+REFERENCE_CACHE_GROUPS = {'Patients': 'patients', 'Employees': 'employees', 'Services': 'services',
+                          'ClinicInfo': 'clinic', 'Appointments': 'archive', 'Payments': 'archive'}
+
+
+def get_table_versions():
+    """Возвращает версии таблиц; триггеры увеличивают версию таблицы при каждом ее изменении.
+
+    Если таблица изменилась с прошлой проверки, в том числе в другом процессе, справочники,
+    построенные по ней, сбрасываются в кэше.
+    """
+    versions = dict(execute_query("SELECT name, version FROM TableVersions"))
+    changed = [group for table, group in REFERENCE_CACHE_GROUPS.items()
+               if seen_table_versions.get(table) != versions.get(table)]
+    if changed:
+        reference_cache.invalidate(*changed)
+        seen_table_versions.update(versions)
+    return versions
+
 
-    appointments = execute_query(query, params)
+def get_page_release():
+    """Возвращает отпечаток шаблонов и статики; в режиме отладки пересчитывается при каждом запросе."""
+    if app.debug or app.config['TEMPLATES_AUTO_RELOAD']:
+        return content_fingerprint(os.path.join(app.root_path, app.template_folder), app.static_folder)
+    return page_release
 
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.append(["Дата", "Время", "Пациент", "Сотрудник"])
-    for appointment in appointments:
-        ws.append([appointment[0], appointment[1], appointment[2], appointment[3]])
 
-    output_path = f'templates/documents/workload_report_{datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.xlsx'
-    wb.save(output_path)
-    return output_path
+def conditional_page(*tables, daily=False):
+    """Декоратор GET-страницы, зависящей только от адреса и содержимого таблиц tables.
+
+    Сильный ETag вычисляется по адресу запроса, версиям таблиц и отпечатку шаблонов до
+    обращения к данным; при совпадении с If-None-Match возвращается 304 без выполнения
+    запросов и шаблонов. Готовые ответы хранятся в html_cache по тому же ключу. daily=True
+    добавляет к ключу текущую дату для страниц с периодом по умолчанию от сегодняшнего дня.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**kwargs):
+            if not app.config['HTTP_ETAGS']:
+                return view(**kwargs)
+            versions = get_table_versions()
+            etag = RenderCache.key(get_page_release(), request.full_path, [versions.get(t) for t in tables],
+                                   datetime.date.today() if daily else None)[:32]
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                cached_page = html_cache.get(etag)
+                if cached_page is not None:
+                    response = Response(cached_page[1], mimetype=cached_page[0])
+                else:
+                    response = app.make_response(view(**kwargs))
+                    if response.status_code == 200:
+                        html_cache.put(etag, (response.mimetype, response.get_data()))
+            response.set_etag(etag)
+            # Персональные данные не сохраняются общими кэшами; браузер сверяет ETag при каждом показе
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def static_fingerprint(filename):
+    """Возвращает отпечаток содержимого статического файла или None, если файла нет."""
+    try:
+        return content_fingerprint(os.path.join(app.static_folder, filename))
+    except OSError:
+        return None
+
+
+@app.url_defaults
+def add_static_fingerprint(endpoint, values):
+    """Добавляет к адресам статики параметр v с отпечатком файла, чтобы их можно было кэшировать надолго."""
+    if endpoint == 'static' and 'v' not in values:
+        fingerprint = static_fingerprint(values.get('filename', ''))
+        if fingerprint:
+            values['v'] = fingerprint
+
+
+@app.after_request
+def cache_static(response):
+    """Разрешает долгое хранение статики, запрошенной по адресу с актуальным отпечатком."""
+    if request.endpoint == 'static' and response.status_code in (200, 304) \
+            and request.args.get('v') == static_fingerprint(request.view_args.get('filename', '')):
+        response.headers['Cache-Control'] = f"public, max-age={app.config['STATIC_MAX_AGE']}, immutable"
+        response.expires = None
+    return response
+
+
+# --- Настройка приложения ---
+def init_resources():
+    """Создает объекты, зависящие от настроек: шаблон чека, кэши, журналы профилирования и расписание."""
+    global cheque_template, receipt_cache, slow_queries, recent_profiles, schedule
+    global html_cache, page_release, seen_table_versions, archive_years
+    cheque_template = CompiledDocxTemplate(app.config['CHEQUE_TEMPLATE'])
+    receipt_cache = RenderCache(app.config['RECEIPT_CACHE_SIZE'])
+    reference_cache.ttl = app.config['REFERENCE_CACHE_TTL']
+    reference_cache.max_entries = app.config['REFERENCE_CACHE_SIZE']
+    reference_cache.invalidate()
+    slow_queries = SlowQueryLog(app.config['PROFILING_SLOW_QUERY_MS'])
+    recent_profiles = deque(maxlen=app.config['PROFILING_RECENT_REQUESTS'])
+    # Длительность приема зашита в триггеры базы (migrations.SLOT_MINUTES) и не настраивается
+    if app.config.get('SCHEDULE_SLOT_MINUTES', migrations.SLOT_MINUTES) != migrations.SLOT_MINUTES:
+        raise RuntimeError(f'SCHEDULE_SLOT_MINUTES не поддерживается: прием длится {migrations.SLOT_MINUTES} минут')
+    schedule = SlotIndex(get_booked_slots, app.config['SCHEDULE_DAY_START'], app.config['SCHEDULE_DAY_END'],
+                         migrations.SLOT_MINUTES, app.config['SCHEDULE_WORKDAYS'],
+                         app.config['SCHEDULE_HORIZON_DAYS'], app.config['SCHEDULE_TTL'])
+    html_cache = RenderCache(app.config['HTML_CACHE_SIZE'])
+    page_release = content_fingerprint(os.path.join(app.root_path, app.template_folder), app.static_folder)
+    seen_table_versions = {}
+    archive_years = None
+
+
+init_resources()
+
+
+def create_app(config=None):
+    """Настраивает приложение для запуска под WSGI-сервером и возвращает его.
+
+    Настройки применяются по порядку: файл из переменной окружения MEDCLINIC_SETTINGS,
+    переменные окружения с префиксом MEDCLINIC_ (например, MEDCLINIC_DATABASE=/data/clinic.db,
+    MEDCLINIC_DB_POOL_SIZE=16, MEDCLINIC_DB_PRAGMAS='{"synchronous": "FULL"}'; значения
+    разбираются как JSON), затем словарь config. Маршруты зарегистрированы на модульном
+    объекте app, поэтому функция настраивает именно его.
+    """
+    app.config.from_envvar('MEDCLINIC_SETTINGS', silent=True)
+    app.config.from_prefixed_env('MEDCLINIC')
+    if config:
+        app.config.update(config)
+    close_db()  # пул соединений откроется заново с новыми настройками
+    init_resources()
+    return app
+
 
 # --- Маршруты ---
 @app.route('/')
@@ -201,22 +1208,38 @@ def index():
 
 
 @app.route('/patients')
+@conditional_page('Patients')
 def patients_list():
     """Отображает список пациентов."""
-    patients = get_patients_from_db()
-    return render_template('patients/patients_list.html', patients=patients)
+    page = get_patients_page(search=request.args.get('q'), **list_args(PATIENT_SORTS, 'fio'))
+    return render_template('patients/patients_list.html', patients=page.rows, page=page,
+                           next_url=next_page_url(page), first_url=first_page_url())
 
 
 @app.route('/patients/<int:id>')
+@conditional_page('Patients', 'Appointments', 'Payments', 'Employees', 'Services')
 def patient_details(id):
-    """Отображает детали пациента и его посещения."""
-    patient_data = get_patient_with_visits_from_db(id)
-    if patient_data:
-        patient = patient_data[0]
-        visits = patient_data
-        return render_template('patients/patient_details.html', patient=patient, visits=visits)
-    else:
-        return render_template('patients/patient_details.html', patient=None, visits=None)
+    """Отображает карточку пациента и первую страницу его истории."""
+    patient = get_patient_header(id)
+    timeline = get_patient_timeline(id, per_page=app.config['TIMELINE_PAGE_SIZE']) if patient else None
+    return render_template('patients/patient_details.html', patient=patient, timeline=timeline,
+                           next_url=timeline_page_url(id, timeline))
+
+
+@app.route('/patients/<int:id>/timeline')
+@conditional_page('Appointments', 'Payments', 'Employees', 'Services')
+def patient_timeline(id):
+    """Возвращает фрагмент HTML со следующей страницей истории пациента."""
+    timeline = get_patient_timeline(id, decode_cursor(request.args.get('cursor'), size=3),
+                                    app.config['TIMELINE_PAGE_SIZE'])
+    return render_template('patients/_timeline.html', timeline=timeline, next_url=timeline_page_url(id, timeline))
+
+
+def timeline_page_url(patient_id, timeline):
+    """Возвращает ссылку на следующую страницу истории пациента или None."""
+    if timeline is None or not timeline.has_next:
+        return None
+    return url_for('patient_timeline', id=patient_id, cursor=timeline.next_cursor)
 
 
 @app.route('/patients/<int:id>/edit', methods=['GET', 'POST'])
@@ -231,18 +1254,23 @@ def edit_patient(id):
         insurance_policy = request.form['insurance_policy']
         query = "UPDATE Patients SET FIO = ?, DateOfBirth = ?, PhoneNumber = ?, Address = ?, InsurancePolicy = ? WHERE id = ?"
         execute_query(query, (fio, date_of_birth, phone, address, insurance_policy, id), commit=True)
+        reference_cache.invalidate('patients')
         return redirect(url_for('patient_details', id=id))
     return render_template('patients/edit_patient.html', patient=patient)
 
 
 @app.route('/employees')
+@conditional_page('Employees')
 def employees_list():
     """Отображает список сотрудников."""
-    employees = get_employees_from_db()
-    return render_template('employees/employees_list.html', employees=employees)
+    page = get_employees_page(search=request.args.get('q'), specialization=request.args.get('specialization'),
+                              **list_args(EMPLOYEE_SORTS, 'fio'))
+    return render_template('employees/employees_list.html', employees=page.rows, page=page,
+                           next_url=next_page_url(page), first_url=first_page_url())
 
 
 @app.route('/employees/<int:id>')
+@conditional_page('Employees')
 def employee_details(id):
     """Отображает детали сотрудника."""
     employee = get_employee_from_db(id)
@@ -260,18 +1288,22 @@ def edit_employee(id):
         specialization = request.form['specialization']
         query = "UPDATE Employees SET FIO = ?, Position = ?, PhoneNumber = ?, Specialization = ? WHERE id = ?"
         execute_query(query, (fio, position, phone, specialization, id), commit=True)
+        reference_cache.invalidate('employees')
         return redirect(url_for('employee_details', id=id))
     return render_template('employees/edit_employee.html', employee=employee)
 
 
 @app.route('/services')
+@conditional_page('Services')
 def services_list():
     """Отображает список услуг."""
-    services = get_services_from_db()
-    return render_template('services/services_list.html', services=services)
+    page = get_services_page(search=request.args.get('q'), **list_args(SERVICE_SORTS, 'name'))
+    return render_template('services/services_list.html', services=page.rows, page=page,
+                           next_url=next_page_url(page), first_url=first_page_url())
 
 
 @app.route('/services/<int:id>')
+@conditional_page('Services')
 def service_details(id):
     """Отображает детали услуги."""
     service = get_service_from_db(id)
@@ -290,75 +1322,106 @@ def edit_service(id):
         detailed_description = request.form['detailed_description']
         query = "UPDATE Services SET Name = ?, Code = ?, Cost = ?, Description = ?, DetailedDescription = ? WHERE id = ?"
         execute_query(query, (name, code, cost, description, detailed_description, id), commit=True)
+        reference_cache.invalidate('services')
         return redirect(url_for('service_details', id=id))
     return render_template('services/edit_service.html', service=service)
 
 
 @app.route('/appointments')
+@conditional_page('Appointments', 'Employees', 'Patients')
 def appointments_list():
     """Отображает список приемов."""
-    appointments = get_appointments_from_db()
-    return render_template('appointments/appointments_list.html', appointments=appointments)
+    page = get_appointments_page(date_from=request.args.get('date_from'), date_to=request.args.get('date_to'),
+                                 doctor=request.args.get('doctor', type=int),
+                                 patient=request.args.get('patient', type=int),
+                                 **list_args(APPOINTMENT_SORTS, 'date', 'desc'))
+    return render_template('appointments/appointments_list.html', appointments=page.rows, page=page,
+                           next_url=next_page_url(page), first_url=first_page_url(),
+                           employees=get_employees_from_db())
 
 
 @app.route('/appointments/<int:id>')
+@conditional_page('Appointments', 'Employees', 'Patients')
 def appointment_details(id):
     """Отображает детали приема."""
     appointment = get_appointment_from_db(id)
-    return render_template('appointments/appointment_details.html', appointment=appointment)
+    return render_template('appointments/appointment_details.html', appointment=appointment,
+                           editable=appointment is not None and is_editable('Appointments', id))
 
 
 @app.route('/appointments/<int:id>/edit', methods=['GET', 'POST'])
 def edit_appointment(id):
     """Отображает форму для редактирования приема и обрабатывает ее."""
-    appointment = get_appointment_from_db(id)
-    employees = get_employees_from_db()
-    patients = get_patients_from_db()
+    appointment = get_appointment_from_db(id, archived=False)
+    if appointment is None:
+        # Прием не существует или перенесен в архив закрытого года, который не изменяется
+        return render_template('404.html'), 404
     if request.method == 'POST':
-        date = request.form['date']
-        time = request.form['time']
-        doctor = request.form['doctor']
-        patient = request.form['patient']
+        doctor_id = request.form.get('doctor', type=int)
+        patient_id = request.form.get('patient', type=int)
+        slot = parse_date_time(request.form['date'], request.form['time'])
+        if (doctor_id is None or get_employee_from_db(doctor_id) is None or patient_id is None
+                or get_patient_from_db(patient_id) is None or slot is None):
+            return render_template('appointments/edit_appointment.html', appointment=appointment,
+                                   error='Укажите врача, пациента, дату и время приема'), 400
+        date, time = slot
         query = "UPDATE Appointments SET id_doctor = ?, id_patient = ?, Date = ?, Time = ? WHERE id = ?"
-        execute_query(query, (doctor, patient, date, time, id), commit=True)
+        try:
+            updated = run_write(lambda conn: conn.execute(query, (doctor_id, patient_id, date, time, id)).rowcount)
+        except sqlite3.IntegrityError as e:
+            if not is_slot_taken(e):
+                raise
+            return render_template('appointments/edit_appointment.html', appointment=appointment,
+                                   error='Врач уже занят в это время',
+                                   suggested_slots=suggest_slots(doctor_id, date, time)), 409
+        if not updated:
+            return render_template('404.html'), 404  # прием удален или перенесен в архив после чтения
+        schedule.invalidate(appointment.doctor_id)
+        schedule.book(doctor_id, date, time)
         return redirect(url_for('appointment_details', id=id))
-    return render_template('appointments/edit_appointment.html', appointment=appointment, employees=employees,
-                           patients=patients)
+    return render_template('appointments/edit_appointment.html', appointment=appointment)
 
 
 @app.route('/payments')
+@conditional_page('Payments', 'Patients', 'Services', 'Employees')
 def payments_list():
     """Отображает список платежей."""
-    payments = get_payments_from_db()
-    return render_template('payments/payments_list.html', payments=payments)
+    page = get_payments_page(date_from=request.args.get('date_from'), date_to=request.args.get('date_to'),
+                             patient=request.args.get('patient', type=int),
+                             service=request.args.get('service', type=int),
+                             employee=request.args.get('employee', type=int),
+                             **list_args(PAYMENT_SORTS, 'date', 'desc'))
+    return render_template('payments/payments_list.html', payments=page.rows, page=page,
+                           next_url=next_page_url(page), first_url=first_page_url(),
+                           services=get_services_from_db(), employees=get_employees_from_db())
 
 
 @app.route('/payments/<int:id>')
+@conditional_page('Payments', 'Patients', 'Services', 'Employees')
 def payment_details(id):
     """Отображает детали платежа."""
     payment = get_payment_from_db(id)
-    return render_template('payments/payment_details.html', payment=payment)
+    return render_template('payments/payment_details.html', payment=payment,
+                           editable=payment is not None and is_editable('Payments', id))
 
 
 @app.route('/payments/<int:id>/edit', methods=['GET', 'POST'])
 def edit_payment(id):
     """Отображает форму для редактирования платежа и обрабатывает ее."""
-    payment = get_payment_from_db(id)
+    payment = get_payment_from_db(id, archived=False)
+    if payment is None:
+        # Платеж не существует или перенесен в архив закрытого года, который не изменяется
+        return render_template('404.html'), 404
     services = get_services_from_db()
-    patients = get_patients_from_db()
-    employees = get_employees_from_db()
     if request.method == 'POST':
-        date = request.form['date']
-        payment_time = request.form['time']
-        patient = request.form['patient']
-        service = request.form['service']
-        summ = request.form['summ']
-        employee = request.form['employee']
+        params = parse_payment_form(services)
+        if params is None:
+            return render_template('payments/edit_payment.html', payment=payment, services=services,
+                                   error='Укажите пациента, услугу, сумму, кассира, дату и время платежа'), 400
         query = "UPDATE Payments SET id_patient = ?, id_service = ?, Date = ?, Summ = ?, payment_time = ?, employee_id = ? WHERE id = ?"
-        execute_query(query, (patient, service, date, summ, payment_time, employee, id), commit=True)
+        execute_query(query, (*params, id), commit=True)
         return redirect(url_for('payment_details', id=id))
-    return render_template('payments/edit_payment.html', payment=payment, services=services, patients=patients,
-                           employees=employees)
+    return render_template('payments/edit_payment.html', payment=payment, services=services)
 
 
 @app.route('/add_patient', methods=['GET', 'POST'])
@@ -372,6 +1435,7 @@ def add_patient():
         insurance_policy = request.form['insurance_policy']
         query = "INSERT INTO Patients (FIO, DateOfBirth, PhoneNumber, Address, InsurancePolicy) VALUES (?, ?, ?, ?, ?)"
         execute_query(query, (fio, date_of_birth, phone, address, insurance_policy), commit=True)
+        reference_cache.invalidate('patients')
         return redirect(url_for('patients_list'))
     return render_template('patients/add_patient.html')
 
@@ -386,6 +1450,7 @@ def add_employee():
         specialization = request.form['specialization']
         query = "INSERT INTO Employees (FIO, Position, PhoneNumber, Specialization) VALUES (?, ?, ?, ?)"
         execute_query(query, (fio, position, phone, specialization), commit=True)
+        reference_cache.invalidate('employees')
         return redirect(url_for('employees_list'))
     return render_template('employees/add_employee.html')
 
@@ -401,6 +1466,7 @@ def add_service():
         detailed_description = request.form['detailed_description']
         query = "INSERT INTO Services (Name, Code, Cost, Description, DetailedDescription) VALUES (?, ?, ?, ?, ?)"
         execute_query(query, (name, code, cost, description, detailed_description), commit=True)
+        reference_cache.invalidate('services')
         return redirect(url_for('services_list'))
     return render_template('services/add_service.html')
 
@@ -408,38 +1474,54 @@ def add_service():
 @app.route('/add_appointment', methods=['GET', 'POST'])
 def add_appointment():
     """Отображает форму для добавления приема и обрабатывает ее."""
-    employees = get_employees_from_db()
-    patients = get_patients_from_db()
     if request.method == 'POST':
-        date = request.form['date']
-        time = request.form['time']
-        doctor = request.form['doctor']
-        patient = request.form['patient']
+        doctor_id = request.form.get('doctor', type=int)
+        patient_id = request.form.get('patient', type=int)
         complaints = request.form['complaints']
         preliminary_diagnosis = request.form['preliminary_diagnosis']
+        # Скрытые поля выбора врача и пациента могут прийти пустыми или с несуществующим id
+        doctor_data = get_employee_from_db(doctor_id) if doctor_id is not None else None
+        patient_data = get_patient_from_db(patient_id) if patient_id is not None else None
+
+        def form_error(message, status, suggested_slots=()):
+            return render_template('appointments/add_appointment.html', form=request.form,
+                                   doctor_label=doctor_data.fio if doctor_data else '',
+                                   patient_label=patient_data.fio if patient_data else '',
+                                   error=message, suggested_slots=suggested_slots), status
+
+        slot = parse_date_time(request.form['date'], request.form['time'])
+        if doctor_data is None or patient_data is None or slot is None:
+            return form_error('Укажите врача, пациента, дату и время приема', 400)
+        date, time = slot
         query = "INSERT INTO Appointments (id_doctor, id_patient, Date, Time, Complaints, PreliminaryDiagnosis) VALUES (?, ?, ?, ?, ?, ?)"
-        execute_query(query, (doctor, patient, date, time, complaints, preliminary_diagnosis), commit=True)
+        try:
+            execute_query(query, (doctor_id, patient_id, date, time, complaints, preliminary_diagnosis), commit=True)
+        except sqlite3.IntegrityError as e:
+            if not is_slot_taken(e):
+                raise
+            return form_error('Врач уже занят в это время', 409, suggest_slots(doctor_id, date, time))
+        schedule.book(doctor_id, date, time)
         return redirect(url_for('appointments_list'))
-    return render_template('appointments/add_appointment.html', employees=employees, patients=patients)
+    return render_template('appointments/add_appointment.html')
 
 
 @app.route('/add_payment', methods=['GET', 'POST'])
 def add_payment():
     """Отображает форму для добавления платежа и обрабатывает ее."""
     services = get_services_from_db()
-    patients = get_patients_from_db()
-    employees = get_employees_from_db()
     if request.method == 'POST':
-        date = request.form['date']
-        payment_time = request.form['time']
-        patient = request.form['patient']
-        service = request.form['service']
-        summ = request.form['summ']
-        employee = request.form['employee']
+        params = parse_payment_form(services)
+        if params is None:
+            patient_data = get_patient_from_db(request.form.get('patient', type=int) or 0)
+            employee_data = get_employee_from_db(request.form.get('employee', type=int) or 0)
+            return render_template('payments/add_payment.html', services=services, form=request.form,
+                                   patient_label=patient_data.fio if patient_data else '',
+                                   employee_label=employee_data.fio if employee_data else '',
+                                   error='Укажите пациента, услугу, сумму, кассира, дату и время платежа'), 400
         query = "INSERT INTO Payments (id_patient, id_service, Date, Summ, payment_time, employee_id) VALUES (?, ?, ?, ?, ?, ?)"
-        execute_query(query, (patient, service, date, summ, payment_time, employee), commit=True)
+        execute_query(query, params, commit=True)
         return redirect(url_for('payments_list'))
-    return render_template('payments/add_payment.html', services=services, patients=patients, employees=employees)
+    return render_template('payments/add_payment.html', services=services)
 
 
 @app.route('/generate_payment_check/<int:payment_id>')
@@ -449,8 +1531,33 @@ def generate_payment_check_page(payment_id):
     clinic_info = get_clinic_info()
     if not payment_data:
         return render_template('404.html'), 404
-    output_path = generate_payment_check(payment_data, clinic_info)
-    return send_file(output_path, as_attachment=True, download_name=f'payment_{payment_id}_cheque.docx')
+    data = render_payment_check(payment_data, clinic_info, stored=True)
+    return send_file(io.BytesIO(data), as_attachment=True, download_name=f'payment_{payment_id}_cheque.docx')
+
+@app.route('/generate_payment_checks', methods=['GET', 'POST'])
+def generate_payment_checks_page():
+    """Формирует чеки по списку платежей или за период и отправляет их одним архивом."""
+    payment_ids = [int(value) for value in request.values.get('payment_ids', '').replace(' ', '').split(',')
+                   if value.isdigit()]
+    date_from = request.values.get('date_from')
+    date_to = request.values.get('date_to')
+    if not payment_ids and not date_from and not date_to:
+        abort(400, 'Необходимо указать номера платежей или период')
+    limit = app.config['RECEIPT_BATCH_LIMIT']
+    payments = get_payments_for_checks(payment_ids, date_from, date_to, limit + 1)
+    if not payments:
+        return render_template('404.html'), 404
+    if len(payments) > limit:
+        abort(400, f'Слишком много платежей: за один раз можно сформировать не более {limit} чеков')
+    receipts = render_payment_checks(payments, get_clinic_info())
+    if request.values.get('format') == 'docx':
+        with timed('docx'):
+            data = merge_documents(data for _, data in receipts)
+        return send_file(io.BytesIO(data), as_attachment=True, download_name='payment_cheques.docx')
+    zip_stream = iter_zip((f'payment_{payment.id}_cheque.docx', data) for payment, data in receipts)
+    return Response(stream_with_context(zip_stream), mimetype='application/zip',
+                    headers={'Content-Disposition': 'attachment; filename=payment_cheques.zip'})
+
 
 @app.route('/generate_workload_report', methods=['GET', 'POST'])
 def generate_workload_report_page():
@@ -461,14 +1568,456 @@ def generate_workload_report_page():
         employee_id = request.form.get('employee_id', None)
         if not start_date or not end_date:
             return render_template('error_report.html', error='Необходимо ввести даты!')
+        report_format = request.form.get('format', 'xlsx')
+        if report_format not in WORKLOAD_REPORT_FORMATS:
+            report_format = 'xlsx'
+        download_name = f'workload_report.{report_format}'
+        mimetype = WORKLOAD_REPORT_FORMATS[report_format]
         try:
-            output_path = generate_workload_report(start_date, end_date, employee_id)
-            return send_file(output_path, as_attachment=True, download_name='workload_report.xlsx')
+            if report_format == 'xlsx':
+                # Отчет за тот же период по неизмененным данным выдается из хранилища документов
+                versions = get_table_versions()
+                key = RenderCache.key('workload_report', start_date, end_date, employee_id,
+                                      [versions.get(table) for table in ('Appointments', 'Patients', 'Employees')])
+                output = get_documents().open(key)
+                if output is None:
+                    # Анонимный временный файл удаляется при закрытии, которое выполнит send_file
+                    output = generate_workload_report(start_date, end_date, employee_id, tempfile.TemporaryFile())
+                    output.seek(0)
+                    get_documents().put_async(key, output.read(), download_name)
+                    output.seek(0)
+                return send_file(output, as_attachment=True, download_name=download_name, mimetype=mimetype)
+            if report_format == 'csv':
+                rows = iter_workload_report_csv(start_date, end_date, employee_id)
+            else:
+                rows = iter_workload_report_ndjson(start_date, end_date, employee_id)
+            return Response(stream_with_context(rows), mimetype=mimetype,
+                            headers={'Content-Disposition': f'attachment; filename={download_name}'})
         except Exception as e:
             return render_template('error_report.html', error='Ошибка при генерации отчета!')
     employees = get_employees_from_db()
     return render_template('reports/workload_report_form.html', employees=employees)
 
+# --- Фоновые задания ---
+def job_response(job, status_code=200):
+    """Возвращает JSON с состоянием задания и ссылками на него."""
+    data = job.to_dict()
+    data['status_url'] = url_for('job_status', job_id=job.id)
+    data['download_url'] = url_for('job_download', job_id=job.id) if job.status == DONE else None
+    return jsonify(data), status_code
+
+
+@app.route('/jobs/payment_check/<int:payment_id>', methods=['POST'])
+def submit_payment_check_job(payment_id):
+    """Ставит в очередь формирование чека об оплате."""
+    payment_data = get_payment_from_db(payment_id)
+    if not payment_data:
+        return jsonify(error='Платеж не найден'), 404
+    clinic_info = get_clinic_info()
+    try:
+        job = get_jobs().submit('payment_check', f'payment_{payment_id}_cheque.docx',
+                                generate_payment_check, payment_data, clinic_info)
+    except QueueFull as e:
+        return jsonify(error=str(e)), 503
+    return job_response(job, 202)
+
+
+@app.route('/jobs/workload_report', methods=['POST'])
+def submit_workload_report_job():
+    """Ставит в очередь формирование отчета о загрузке персонала."""
+    start_date = request.form.get('start_date')
+    end_date = request.form.get('end_date')
+    employee_id = request.form.get('employee_id', None)
+    if not start_date or not end_date:
+        return jsonify(error='Необходимо ввести даты!'), 400
+    try:
+        job = get_jobs().submit('workload_report', 'workload_report.xlsx',
+                                generate_workload_report, start_date, end_date, employee_id)
+    except QueueFull as e:
+        return jsonify(error=str(e)), 503
+    return job_response(job, 202)
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Возвращает состояние фонового задания."""
+    job = get_jobs().get(job_id)
+    if job is None:
+        return jsonify(error='Задание не найдено'), 404
+    return job_response(job)
+
+
+@app.route('/jobs/<job_id>/download')
+def job_download(job_id):
+    """Отправляет документ, сформированный фоновым заданием."""
+    job = get_jobs().get(job_id)
+    if job is None:
+        abort(404)
+    if job.status != DONE:
+        return job_response(job, 409)
+    return send_file(os.path.abspath(job.path), as_attachment=True, download_name=job.download_name)
+
+
+@app.route('/import', methods=['GET', 'POST'])
+def import_data():
+    """Отображает форму пакетной загрузки данных из файла и выполняет загрузку."""
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        upload = request.files.get('file')
+        if kind not in bulk_import.IMPORTERS or not upload or not upload.filename:
+            return render_template('import/import_form.html', error='Выберите тип данных и файл')
+        rows = bulk_import.iter_rows(upload.stream, upload.filename)
+        with get_db().connection() as conn:
+            report = bulk_import.import_rows(conn, kind, rows, app.config['IMPORT_BATCH_SIZE'],
+                                             max_rejected=app.config['IMPORT_MAX_REJECTED_SHOWN'],
+                                             write=run_write)
+        reference_cache.invalidate(REFERENCE_CACHE_GROUPS[bulk_import.IMPORTERS[kind].table])
+        if kind == 'appointments':
+            schedule.invalidate()
+        return render_template('import/import_form.html', report=report)
+    return render_template('import/import_form.html')
+
+
+@app.route('/dashboard')
+@conditional_page('Payments', 'Appointments', 'Services', 'Employees', daily=True)
+def dashboard():
+    """Отображает сводку выручки и загрузки врачей за период."""
+    today = datetime.date.today()
+    date_to = request.args.get('date_to') or today.isoformat()
+    date_from = request.args.get('date_from') or (today - datetime.timedelta(days=30)).isoformat()
+    daily_revenue = get_daily_revenue(date_from, date_to)
+    return render_template('reports/dashboard.html', date_from=date_from, date_to=date_to,
+                           daily_revenue=daily_revenue,
+                           total_revenue=sum(row[1] for row in daily_revenue),
+                           revenue_by_service=get_revenue_by_service(date_from, date_to),
+                           revenue_by_cashier=get_revenue_by_cashier(date_from, date_to),
+                           doctor_load=get_doctor_load(date_from, date_to))
+
+
+def search_limit():
+    """Возвращает число подсказок, запрошенное в строке запроса, в допустимых пределах."""
+    limit = request.args.get('limit', app.config['SEARCH_LIMIT'], type=int)
+    return max(1, min(limit, app.config['MAX_SEARCH_LIMIT']))
+
+
+@app.route('/api/patients/search')
+@conditional_page('Patients')
+def api_search_patients():
+    """Возвращает подсказки по пациентам в формате JSON."""
+    patients = search_patients(request.args.get('q', ''), search_limit())
+    return jsonify([
+        {'id': p[0], 'label': p[1], 'details': ', '.join(str(value) for value in p[2:] if value)}
+        for p in patients
+    ])
+
+
+@app.route('/api/employees/search')
+@conditional_page('Employees')
+def api_search_employees():
+    """Возвращает подсказки по сотрудникам в формате JSON."""
+    employees = search_employees(request.args.get('q', ''), search_limit())
+    return jsonify([
+        {'id': e[0], 'label': e[1], 'details': ', '.join(str(value) for value in e[2:] if value)}
+        for e in employees
+    ])
+
+
+@app.route('/api/slots')
+def api_free_slots():
+    """Возвращает ближайшие свободные слоты врача или врачей специализации в формате JSON."""
+    doctor_id = request.args.get('doctor', type=int)
+    specialization = request.args.get('specialization', '').strip()
+    if doctor_id:
+        doctor_ids = [doctor_id]
+    elif specialization:
+        doctor_ids = get_doctors_by_specialization(specialization)
+    else:
+        return jsonify(error='Укажите врача или специализацию'), 400
+    start = datetime.datetime.now()
+    if request.args.get('from'):
+        try:
+            start = max(start, datetime.datetime.fromisoformat(request.args['from']))
+        except ValueError:
+            return jsonify(error='Неверная дата'), 400
+    limit = request.args.get('limit', app.config['SLOTS_LIMIT'], type=int)
+    limit = max(1, min(limit, app.config['MAX_SLOTS_LIMIT']))
+    doctors = {employee.id: employee.fio for employee in get_employees_from_db()}
+    return jsonify([
+        {'doctor_id': doctor, 'doctor': doctors.get(doctor), 'date': date, 'time': time}
+        for date, time, doctor in find_free_slots(doctor_ids, start, limit)
+    ])
+
+
+# --- JSON API v1 ---
+# Для каждой таблицы: тип строки с полями ресурса (rows.py), изменяемые поля (поле JSON -> столбец), функции чтения, сортировки и фильтры списка
+# (параметр запроса -> (аргумент функции страницы, тип)), таблицы для ETag и группа кэша справочников.
+API_RESOURCES = {
+    'patients': {
+        'table': 'Patients',
+        'row': PatientRow,
+        'columns': {'fio': 'FIO', 'date_of_birth': 'DateOfBirth', 'phone': 'PhoneNumber', 'address': 'Address',
+                    'insurance_policy': 'InsurancePolicy'},
+        'get': get_patient_from_db,
+        'page': get_patients_page,
+        'sorts': (PATIENT_SORTS, 'fio', 'asc'),
+        'filters': {'q': ('search', str)},
+        'depends': ('Patients',),
+        'cache_group': 'patients',
+    },
+    'employees': {
+        'table': 'Employees',
+        'row': EmployeeRow,
+        'columns': {'fio': 'FIO', 'position': 'Position', 'phone': 'PhoneNumber', 'specialization': 'Specialization'},
+        'get': get_employee_from_db,
+        'page': get_employees_page,
+        'sorts': (EMPLOYEE_SORTS, 'fio', 'asc'),
+        'filters': {'q': ('search', str), 'specialization': ('specialization', str)},
+        'depends': ('Employees',),
+        'cache_group': 'employees',
+    },
+    'services': {
+        'table': 'Services',
+        'row': ServiceRow,
+        'columns': {'name': 'Name', 'code': 'Code', 'cost': 'Cost', 'description': 'Description',
+                    'detailed_description': 'DetailedDescription'},
+        'get': get_service_from_db,
+        'page': get_services_page,
+        'sorts': (SERVICE_SORTS, 'name', 'asc'),
+        'filters': {'q': ('search', str)},
+        'depends': ('Services',),
+        'cache_group': 'services',
+    },
+    'appointments': {
+        'table': 'Appointments',
+        'row': AppointmentRow,
+        'columns': {'date': 'Date', 'time': 'Time', 'doctor_id': 'id_doctor', 'patient_id': 'id_patient',
+                    'complaints': 'Complaints', 'diagnosis': 'PreliminaryDiagnosis'},
+        'get': get_appointment_from_db,
+        'page': get_appointments_page,
+        'sorts': (APPOINTMENT_SORTS, 'date', 'desc'),
+        'filters': {'date_from': ('date_from', str), 'date_to': ('date_to', str), 'doctor': ('doctor', int),
+                    'patient': ('patient', int)},
+        'depends': ('Appointments', 'Employees', 'Patients'),
+        'cache_group': None,
+    },
+    'payments': {
+        'table': 'Payments',
+        'row': PaymentRow,
+        'columns': {'date': 'Date', 'time': 'payment_time', 'amount': 'Summ', 'patient_id': 'id_patient',
+                    'service_id': 'id_service', 'cashier_id': 'employee_id'},
+        'get': get_payment_from_db,
+        'page': get_payments_page,
+        'sorts': (PAYMENT_SORTS, 'date', 'desc'),
+        'filters': {'date_from': ('date_from', str), 'date_to': ('date_to', str), 'patient': ('patient', int),
+                    'service': ('service', int), 'employee': ('employee', int)},
+        'depends': ('Payments', 'Patients', 'Services', 'Employees'),
+        'cache_group': None,
+    },
+}
+
+
+class ApiError(Exception):
+    """Ошибка запроса к API; index - номер элемента пакета, на котором она возникла."""
+
+    def __init__(self, message, status=400, index=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.index = index
+
+
+@app.errorhandler(ApiError)
+def api_error(error):
+    """Возвращает ошибку API в формате JSON."""
+    body = {'error': error.message}
+    if error.index is not None:
+        body['index'] = error.index
+    return api_response(body, error.status)
+
+
+def api_response(data, status=200):
+    """Сериализует ответ API в компактный JSON: без пробелов, сортировки ключей и экранирования кириллицы."""
+    return Response(json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str), status,
+                    mimetype='application/json')
+
+
+def api_fields(resource):
+    """Возвращает имена полей из параметра fields или все поля ресурса."""
+    names = API_RESOURCES[resource]['row']._fields
+    if not request.args.get('fields'):
+        return names
+    selected = request.args['fields'].split(',')
+    unknown = [name for name in selected if name not in names]
+    if unknown:
+        raise ApiError(f"Неизвестные поля: {', '.join(unknown)}")
+    return selected
+
+
+def api_items(resource, update):
+    """Разбирает тело запроса - объект или массив объектов - и проверяет поля элементов."""
+    columns = API_RESOURCES[resource]['columns']
+    body = request.get_json(silent=True)
+    items = [body] if isinstance(body, dict) else body
+    if not isinstance(items, list) or not items:
+        raise ApiError('Ожидается объект или непустой массив объектов')
+    if len(items) > app.config['API_BATCH_LIMIT']:
+        raise ApiError(f"Не больше {app.config['API_BATCH_LIMIT']} элементов в одном запросе", 413)
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ApiError('Элемент должен быть объектом', index=index)
+        unknown = [name for name in item if name not in columns and not (update and name == 'id')]
+        if unknown:
+            raise ApiError(f"Неизвестные или неизменяемые поля: {', '.join(unknown)}", index=index)
+        if update and not isinstance(item.get('id'), int):
+            raise ApiError('Не указан id', index=index)
+        if not any(name in columns for name in item):
+            raise ApiError('Нет полей для записи', index=index)
+        if any(isinstance(value, (dict, list)) for value in item.values()):
+            raise ApiError('Значения полей должны быть строками, числами или null', index=index)
+    return items
+
+
+def api_write(resource, items, update):
+    """Создает или изменяет строки пакета одной транзакцией и возвращает их id.
+
+    При ошибке любого элемента транзакция откатывается целиком.
+    """
+    spec = API_RESOURCES[resource]
+
+    def apply(conn):
+        ids = []
+        for index, item in enumerate(items):
+            names = [name for name in item if name != 'id']
+            values = [item[name] for name in names]
+            columns = [spec['columns'][name] for name in names]
+            try:
+                if update:
+                    cursor = conn.execute(
+                        f"UPDATE {spec['table']} SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?",
+                        values + [item['id']])
+                    if not cursor.rowcount:
+                        raise ApiError('Запись не найдена', 404, index)
+                    ids.append(item['id'])
+                else:
+                    cursor = conn.execute(
+                        f"INSERT INTO {spec['table']} ({', '.join(columns)}) "
+                        f"VALUES ({', '.join('?' * len(columns))})", values)
+                    ids.append(cursor.lastrowid)
+            except sqlite3.IntegrityError as e:
+                if is_slot_taken(e):
+                    raise ApiError('Врач уже занят в это время', 409, index)
+                raise ApiError(f'Нарушено ограничение базы данных: {e}', 400, index)
+        return ids
+
+    ids = run_write(apply)
+    if spec['cache_group']:
+        reference_cache.invalidate(spec['cache_group'])
+    if resource == 'appointments':
+        if update:
+            schedule.invalidate()
+        else:
+            for item in items:
+                if isinstance(item.get('doctor_id'), int) and item.get('date') and item.get('time'):
+                    schedule.book(item['doctor_id'], item['date'], item['time'])
+    return ids
+
+
+def api_list(resource):
+    """Возвращает страницу списка с выбранными полями и курсором следующей страницы."""
+    spec = API_RESOURCES[resource]
+    fields = api_fields(resource)
+    filters = {arg: request.args.get(param, type=type_) for param, (arg, type_) in spec['filters'].items()}
+    sorting = list_args(*spec['sorts'])
+    # Из базы читаются только запрошенные поля и поля, нужные для курсора
+    row_type = project(spec['row'], frozenset(fields) | {'id', spec['sorts'][0][sorting['sort']][1]})
+    page = spec['page'](**filters, **sorting, row_type=row_type)
+    return api_response({
+        'items': [{name: getattr(row, name) for name in fields} for row in page.rows],
+        'next_cursor': page.next_cursor,
+        'next': next_page_url(page),
+    })
+
+
+def api_detail(resource, id):
+    """Возвращает одну запись с выбранными полями."""
+    fields = api_fields(resource)
+    row = API_RESOURCES[resource]['get'](id)
+    if row is None:
+        raise ApiError('Запись не найдена', 404)
+    return api_response({name: getattr(row, name) for name in fields})
+
+
+def api_create(resource):
+    """Создает запись (тело - объект) или пакет записей (тело - массив) одной транзакцией."""
+    body_is_batch = isinstance(request.get_json(silent=True), list)
+    ids = api_write(resource, api_items(resource, update=False), update=False)
+    if body_is_batch:
+        return api_response({'ids': ids}, 201)
+    response = api_detail(resource, ids[0])
+    response.status_code = 201
+    response.headers['Location'] = url_for(f'api_{resource}_detail', id=ids[0])
+    return response
+
+
+def api_update_batch(resource):
+    """Изменяет пакет записей одной транзакцией; у каждого элемента указывается id."""
+    return api_response({'ids': api_write(resource, api_items(resource, update=True), update=True)})
+
+
+def api_update(resource, id):
+    """Изменяет поля одной записи."""
+    if not isinstance(request.get_json(silent=True), dict):
+        raise ApiError('Ожидается объект')
+    item = api_items(resource, update=False)[0]
+    api_write(resource, [dict(item, id=id)], update=True)
+    return api_detail(resource, id)
+
+
+for _resource, _spec in API_RESOURCES.items():
+    _conditional = conditional_page(*_spec['depends'])
+    app.add_url_rule(f'/api/v1/{_resource}', f'api_{_resource}_list', _conditional(api_list),
+                     defaults={'resource': _resource}, methods=['GET'])
+    app.add_url_rule(f'/api/v1/{_resource}', f'api_{_resource}_create', api_create,
+                     defaults={'resource': _resource}, methods=['POST'])
+    app.add_url_rule(f'/api/v1/{_resource}', f'api_{_resource}_update_batch', api_update_batch,
+                     defaults={'resource': _resource}, methods=['PATCH'])
+    app.add_url_rule(f'/api/v1/{_resource}/<int:id>', f'api_{_resource}_detail', _conditional(api_detail),
+                     defaults={'resource': _resource}, methods=['GET'])
+    app.add_url_rule(f'/api/v1/{_resource}/<int:id>', f'api_{_resource}_update', api_update,
+                     defaults={'resource': _resource}, methods=['PATCH'])
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Возвращает счетчики попаданий и промахов кэша справочников."""
+    return jsonify(reference_cache.stats())
+
+
+@app.route('/backups/stats')
+def backup_stats():
+    """Возвращает число снимков базы, последний снимок и ошибку последней попытки."""
+    scheduler = get_backups()
+    if scheduler is None:
+        abort(404)
+    return jsonify(scheduler.stats())
+
+
+@app.route('/metrics')
+def metrics_page():
+    """Возвращает метрики запросов в текстовом формате Prometheus."""
+    if not app.config['PROFILING']:
+        abort(404)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/profiling')
+def profiling_page():
+    """Возвращает замеры последних запросов и журнал медленных SQL-запросов."""
+    if not app.config['PROFILING']:
+        abort(404)
+    return jsonify(requests=list(recent_profiles), slow_queries=slow_queries.entries())
+
+
 @app.errorhandler(404)
 def page_not_found(error):
     """Обработчик ошибки 404."""
@@ -476,4 +2025,5 @@ def page_not_found(error):
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Сервер разработки с отладчиком; для рабочего режима см. wsgi.py
+    create_app().run(debug=True)
\ No newline at end of file
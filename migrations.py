@@ -0,0 +1,334 @@
+import sqlite3
+import sys
+
+# Таблицы, изменения которых учитываются в TableVersions (см. миграцию 6)
+VERSIONED_TABLES = ('Patients', 'Employees', 'Services', 'Appointments', 'Payments', 'ClinicInfo')
+
+# Длительность приема в минутах. Она зашита в триггеры проверки пересечений записей
+# (миграция 9), поэтому не настраивается: расписание в medclinic.py использует это же значение
+SLOT_MINUTES = 15
+
+
+def _minutes(value):
+    """SQL-выражение: минуты от начала суток для времени 'ЧЧ:ММ' или 'ЧЧ:ММ:СС'."""
+    return f"(strftime('%H', {value}) * 60 + strftime('%M', {value}))"
+
+
+# Версионированные миграции схемы. Номер примененной версии хранится в PRAGMA user_version.
+# Новые миграции добавляются только в конец списка; уже выпущенные не изменяются.
+MIGRATIONS = [
+    (1, 'Индексы для соединений и выборок по диапазону дат', [
+        "CREATE INDEX IF NOT EXISTS idx_appointments_date_doctor ON Appointments (Date, id_doctor)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_patient ON Appointments (id_patient)",
+        "CREATE INDEX IF NOT EXISTS idx_payments_patient ON Payments (id_patient)",
+        "CREATE INDEX IF NOT EXISTS idx_payments_date ON Payments (Date)",
+    ]),
+    (2, 'Индексы для сортировки и курсорной пагинации списков', [
+        "CREATE INDEX IF NOT EXISTS idx_patients_fio ON Patients (FIO)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_date ON Appointments (Date)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_doctor_date ON Appointments (id_doctor, Date)",
+    ]),
+    (3, 'Полнотекстовый индекс пациентов для поиска по ФИО, телефону и полису', [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS PatientsSearch USING fts5(
+            FIO, PhoneNumber, InsurancePolicy,
+            content='Patients', content_rowid='id', tokenize='trigram'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS patients_search_insert AFTER INSERT ON Patients BEGIN
+            INSERT INTO PatientsSearch (rowid, FIO, PhoneNumber, InsurancePolicy)
+            VALUES (new.id, new.FIO, new.PhoneNumber, new.InsurancePolicy);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS patients_search_delete AFTER DELETE ON Patients BEGIN
+            INSERT INTO PatientsSearch (PatientsSearch, rowid, FIO, PhoneNumber, InsurancePolicy)
+            VALUES ('delete', old.id, old.FIO, old.PhoneNumber, old.InsurancePolicy);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS patients_search_update AFTER UPDATE ON Patients BEGIN
+            INSERT INTO PatientsSearch (PatientsSearch, rowid, FIO, PhoneNumber, InsurancePolicy)
+            VALUES ('delete', old.id, old.FIO, old.PhoneNumber, old.InsurancePolicy);
+            INSERT INTO PatientsSearch (rowid, FIO, PhoneNumber, InsurancePolicy)
+            VALUES (new.id, new.FIO, new.PhoneNumber, new.InsurancePolicy);
+        END
+        """,
+        "INSERT INTO PatientsSearch (PatientsSearch) VALUES ('rebuild')",
+    ]),
+    (4, 'Сводные таблицы выручки и загрузки врачей с обновлением триггерами', [
+        """
+        CREATE TABLE IF NOT EXISTS RevenueByServiceDaily (
+            Date DATE NOT NULL,
+            id_service INTEGER NOT NULL,
+            Total REAL NOT NULL,
+            PaymentsCount INTEGER NOT NULL,
+            PRIMARY KEY (Date, id_service)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS RevenueByCashierDaily (
+            Date DATE NOT NULL,
+            employee_id INTEGER NOT NULL,  -- 0, если кассир не указан
+            Total REAL NOT NULL,
+            PaymentsCount INTEGER NOT NULL,
+            PRIMARY KEY (Date, employee_id)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS DoctorLoadDaily (
+            Date DATE NOT NULL,
+            id_doctor INTEGER NOT NULL,
+            AppointmentsCount INTEGER NOT NULL,
+            PRIMARY KEY (Date, id_doctor)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS payments_summary_insert AFTER INSERT ON Payments BEGIN
+            INSERT INTO RevenueByServiceDaily (Date, id_service, Total, PaymentsCount)
+            VALUES (new.Date, new.id_service, new.Summ, 1)
+            ON CONFLICT (Date, id_service) DO UPDATE SET Total = Total + excluded.Total,
+                PaymentsCount = PaymentsCount + 1;
+            INSERT INTO RevenueByCashierDaily (Date, employee_id, Total, PaymentsCount)
+            VALUES (new.Date, COALESCE(new.employee_id, 0), new.Summ, 1)
+            ON CONFLICT (Date, employee_id) DO UPDATE SET Total = Total + excluded.Total,
+                PaymentsCount = PaymentsCount + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS payments_summary_delete AFTER DELETE ON Payments BEGIN
+            UPDATE RevenueByServiceDaily SET Total = Total - old.Summ, PaymentsCount = PaymentsCount - 1
+            WHERE Date = old.Date AND id_service = old.id_service;
+            DELETE FROM RevenueByServiceDaily
+            WHERE Date = old.Date AND id_service = old.id_service AND PaymentsCount <= 0;
+            UPDATE RevenueByCashierDaily SET Total = Total - old.Summ, PaymentsCount = PaymentsCount - 1
+            WHERE Date = old.Date AND employee_id = COALESCE(old.employee_id, 0);
+            DELETE FROM RevenueByCashierDaily
+            WHERE Date = old.Date AND employee_id = COALESCE(old.employee_id, 0) AND PaymentsCount <= 0;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS payments_summary_update
+        AFTER UPDATE OF Date, id_service, Summ, employee_id ON Payments BEGIN
+            UPDATE RevenueByServiceDaily SET Total = Total - old.Summ, PaymentsCount = PaymentsCount - 1
+            WHERE Date = old.Date AND id_service = old.id_service;
+            DELETE FROM RevenueByServiceDaily
+            WHERE Date = old.Date AND id_service = old.id_service AND PaymentsCount <= 0;
+            UPDATE RevenueByCashierDaily SET Total = Total - old.Summ, PaymentsCount = PaymentsCount - 1
+            WHERE Date = old.Date AND employee_id = COALESCE(old.employee_id, 0);
+            DELETE FROM RevenueByCashierDaily
+            WHERE Date = old.Date AND employee_id = COALESCE(old.employee_id, 0) AND PaymentsCount <= 0;
+            INSERT INTO RevenueByServiceDaily (Date, id_service, Total, PaymentsCount)
+            VALUES (new.Date, new.id_service, new.Summ, 1)
+            ON CONFLICT (Date, id_service) DO UPDATE SET Total = Total + excluded.Total,
+                PaymentsCount = PaymentsCount + 1;
+            INSERT INTO RevenueByCashierDaily (Date, employee_id, Total, PaymentsCount)
+            VALUES (new.Date, COALESCE(new.employee_id, 0), new.Summ, 1)
+            ON CONFLICT (Date, employee_id) DO UPDATE SET Total = Total + excluded.Total,
+                PaymentsCount = PaymentsCount + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS appointments_summary_insert AFTER INSERT ON Appointments BEGIN
+            INSERT INTO DoctorLoadDaily (Date, id_doctor, AppointmentsCount)
+            VALUES (new.Date, new.id_doctor, 1)
+            ON CONFLICT (Date, id_doctor) DO UPDATE SET AppointmentsCount = AppointmentsCount + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS appointments_summary_delete AFTER DELETE ON Appointments BEGIN
+            UPDATE DoctorLoadDaily SET AppointmentsCount = AppointmentsCount - 1
+            WHERE Date = old.Date AND id_doctor = old.id_doctor;
+            DELETE FROM DoctorLoadDaily
+            WHERE Date = old.Date AND id_doctor = old.id_doctor AND AppointmentsCount <= 0;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS appointments_summary_update
+        AFTER UPDATE OF Date, id_doctor ON Appointments BEGIN
+            UPDATE DoctorLoadDaily SET AppointmentsCount = AppointmentsCount - 1
+            WHERE Date = old.Date AND id_doctor = old.id_doctor;
+            DELETE FROM DoctorLoadDaily
+            WHERE Date = old.Date AND id_doctor = old.id_doctor AND AppointmentsCount <= 0;
+            INSERT INTO DoctorLoadDaily (Date, id_doctor, AppointmentsCount)
+            VALUES (new.Date, new.id_doctor, 1)
+            ON CONFLICT (Date, id_doctor) DO UPDATE SET AppointmentsCount = AppointmentsCount + 1;
+        END
+        """,
+        """
+        INSERT INTO RevenueByServiceDaily (Date, id_service, Total, PaymentsCount)
+        SELECT Date, id_service, SUM(Summ), COUNT(*) FROM Payments GROUP BY Date, id_service
+        """,
+        """
+        INSERT INTO RevenueByCashierDaily (Date, employee_id, Total, PaymentsCount)
+        SELECT Date, COALESCE(employee_id, 0), SUM(Summ), COUNT(*) FROM Payments
+        GROUP BY Date, COALESCE(employee_id, 0)
+        """,
+        """
+        INSERT INTO DoctorLoadDaily (Date, id_doctor, AppointmentsCount)
+        SELECT Date, id_doctor, COUNT(*) FROM Appointments GROUP BY Date, id_doctor
+        """,
+    ]),
+    (5, 'Запрет повторной записи к врачу на занятое время', [
+        # Проверка и вставка выполняются одной инструкцией под блокировкой записи, поэтому
+        # два одновременных запроса не могут занять один слот. Уже существующие
+        # пересечения не затрагиваются.
+        """
+        CREATE TRIGGER IF NOT EXISTS appointments_no_double_booking_insert
+        BEFORE INSERT ON Appointments
+        WHEN EXISTS (SELECT 1 FROM Appointments
+                     WHERE id_doctor = new.id_doctor AND Date = new.Date AND Time = new.Time)
+        BEGIN
+            SELECT RAISE(ABORT, 'врач уже занят в это время');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS appointments_no_double_booking_update
+        BEFORE UPDATE OF id_doctor, Date, Time ON Appointments
+        WHEN (new.id_doctor IS NOT old.id_doctor OR new.Date IS NOT old.Date OR new.Time IS NOT old.Time)
+            AND EXISTS (SELECT 1 FROM Appointments
+                        WHERE id_doctor = new.id_doctor AND Date = new.Date AND Time = new.Time
+                            AND id != new.id)
+        BEGIN
+            SELECT RAISE(ABORT, 'врач уже занят в это время');
+        END
+        """,
+    ]),
+    (6, 'Версии таблиц для ETag и кэша страниц, увеличиваемые триггерами', [
+        """
+        CREATE TABLE IF NOT EXISTS TableVersions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """,
+        *(f"INSERT OR IGNORE INTO TableVersions (name) VALUES ('{table}')" for table in VERSIONED_TABLES),
+        *(f"""
+        CREATE TRIGGER IF NOT EXISTS {table.lower()}_version_{event.lower()} AFTER {event} ON {table} BEGIN
+            UPDATE TableVersions SET version = version + 1 WHERE name = '{table}';
+        END
+        """ for table in VERSIONED_TABLES for event in ('INSERT', 'UPDATE', 'DELETE')),
+    ]),
+    (7, 'Покрывающие индексы истории пациента; индексы только по id_patient больше не нужны', [
+        # Страница истории читается диапазоном (id_patient, Date, id) без обращения к таблицам
+        """
+        CREATE INDEX IF NOT EXISTS idx_appointments_patient_timeline
+        ON Appointments (id_patient, Date, id, Time, id_doctor, Complaints, PreliminaryDiagnosis)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_payments_patient_timeline
+        ON Payments (id_patient, Date, id, payment_time, id_service, Summ)
+        """,
+        "DROP INDEX IF EXISTS idx_appointments_patient",
+        "DROP INDEX IF EXISTS idx_payments_patient",
+    ]),
+    (8, 'Архив закрытых лет; перенос строк в архив не уменьшает сводные таблицы', [
+        # Строка года добавляется с moving = 1 в транзакции, удаляющей перенесенные строки
+        # (см. archive.py), и сбрасывается в 0 в той же транзакции
+        """
+        CREATE TABLE IF NOT EXISTS ArchivedPeriods (
+            year INTEGER PRIMARY KEY,
+            appointments INTEGER NOT NULL DEFAULT 0,
+            payments INTEGER NOT NULL DEFAULT 0,
+            rolled_at TEXT,
+            moving INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        "DROP TRIGGER IF EXISTS payments_summary_delete",
+        """
+        CREATE TRIGGER payments_summary_delete AFTER DELETE ON Payments
+        WHEN NOT EXISTS (SELECT 1 FROM ArchivedPeriods WHERE moving = 1) BEGIN
+            UPDATE RevenueByServiceDaily SET Total = Total - old.Summ, PaymentsCount = PaymentsCount - 1
+            WHERE Date = old.Date AND id_service = old.id_service;
+            DELETE FROM RevenueByServiceDaily
+            WHERE Date = old.Date AND id_service = old.id_service AND PaymentsCount <= 0;
+            UPDATE RevenueByCashierDaily SET Total = Total - old.Summ, PaymentsCount = PaymentsCount - 1
+            WHERE Date = old.Date AND employee_id = COALESCE(old.employee_id, 0);
+            DELETE FROM RevenueByCashierDaily
+            WHERE Date = old.Date AND employee_id = COALESCE(old.employee_id, 0) AND PaymentsCount <= 0;
+        END
+        """,
+        "DROP TRIGGER IF EXISTS appointments_summary_delete",
+        """
+        CREATE TRIGGER appointments_summary_delete AFTER DELETE ON Appointments
+        WHEN NOT EXISTS (SELECT 1 FROM ArchivedPeriods WHERE moving = 1) BEGIN
+            UPDATE DoctorLoadDaily SET AppointmentsCount = AppointmentsCount - 1
+            WHERE Date = old.Date AND id_doctor = old.id_doctor;
+            DELETE FROM DoctorLoadDaily
+            WHERE Date = old.Date AND id_doctor = old.id_doctor AND AppointmentsCount <= 0;
+        END
+        """,
+    ]),
+    (9, 'Запрет записи к врачу на пересекающееся время, а не только на совпадающее', [
+        # Прием занимает SLOT_MINUTES минут от своего начала; время сравнивается в минутах,
+        # поэтому '10:05' и '10:05:00' тоже считаются одним временем
+        "DROP TRIGGER IF EXISTS appointments_no_double_booking_insert",
+        f"""
+        CREATE TRIGGER appointments_no_double_booking_insert
+        BEFORE INSERT ON Appointments
+        WHEN EXISTS (SELECT 1 FROM Appointments
+                     WHERE id_doctor = new.id_doctor AND Date = new.Date
+                         AND abs({_minutes('Time')} - {_minutes('new.Time')}) < {SLOT_MINUTES})
+        BEGIN
+            SELECT RAISE(ABORT, 'врач уже занят в это время');
+        END
+        """,
+        "DROP TRIGGER IF EXISTS appointments_no_double_booking_update",
+        f"""
+        CREATE TRIGGER appointments_no_double_booking_update
+        BEFORE UPDATE OF id_doctor, Date, Time ON Appointments
+        WHEN (new.id_doctor IS NOT old.id_doctor OR new.Date IS NOT old.Date OR new.Time IS NOT old.Time)
+            AND EXISTS (SELECT 1 FROM Appointments
+                        WHERE id_doctor = new.id_doctor AND Date = new.Date
+                            AND abs({_minutes('Time')} - {_minutes('new.Time')}) < {SLOT_MINUTES}
+                            AND id != new.id)
+        BEGIN
+            SELECT RAISE(ABORT, 'врач уже занят в это время');
+        END
+        """,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    """Возвращает номер версии схемы базы данных."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=LATEST_VERSION):
+    """Применяет к соединению все миграции до версии target и возвращает список примененных."""
+    applied = []
+    version = get_version(conn)
+    for number, description, statements in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+        conn.execute("BEGIN")  # каждая миграция выполняется в отдельной транзакции
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append((number, description))
+    return applied
+
+
+def upgrade(db_path, target=LATEST_VERSION):
+    """Обновляет схему файла базы данных на месте."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return migrate(conn, target)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    db_file = sys.argv[1] if len(sys.argv) > 1 else 'medclinic.db'
+    applied = upgrade(db_file)
+    for number, description in applied:
+        print(f"Applied migration {number}: {description}")
+    print(f"Database schema is at version {LATEST_VERSION}.")
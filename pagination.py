@@ -0,0 +1,75 @@
+import base64
+import binascii
+import json
+
+
+class Page:
+    """Страница списка: строки и курсор для перехода к следующей странице."""
+
+    def __init__(self, rows, next_cursor=None):
+        self.rows = rows
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(values):
+    """Кодирует значения ключа последней строки в строку для URL."""
+    raw = json.dumps(values, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size=2):
+    """Декодирует курсор из size значений из URL; для пустого или поврежденного курсора возвращает None."""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, binascii.Error):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    # Столбцы сортировки списков не допускают NULL, а последнее значение - всегда id строки;
+    # прочие значения (объекты, списки) не могут быть параметрами запроса
+    *keys, row_id = values
+    if type(row_id) is not int or not all(type(value) in (str, int, float) for value in keys):
+        return None
+    return values
+
+
+def keyset_query(select, conditions, params, sort_expr, id_expr, descending, cursor, limit):
+    """Дополняет запрос фильтрами, условием курсора, сортировкой и ограничением LIMIT.
+
+    Строк запрашивается на одну больше limit, чтобы узнать, есть ли следующая страница.
+    """
+    conditions = list(conditions)
+    params = list(params)
+    op = '<' if descending else '>'
+    if cursor is not None:
+        if sort_expr == id_expr:
+            conditions.append(f"{id_expr} {op} ?")
+            params.append(cursor[1])
+        else:
+            conditions.append(f"({sort_expr}, {id_expr}) {op} (?, ?)")
+            params.extend(cursor)
+    if conditions:
+        select += " WHERE " + " AND ".join(conditions)
+    direction = 'DESC' if descending else 'ASC'
+    if sort_expr == id_expr:
+        select += f" ORDER BY {id_expr} {direction}"
+    else:
+        select += f" ORDER BY {sort_expr} {direction}, {id_expr} {direction}"
+    select += " LIMIT ?"
+    params.append(limit + 1)
+    return select, params
+
+
+def make_page(rows, limit, sort_index, id_index=0):
+    """Формирует страницу из limit + 1 выбранных строк."""
+    if len(rows) <= limit:
+        return Page(rows)
+    rows = rows[:limit]
+    last = rows[-1]
+    return Page(rows, encode_cursor([last[sort_index], last[id_index]]))
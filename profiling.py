@@ -0,0 +1,172 @@
+import bisect
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# Границы корзин гистограмм длительности, в секундах
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger('medclinic.slow_queries')
+
+
+class RequestProfile:
+    """Замеры одного запроса: выполненные SQL-запросы и длительность этапов формирования ответа."""
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.queries = []  # (текст запроса, длительность в секундах, число строк)
+        self.timings = {}  # этап (sql, template, docx, xlsx) -> секунды
+        self._running = {}
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def add(self, stage, duration):
+        self.timings[stage] = self.timings.get(stage, 0.0) + duration
+
+    def add_query(self, statement, duration, rows):
+        self.queries.append((statement, duration, rows))
+        self.add('sql', duration)
+
+    def start(self, stage):
+        self._running[stage] = time.perf_counter()
+
+    def stop(self, stage):
+        started = self._running.pop(stage, None)
+        if started is not None:
+            self.add(stage, time.perf_counter() - started)
+
+    def server_timing(self):
+        """Возвращает значение заголовка Server-Timing."""
+        parts = []
+        for stage, duration in self.timings.items():
+            part = f'{stage};dur={duration * 1000:.2f}'
+            if stage == 'sql':
+                part += f';desc="{len(self.queries)} queries"'
+            parts.append(part)
+        parts.append(f'total;dur={self.elapsed * 1000:.2f}')
+        return ', '.join(parts)
+
+    def to_dict(self):
+        """Возвращает замеры для ответа в формате JSON; длительности в миллисекундах."""
+        return {
+            'method': self.method,
+            'path': self.path,
+            'total_ms': round(self.elapsed * 1000, 3),
+            'timings_ms': {stage: round(duration * 1000, 3) for stage, duration in self.timings.items()},
+            'queries': [{'sql': statement, 'ms': round(duration * 1000, 3), 'rows': rows}
+                        for statement, duration, rows in self.queries],
+        }
+
+
+class Histogram:
+    """Гистограмма с накопительными корзинами, как в Prometheus."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + '}'
+
+
+class Metrics:
+    """Реестр счетчиков и гистограмм в памяти с выводом в текстовом формате Prometheus."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def render(self):
+        """Возвращает все метрики в текстовом формате Prometheus."""
+        lines = []
+        with self._lock:
+            for kind, items in (('counter', self._counters), ('histogram', self._histograms)):
+                previous = None
+                for (name, labels), value in sorted(items.items()):
+                    if name != previous:
+                        if name in self._help:
+                            lines.append(f'# HELP {name} {self._help[name]}')
+                        lines.append(f'# TYPE {name} {kind}')
+                        previous = name
+                    if kind == 'counter':
+                        lines.append(f'{name}{_labels(labels)} {value}')
+                        continue
+                    total = 0
+                    for bound, count in zip(value.buckets, value.counts):
+                        total += count
+                        lines.append(f'{name}_bucket{_labels(labels, le=repr(bound))} {total}')
+                    lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {value.count}')
+                    lines.append(f'{name}_sum{_labels(labels)} {value.sum:.6f}')
+                    lines.append(f'{name}_count{_labels(labels)} {value.count}')
+        return '\n'.join(lines) + '\n'
+
+
+class SlowQueryLog:
+    """Журнал медленных SQL-запросов с планом выполнения (EXPLAIN QUERY PLAN)."""
+
+    def __init__(self, threshold_ms=100, max_entries=100):
+        self.threshold_ms = threshold_ms
+        self._entries = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def check(self, conn, statement, params, duration, path=None):
+        """Записывает запрос в журнал, если он выполнялся дольше порога; возвращает True при записи."""
+        if self.threshold_ms is None or duration * 1000 < self.threshold_ms:
+            return False
+        try:
+            plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + statement, params)]
+        except sqlite3.Error as e:
+            plan = [f'EXPLAIN QUERY PLAN failed: {e}']
+        entry = {
+            'time': time.time(),
+            'path': path,
+            'ms': round(duration * 1000, 3),
+            'sql': ' '.join(statement.split()),
+            'params': [str(value) for value in params],
+            'plan': plan,
+        }
+        with self._lock:
+            self._entries.append(entry)
+        logger.warning('Slow query %.1f ms (%s): %s\n  %s', entry['ms'], path, entry['sql'], '\n  '.join(plan))
+        return True
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries)
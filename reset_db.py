@@ -1,10 +1,10 @@
 import sqlite3
 
+import migrations
 
-def reset_database(db_path):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
 
+def create_schema(cursor):
+    """Удаляет таблицы (если они есть) и создает базовую схему без данных."""
     # Удаление таблиц (если они есть)
     cursor.execute("DROP TABLE IF EXISTS Patients;")
     cursor.execute("DROP TABLE IF EXISTS Employees;")
@@ -12,6 +12,13 @@ def reset_database(db_path):
     cursor.execute("DROP TABLE IF EXISTS Appointments;")
     cursor.execute("DROP TABLE IF EXISTS Payments;")
     cursor.execute("DROP TABLE IF EXISTS ClinicInfo;")
+    cursor.execute("DROP TABLE IF EXISTS PatientsSearch;")
+    cursor.execute("DROP TABLE IF EXISTS RevenueByServiceDaily;")
+    cursor.execute("DROP TABLE IF EXISTS RevenueByCashierDaily;")
+    cursor.execute("DROP TABLE IF EXISTS DoctorLoadDaily;")
+    cursor.execute("DROP TABLE IF EXISTS TableVersions;")
+    # Без списка перенесенных лет прежние файлы архива не подключаются и будут перезаписаны при переносе
+    cursor.execute("DROP TABLE IF EXISTS ArchivedPeriods;")
 
     # Создание таблиц
     cursor.execute('''
@@ -83,6 +90,12 @@ def reset_database(db_path):
     );
     ''')
 
+
+def reset_database(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    create_schema(cursor)
+
     # Добавление начальных данных
     cursor.execute(
         "INSERT INTO Patients (FIO, DateOfBirth, PhoneNumber, Address, InsurancePolicy) VALUES (?, ?, ?, ?, ?)",
@@ -133,7 +146,11 @@ def reset_database(db_path):
 
     cursor.execute("INSERT INTO ClinicInfo (Name, Address, PhoneNumber) VALUES (?, ?, ?)",
                    ("Медицинская клиника", "ул. Примерная, д. 1", "+74951234567"))
+    cursor.execute("PRAGMA user_version = 0")
     conn.commit()
+
+    # Индексы и прочие изменения схемы поверх базовых таблиц
+    migrations.migrate(conn)
     conn.close()
     print("Database reset successfully.")
 
@@ -0,0 +1,102 @@
+import functools
+from collections import namedtuple
+
+
+def row_type(name, columns):
+    """Создает тип строки результата: namedtuple с полями - ключами columns (имя поля -> выражение SQL).
+
+    Экземпляры остаются кортежами без __dict__ (namedtuple объявляет __slots__ = ()), поэтому
+    занимают столько же памяти, сколько строки sqlite3, и передаются в другие процессы.
+    Список выражений для SELECT хранится в атрибуте select; столбцы результата называются
+    как поля, поэтому по ним можно сортировать объединение запросов (UNION ALL).
+    """
+    cls = namedtuple(name, columns, module=__name__)
+    cls.columns = dict(columns)
+    cls.select = ', '.join(f'{expr} AS {field}' for field, expr in columns.items())
+    return cls
+
+
+@functools.lru_cache(maxsize=None)
+def project(cls, fields):
+    """Возвращает тип строки с подмножеством полей cls (в порядке полей cls) для выборки только их."""
+    return row_type(f'{cls.__name__}Projection',
+                    {name: expr for name, expr in cls.columns.items() if name in fields})
+
+
+@functools.lru_cache(maxsize=None)
+def factory(cls):
+    """Возвращает row_factory для sqlite3, создающую строки типа cls прямо из кортежа столбцов."""
+    new = tuple.__new__
+
+    def make(cursor, row):
+        return new(cls, row)
+    return make
+
+
+# --- Пациенты ---
+PatientRow = row_type('PatientRow', {
+    'id': 'Patients.id', 'fio': 'Patients.FIO', 'date_of_birth': 'Patients.DateOfBirth',
+    'phone': 'Patients.PhoneNumber', 'address': 'Patients.Address', 'insurance_policy': 'Patients.InsurancePolicy',
+})
+PatientListRow = row_type('PatientListRow', {
+    'id': 'Patients.id', 'fio': 'Patients.FIO', 'phone': 'Patients.PhoneNumber',
+})
+PatientHeaderRow = row_type('PatientHeaderRow', dict(PatientRow.columns, **{
+    'appointments': '(SELECT count(*) FROM Appointments WHERE id_patient = Patients.id)',
+    'payments': '(SELECT count(*) FROM Payments WHERE id_patient = Patients.id)',
+    'last_visit': '(SELECT max(Date) FROM Appointments WHERE id_patient = Patients.id)',
+}))
+
+# --- Сотрудники ---
+EmployeeRow = row_type('EmployeeRow', {
+    'id': 'Employees.id', 'fio': 'Employees.FIO', 'position': 'Employees.Position',
+    'phone': 'Employees.PhoneNumber', 'specialization': 'Employees.Specialization',
+})
+EmployeeListRow = row_type('EmployeeListRow', {
+    'id': 'Employees.id', 'fio': 'Employees.FIO', 'position': 'Employees.Position',
+})
+# Справочник для выпадающих списков и подбора врачей по специализации
+EmployeeRefRow = row_type('EmployeeRefRow', {
+    'id': 'Employees.id', 'fio': 'Employees.FIO', 'specialization': 'Employees.Specialization',
+})
+
+# --- Услуги ---
+ServiceRow = row_type('ServiceRow', {
+    'id': 'Services.id', 'name': 'Services.Name', 'code': 'Services.Code', 'cost': 'Services.Cost',
+    'description': 'Services.Description', 'detailed_description': 'Services.DetailedDescription',
+})
+ServiceListRow = row_type('ServiceListRow', {
+    'id': 'Services.id', 'name': 'Services.Name', 'code': 'Services.Code', 'cost': 'Services.Cost',
+    'description': 'Services.Description',
+})
+ServiceRefRow = row_type('ServiceRefRow', {
+    'id': 'Services.id', 'name': 'Services.Name', 'code': 'Services.Code', 'cost': 'Services.Cost',
+})
+
+# --- Приемы (с ФИО врача и пациента) ---
+AppointmentRow = row_type('AppointmentRow', {
+    'id': 'Appointments.id', 'date': 'Appointments.Date', 'time': 'Appointments.Time', 'doctor': 'Employees.FIO',
+    'patient': 'Patients.FIO', 'doctor_id': 'Appointments.id_doctor', 'patient_id': 'Appointments.id_patient',
+    'complaints': 'Appointments.Complaints', 'diagnosis': 'Appointments.PreliminaryDiagnosis',
+})
+AppointmentListRow = row_type('AppointmentListRow', {
+    'id': 'Appointments.id', 'date': 'Appointments.Date', 'time': 'Appointments.Time', 'doctor': 'Employees.FIO',
+    'patient': 'Patients.FIO',
+})
+
+# --- Платежи (с ФИО пациента и кассира и названием услуги) ---
+PaymentRow = row_type('PaymentRow', {
+    'id': 'Payments.id', 'date': 'Payments.Date', 'time': 'Payments.payment_time', 'patient': 'Patients.FIO',
+    'service': 'Services.Name', 'amount': 'Payments.Summ', 'cashier': 'Employees.FIO',
+    'service_code': 'Services.Code', 'patient_id': 'Payments.id_patient', 'service_id': 'Payments.id_service',
+    'cashier_id': 'Payments.employee_id',
+})
+PaymentListRow = row_type('PaymentListRow', {
+    'id': 'Payments.id', 'date': 'Payments.Date', 'time': 'Payments.payment_time', 'patient': 'Patients.FIO',
+    'service': 'Services.Name', 'amount': 'Payments.Summ',
+})
+
+ClinicRow = row_type('ClinicRow', {
+    'id': 'ClinicInfo.id', 'name': 'ClinicInfo.Name', 'address': 'ClinicInfo.Address',
+    'phone': 'ClinicInfo.PhoneNumber',
+})
@@ -0,0 +1,106 @@
+import datetime
+import threading
+import time
+
+
+class SlotIndex:
+    """Занятые слоты приема по врачам для быстрого поиска свободного времени.
+
+    Рабочий день делится на слоты длиной slot_minutes; занятость врача за день хранится
+    битовой маской (бит i - слот i). Записи врача загружаются функцией loader(doctor_id,
+    date_from), возвращающей пары (дата, время), и перечитываются через ttl секунд, чтобы
+    учесть изменения, сделанные в обход приложения.
+    """
+
+    def __init__(self, loader, day_start='08:00', day_end='20:00', slot_minutes=15,
+                 workdays=(0, 1, 2, 3, 4, 5), horizon_days=90, ttl=60):
+        self.loader = loader
+        self.slot_minutes = slot_minutes
+        self.workdays = frozenset(workdays)
+        self.horizon_days = horizon_days
+        self.ttl = ttl
+        self._start = self._minutes(day_start)
+        self.slots_per_day = (self._minutes(day_end) - self._start) // slot_minutes
+        self._full_day = (1 << self.slots_per_day) - 1
+        self._doctors = {}  # id врача -> (дата начала загрузки, время загрузки, {порядковый номер дня: маска})
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _minutes(value):
+        hours, minutes = str(value)[:5].split(':')
+        return int(hours) * 60 + int(minutes)
+
+    def slot_of(self, time_value):
+        """Возвращает номер слота для времени 'ЧЧ:ММ' или None, если оно вне рабочих часов."""
+        try:
+            slot = (self._minutes(time_value) - self._start) // self.slot_minutes
+        except ValueError:
+            return None
+        return slot if 0 <= slot < self.slots_per_day else None
+
+    def slot_time(self, slot):
+        minutes = self._start + slot * self.slot_minutes
+        return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+    def _days(self, doctor_id, date_from):
+        """Возвращает маски занятости врача, начиная с date_from, при необходимости загружая их."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._doctors.get(doctor_id)
+        if entry is not None and entry[0] <= date_from and now - entry[1] < self.ttl:
+            return entry[2]
+        days = {}
+        for date_value, time_value in self.loader(doctor_id, date_from.isoformat()):
+            slot = self.slot_of(time_value)
+            if slot is None:
+                continue
+            day = datetime.date.fromisoformat(date_value).toordinal()
+            days[day] = days.get(day, 0) | (1 << slot)
+        with self._lock:
+            self._doctors[doctor_id] = (date_from, now, days)
+        return days
+
+    def next_free(self, doctor_id, start, limit=10):
+        """Возвращает до limit ближайших свободных слотов врача после start (datetime) как пары (дата, время)."""
+        days = self._days(doctor_id, start.date())
+        first_day = start.date().toordinal()
+        # Слоты текущего дня, начало которых уже прошло, недоступны
+        passed = -(-(start.hour * 60 + start.minute - self._start) // self.slot_minutes)
+        result = []
+        for day in range(first_day, first_day + self.horizon_days):
+            date = datetime.date.fromordinal(day)
+            if date.weekday() not in self.workdays:
+                continue
+            free = self._full_day & ~days.get(day, 0)
+            if day == first_day and passed > 0:
+                free &= ~((1 << passed) - 1)
+            while free:
+                bit = free & -free
+                result.append((date.isoformat(), self.slot_time(bit.bit_length() - 1)))
+                if len(result) >= limit:
+                    return result
+                free ^= bit
+        return result
+
+    def book(self, doctor_id, date_value, time_value):
+        """Отмечает слот врача занятым после успешной записи в базу."""
+        slot = self.slot_of(time_value)
+        try:
+            day = datetime.date.fromisoformat(date_value)
+        except (TypeError, ValueError):
+            return  # некорректная дата: отмечать в индексе нечего
+        with self._lock:
+            entry = self._doctors.get(doctor_id)
+            if slot is None or entry is None:
+                return
+            if day >= entry[0]:
+                days = entry[2]
+                days[day.toordinal()] = days.get(day.toordinal(), 0) | (1 << slot)
+
+    def invalidate(self, *doctor_ids):
+        """Сбрасывает загруженные записи указанных врачей; без аргументов - всех."""
+        with self._lock:
+            if not doctor_ids:
+                self._doctors.clear()
+            for doctor_id in doctor_ids:
+                self._doctors.pop(doctor_id, None)
@@ -0,0 +1,45 @@
+// Формирование документов через очередь фоновых заданий.
+// Кнопка с атрибутом data-job-url ставит задание, опрашивает его состояние и скачивает готовый файл.
+// Без JavaScript кнопка работает как обычная ссылка на синхронное формирование.
+document.addEventListener('click', function (event) {
+    var button = event.target.closest('[data-job-url]');
+    if (!button) {
+        return;
+    }
+    event.preventDefault();
+    var title = button.textContent;
+    button.classList.add('disabled');
+    button.textContent = 'Формируется...';
+
+    function finish(message) {
+        button.classList.remove('disabled');
+        button.textContent = title;
+        if (message) {
+            alert(message);
+        }
+    }
+
+    function poll(job) {
+        if (job.status === 'done') {
+            finish();
+            window.location = job.download_url;
+        } else if (job.status === 'failed') {
+            finish('Не удалось сформировать документ: ' + job.error);
+        } else {
+            setTimeout(function () {
+                fetch(job.status_url).then(function (r) { return r.json(); }).then(poll);
+            }, 500);
+        }
+    }
+
+    fetch(button.dataset.jobUrl, {method: 'POST'})
+        .then(function (r) { return r.json(); })
+        .then(function (job) {
+            if (job.error && !job.status) {
+                finish(job.error);
+            } else {
+                poll(job);
+            }
+        })
+        .catch(function () { finish('Сервер недоступен'); });
+});
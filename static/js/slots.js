@@ -0,0 +1,48 @@
+// Подбор свободного времени: загрузка ближайших слотов выбранного врача и подстановка даты и времени в форму.
+document.querySelectorAll('[data-slots-url]').forEach(function (block) {
+    var list = block.querySelector('.free-slots-list');
+    var date = document.getElementById('date');
+    var time = document.getElementById('time');
+    var doctor = document.getElementById('doctor');
+
+    function choose(button) {
+        date.value = button.dataset.date;
+        time.value = button.dataset.time;
+    }
+
+    function show(slots) {
+        list.innerHTML = '';
+        if (!slots.length) {
+            list.textContent = 'Свободного времени не найдено';
+        }
+        slots.forEach(function (slot) {
+            var button = document.createElement('button');
+            button.type = 'button';
+            button.className = 'btn btn-outline-primary btn-sm';
+            button.dataset.date = slot.date;
+            button.dataset.time = slot.time;
+            button.textContent = slot.date + ' ' + slot.time;
+            list.appendChild(button);
+        });
+    }
+
+    list.addEventListener('click', function (event) {
+        if (event.target.dataset.date) {
+            choose(event.target);
+        }
+    });
+
+    block.querySelector('[data-slots-load]').addEventListener('click', function () {
+        if (!doctor.value) {
+            list.textContent = 'Сначала выберите врача';
+            return;
+        }
+        var url = block.dataset.slotsUrl + '?doctor=' + encodeURIComponent(doctor.value);
+        if (date.value) {
+            url += '&from=' + encodeURIComponent(date.value);
+        }
+        fetch(url)
+            .then(function (r) { return r.json(); })
+            .then(show);
+    });
+});
@@ -0,0 +1,12 @@
+// История пациента: ссылка «Показать еще» заменяется следующей страницей, загруженной с сервера.
+document.addEventListener('click', function (event) {
+    var link = event.target.closest('[data-timeline-more]');
+    if (!link) {
+        return;
+    }
+    event.preventDefault();
+    link.classList.add('disabled');
+    fetch(link.href)
+        .then(function (r) { return r.text(); })
+        .then(function (html) { link.outerHTML = html; });
+});
@@ -0,0 +1,58 @@
+// Поля с подсказками: запрос к API поиска по мере ввода и выбор записи из списка.
+// Выбранный идентификатор записывается в скрытое поле, указанное в data-typeahead-target.
+document.querySelectorAll('[data-typeahead-url]').forEach(function (input) {
+    var hidden = document.getElementById(input.dataset.typeaheadTarget);
+    var results = input.parentNode.querySelector('.typeahead-results');
+    var timer = null;
+    var request = 0;
+
+    function validate() {
+        input.setCustomValidity(hidden.value ? '' : 'Выберите значение из списка');
+    }
+
+    function show(items) {
+        results.innerHTML = '';
+        items.forEach(function (item) {
+            var option = document.createElement('button');
+            option.type = 'button';
+            option.className = 'list-group-item list-group-item-action';
+            option.textContent = item.label;
+            if (item.details) {
+                var details = document.createElement('small');
+                details.className = 'text-muted ms-2';
+                details.textContent = item.details;
+                option.appendChild(details);
+            }
+            option.addEventListener('click', function () {
+                input.value = item.label;
+                hidden.value = item.id;
+                results.innerHTML = '';
+                validate();
+            });
+            results.appendChild(option);
+        });
+    }
+
+    input.addEventListener('input', function () {
+        hidden.value = '';
+        validate();
+        clearTimeout(timer);
+        var text = input.value.trim();
+        if (!text) {
+            show([]);
+            return;
+        }
+        timer = setTimeout(function () {
+            var current = ++request;
+            fetch(input.dataset.typeaheadUrl + '?q=' + encodeURIComponent(text))
+                .then(function (r) { return r.json(); })
+                .then(function (items) {
+                    if (current === request) {
+                        show(items);
+                    }
+                });
+        }, 200);
+    });
+
+    validate();
+});
@@ -0,0 +1,155 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import db
+
+# Уровни надежности записи -> PRAGMA synchronous. В режиме WAL при 'normal' зафиксированные
+# транзакции переживают сбой приложения, но последние из них могут потеряться при отключении
+# питания; 'full' синхронизирует журнал с диском при каждой фиксации, 'off' не синхронизирует никогда.
+DURABILITY = {'off': 'OFF', 'normal': 'NORMAL', 'full': 'FULL'}
+
+
+def is_busy(error):
+    """Проверяет, что ошибка вызвана блокировкой базы другим соединением."""
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in str(error) or 'busy' in str(error))
+
+
+class GroupCommitWriter:
+    """Единственный поток записи в базу с групповой фиксацией транзакций.
+
+    Изменения из всех потоков приложения ставятся в очередь; поток записи забирает из нее
+    накопившиеся задания (не больше max_batch, ожидая новых не дольше max_delay секунд после
+    первого) и выполняет их в одной транзакции BEGIN IMMEDIATE, каждое - в своей точке
+    сохранения. Ошибка одного задания откатывает только его и передается вызвавшему потоку.
+    Вызов возвращается после фиксации, поэтому одна синхронизация с диском приходится на
+    весь пакет, а соединения приложения не соревнуются за блокировку записи.
+
+    Если база занята другим процессом дольше busy_timeout миллисекунд, пакет повторяется
+    до retries раз с растущей задержкой.
+    """
+
+    def __init__(self, db_path, pragmas=None, durability=None, max_batch=256, max_delay=0.0,
+                 busy_timeout=5000, retries=3, retry_delay=0.05):
+        self.pragmas = dict(db.DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        if durability:
+            self.pragmas['synchronous'] = DURABILITY[durability]
+        self.pragmas['busy_timeout'] = busy_timeout
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.writes = 0
+        self.commits = 0
+        self.retried = 0
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='medclinic-writer', daemon=True)
+        self._thread.start()
+
+    def call(self, func):
+        """Выполняет func(conn) в потоке записи и возвращает ее результат после фиксации.
+
+        func не должна сама фиксировать или откатывать транзакцию.
+        """
+        if self._closed:
+            raise RuntimeError('Поток записи остановлен')
+        future = Future()
+        self._queue.put((func, future))
+        return future.result()
+
+    def execute(self, query, params=()):
+        """Выполняет инструкцию; возвращает (строки результата, число измененных строк, lastrowid)."""
+        def run(conn):
+            cursor = conn.execute(query, params)
+            return cursor.fetchall(), cursor.rowcount, cursor.lastrowid
+        return self.call(run)
+
+    def stats(self):
+        """Возвращает число выполненных заданий, фиксаций и повторов."""
+        return {
+            'writes': self.writes,
+            'commits': self.commits,
+            'writes_per_commit': round(self.writes / self.commits, 2) if self.commits else None,
+            'retried': self.retried,
+        }
+
+    def _next_batch(self, first):
+        """Собирает пакет заданий, начиная с first; возвращает (пакет, получен ли сигнал остановки)."""
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        conn = db.connect(self.db_path, self.pragmas)
+        try:
+            stop = False
+            while not stop:
+                item = self._queue.get()
+                if item is None:
+                    break
+                batch, stop = self._next_batch(item)
+                self._commit(conn, batch)
+        finally:
+            conn.close()
+            # Задания, поставленные после остановки, не будут выполнены
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[1].set_exception(RuntimeError('Поток записи остановлен'))
+
+    def _commit(self, conn, batch):
+        """Выполняет пакет в одной транзакции и сообщает результаты вызвавшим потокам."""
+        for attempt in range(self.retries + 1):
+            results = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for func, future in batch:
+                    conn.execute("SAVEPOINT write")
+                    try:
+                        results.append((future, func(conn), None))
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO write")
+                        results.append((future, None, e))
+                    conn.execute("RELEASE write")
+                conn.commit()
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                if is_busy(e) and attempt < self.retries:
+                    self.retried += 1
+                    time.sleep(self.retry_delay * 2 ** attempt)
+                    continue
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+            break
+        self.writes += len(batch)
+        self.commits += 1
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def close(self):
+        """Выполняет уже поставленные задания и останавливает поток записи."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
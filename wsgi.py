@@ -0,0 +1,103 @@
+"""WSGI-точка входа для запуска приложения в рабочем режиме.
+
+Под внешним сервером:   gunicorn -w 4 --threads 4 wsgi:app
+Встроенный запуск:      python wsgi.py [--bind 0.0.0.0:8000] [--workers N] [--threads N]
+
+Без аргументов адрес, число процессов и потоков берутся из настроек SERVER_BIND,
+SERVER_WORKERS и SERVER_THREADS (их можно задать переменными окружения MEDCLINIC_*).
+Если установлен gunicorn, используется он, иначе - многопроцессный сервер werkzeug:
+процессы создаются заранее и принимают соединения с общего сокета.
+"""
+import argparse
+import importlib.util
+import os
+import signal
+import socket
+
+from medclinic import create_app
+
+app = create_app()
+
+
+def parse_bind(bind):
+    host, _, port = bind.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def serve_gunicorn(bind, workers, threads):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', bind)
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+
+        def load(self):
+            return app
+
+    Server().run()
+
+
+def serve_prefork(bind, workers, threads):
+    """Запускает workers процессов сервера werkzeug, принимающих соединения с одного сокета."""
+    from werkzeug.serving import make_server
+
+    host, port = parse_bind(bind)
+    sock = socket.create_server((host, port), backlog=128)
+    sock.set_inheritable(True)
+    children = []
+
+    def run_worker():
+        # Каждый процесс открывает собственный пул соединений с базой при первом запросе
+        server = make_server(host, port, app, threaded=threads > 1, fd=sock.fileno())
+        server.serve_forever()
+
+    if workers <= 1 or not hasattr(os, 'fork'):
+        print(f'Serving on http://{host}:{port} (1 process)')
+        run_worker()
+        return
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                run_worker()
+            finally:
+                os._exit(0)
+        children.append(pid)
+    print(f'Serving on http://{host}:{port} ({workers} processes)')
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for pid in children:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bind', default=app.config['SERVER_BIND'])
+    parser.add_argument('--workers', type=int, default=app.config['SERVER_WORKERS'])
+    parser.add_argument('--threads', type=int, default=app.config['SERVER_THREADS'])
+    parser.add_argument('--server', choices=['auto', 'gunicorn', 'werkzeug'], default='auto')
+    args = parser.parse_args()
+
+    if args.server == 'gunicorn' or args.server == 'auto' and importlib.util.find_spec('gunicorn'):
+        serve_gunicorn(args.bind, args.workers, args.threads)
+    else:
+        serve_prefork(args.bind, args.workers, args.threads)
+
+
+if __name__ == '__main__':
+    main()